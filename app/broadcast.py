@@ -0,0 +1,172 @@
+# app/broadcast.py
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
+
+import app.database.requests as rq
+import app.keyboards as kb
+from app.database.models import Broadcast
+from app.delivery import bulk
+from app.texts import broadcast_progress
+
+BATCH_SIZE = 500
+# одновременных отправок; скорость все равно держит очередь app/delivery.py
+CONCURRENCY = 50
+# не чаще, чем раз в столько секунд, обновляем сообщение с прогрессом
+PROGRESS_INTERVAL = 5.0
+
+SENT, FAILED, BLOCKED = "sent", "failed", "blocked"
+
+
+class _Stopped(Exception):
+    """Рассылку остановили из другого процесса (статус в базе уже не running)"""
+
+
+class Broadcaster:
+    """
+    Рассылка сообщения всем активным пользователям.
+
+    Пользователи читаются пачками по ключу (id > последнего), в памяти —
+    не больше пары пачек. Отправки идут через пул из CONCURRENCY задач с
+    низким приоритетом, так что ответы в чатах их обгоняют. После каждой
+    полностью разосланной пачки прогресс пишется в базу: упавшая рассылка
+    продолжится с этого места (последняя пачка может уйти повторно).
+
+    Остановка тоже идет через базу: кнопка попадает в воркер чата админа,
+    а рассылка после перезапуска продолжается в первом воркере. Кнопка
+    ставит статус stopped, рассылка видит его на ближайшей контрольной
+    точке; если она идет в том же процессе, задача отменяется сразу.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._closing = False
+
+    async def resume(self, bot: Bot, worker_index: int = 0) -> None:
+        """Продолжить незавершенные рассылки (в многопроцессном режиме — только в первом воркере)"""
+        if worker_index != 0:
+            return
+        for broadcast in await rq.get_running_broadcasts():
+            self.start(bot, broadcast)
+
+    def start(self, bot: Bot, broadcast: Broadcast) -> None:
+        task = asyncio.create_task(self._run(bot, broadcast))
+        self._tasks[broadcast.id] = task
+        task.add_done_callback(lambda t: self._tasks.pop(broadcast.id, None))
+
+    async def stop(self, broadcast_id: int) -> bool:
+        """Остановить рассылку по команде админа"""
+        stopped = await rq.stop_broadcast(broadcast_id)
+        task = self._tasks.get(broadcast_id)
+        if task is None:
+            return stopped
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        return True
+
+    async def close(self) -> None:
+        """Остановка бота: рассылки остаются running и продолжатся после старта"""
+        self._closing = True
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def _run(self, bot: Bot, broadcast: Broadcast) -> None:
+        pool = asyncio.Semaphore(CONCURRENCY)
+        batches: deque[tuple[int, list[asyncio.Task]]] = deque()
+        last_report = 0.0
+        report: asyncio.Task | None = None
+        cursor = broadcast.last_user_id
+        # счетчики на момент контрольной точки; живые (в broadcast) — только для прогресса
+        checkpoint = {"last_user_id": cursor, SENT: broadcast.sent, FAILED: broadcast.failed,
+                      BLOCKED: broadcast.blocked}
+        try:
+            while users := await rq.get_active_users_after(cursor, BATCH_SIZE):
+                tasks = []
+                for _, tg_id in users:
+                    await pool.acquire()
+                    task = asyncio.create_task(self._send(bot, broadcast, tg_id))
+                    task.add_done_callback(lambda t: pool.release())
+                    tasks.append(task)
+                    if time.monotonic() - last_report >= PROGRESS_INTERVAL and (report is None or report.done()):
+                        # правка сообщения ждет лимита чата админа — рассылку она не тормозит
+                        last_report = time.monotonic()
+                        report = asyncio.create_task(self._report(bot, broadcast))
+                cursor = users[-1][0]
+                batches.append((cursor, tasks))
+                # пачки закрываются по порядку, следующая уже рассылается
+                while batches and all(t.done() for t in batches[0][1]):
+                    await self._checkpoint(broadcast, checkpoint, *batches.popleft())
+            while batches:
+                last_id, tasks = batches.popleft()
+                await asyncio.wait(tasks)
+                await self._checkpoint(broadcast, checkpoint, last_id, tasks)
+            broadcast.status = "done"
+        except _Stopped:
+            self._cancel(batches)
+            broadcast.status = "stopped"
+        except asyncio.CancelledError:
+            self._cancel(batches)
+            if not self._closing:
+                # остановил админ; при остановке бота рассылка остается running
+                broadcast.status = "stopped"
+            raise
+        except Exception:
+            logging.exception("broadcast %s failed", broadcast.id)
+            broadcast.status = "stopped"
+        finally:
+            if report is not None:
+                report.cancel()
+            broadcast.status = await rq.save_broadcast_progress(broadcast.id, {**checkpoint, "status": broadcast.status})
+            await self._report(bot, broadcast)
+
+    @staticmethod
+    def _cancel(batches: deque[tuple[int, list[asyncio.Task]]]) -> None:
+        for _, tasks in batches:
+            for task in tasks:
+                task.cancel()
+
+    async def _checkpoint(self, broadcast: Broadcast, checkpoint: dict, last_id: int,
+                          tasks: list[asyncio.Task]) -> None:
+        blocked = []
+        for task in tasks:
+            status, tg_id = task.result()
+            checkpoint[status] += 1
+            if status == BLOCKED:
+                blocked.append(tg_id)
+        checkpoint["last_user_id"] = last_id
+        if await rq.save_broadcast_progress(broadcast.id, checkpoint, blocked) != "running":
+            raise _Stopped
+
+    async def _send(self, bot: Bot, broadcast: Broadcast, tg_id: int) -> tuple[str, int]:
+        with bulk():
+            try:
+                await bot.copy_message(tg_id, broadcast.from_chat_id, broadcast.message_id)
+            except TelegramForbiddenError:
+                broadcast.blocked += 1
+                return BLOCKED, tg_id
+            except Exception as e:
+                if not isinstance(e, TelegramBadRequest):
+                    logging.warning("broadcast %s to %s failed: %s", broadcast.id, tg_id, e)
+                broadcast.failed += 1
+                return FAILED, tg_id
+        broadcast.sent += 1
+        return SENT, tg_id
+
+    async def _report(self, bot: Bot, broadcast: Broadcast) -> None:
+        if broadcast.progress_message_id is None:
+            return
+        markup = kb.broadcast_keyboard(broadcast.id) if broadcast.status == "running" else None
+        with contextlib.suppress(TelegramBadRequest):
+            await bot.edit_message_text(broadcast_progress(broadcast), chat_id=broadcast.admin_chat_id,
+                                        message_id=broadcast.progress_message_id,
+                                        parse_mode="Markdown", reply_markup=markup)
+
+
+broadcaster = Broadcaster()
@@ -0,0 +1,197 @@
+# app/calendar_feed.py
+"""
+Календарь мероприятий по HTTP: /calendar.ics (iCalendar для телефона) и /calendar.json.
+
+Берет тот же список, что и «Анонсы» (rq.get_events и его кэш). Тело рендерится
+один раз на версию списка; ETag — хэш содержимого, поэтому перечитанный без
+изменений список (кэш истек по времени, окно серий сдвинулось) не заставляет
+клиентов перекачивать календарь. Пока кэш мероприятий действителен, ответ
+на запрос с If-None-Match / If-Modified-Since — 304 без обращения к базе.
+
+Времена «плавающие» (без часового пояса), как и в базе: календарь покажет их
+в поясе телефона. Серия в .ics — одно событие с RRULE и EXDATE, в .json —
+отдельные проведения.
+"""
+import datetime as dt
+import hashlib
+import json
+from email.utils import format_datetime
+from typing import List
+
+from aiohttp import web
+
+import app.database.requests as rq
+from app.database.recurrence import Occurrence, parse_exceptions
+
+CALENDAR_NAME = "Игры разума"
+# клиенты опрашивают календарь раз в несколько минут; минуту можно не спрашивать вовсе
+CACHE_CONTROL = "public, max-age=60"
+
+_ICAL_RULES = {"weekly": "FREQ=WEEKLY", "biweekly": "FREQ=WEEKLY;INTERVAL=2", "monthly": "FREQ=MONTHLY"}
+
+
+def _ical_time(moment: dt.datetime) -> str:
+    return moment.strftime("%Y%m%dT%H%M%S")
+
+
+def _ical_text(value) -> str:
+    text = str(value or "")
+    for char, escaped in (("\\", "\\\\"), (";", "\\;"), (",", "\\,"), ("\r\n", "\\n"), ("\n", "\\n")):
+        text = text.replace(char, escaped)
+    return text
+
+
+def _fold(line: str) -> str:
+    """Строки iCalendar не длиннее 75 байт, продолжение — с пробела (RFC 5545, 3.1)"""
+    parts = []
+    chunk = ""
+    for char in line:
+        if len((chunk + char).encode()) > (75 if not parts else 74):
+            parts.append(chunk)
+            chunk = ""
+        chunk += char
+    parts.append(chunk)
+    return "\r\n ".join(parts)
+
+
+def _rrule(event) -> str:
+    rule = _ICAL_RULES[event.recurRule]
+    if event.recurRule == "monthly" and event.eventDateTime.day > 28:
+        # как в recurrence._add_months: в коротком месяце — последний день
+        rule += f";BYMONTHDAY={event.eventDateTime.day},-1;BYSETPOS=1"
+    if event.recurUntil:
+        rule += f";UNTIL={event.recurUntil:%Y%m%d}T235959"
+    return rule
+
+
+def render_ics(events: List[Occurrence], stamp: dt.datetime) -> str:
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//IgryRazumaBot//RU", "CALSCALE:GREGORIAN",
+             "METHOD:PUBLISH", f"X-WR-CALNAME:{_ical_text(CALENDAR_NAME)}"]
+    # проведения одной серии — одно событие с правилом повтора
+    series = {o.id: o.event for o in events}
+    for event in series.values():
+        start = event.eventDateTime
+        description = event.eventDesc or ""
+        if event.eventOrganizer:
+            description += f"\n\nОрганизатор: {event.eventOrganizer}"
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:event-{event.id}@igryrazumabot",
+            f"DTSTAMP:{stamp:%Y%m%dT%H%M%SZ}",
+            f"DTSTART:{_ical_time(start)}",
+            f"DTEND:{_ical_time(start + dt.timedelta(minutes=event.eventDuration))}",
+            f"SUMMARY:{_ical_text(event.eventName)}",
+        ]
+        if description.strip():
+            lines.append(f"DESCRIPTION:{_ical_text(description.strip())}")
+        if event.eventLocation:
+            lines.append(f"LOCATION:{_ical_text(event.eventLocation)}")
+        if event.recurRule:
+            lines.append(f"RRULE:{_rrule(event)}")
+            skipped = sorted(parse_exceptions(event.recurExceptions))
+            if skipped:
+                lines.append("EXDATE:" + ",".join(_ical_time(dt.datetime.combine(day, start.time())) for day in skipped))
+        lines.append("END:VEVENT")
+    lines.append("END:VCALENDAR")
+    return "".join(_fold(line) + "\r\n" for line in lines)
+
+
+def render_json(events: List[Occurrence], stamp: dt.datetime) -> str:
+    return json.dumps({
+        "calendar": CALENDAR_NAME,
+        "generated": stamp.isoformat(),
+        "events": [{
+            "id": o.id,
+            "name": o.eventName,
+            "description": o.eventDesc,
+            "start": o.eventDateTime.isoformat(),
+            "end": (o.eventDateTime + dt.timedelta(minutes=o.eventDuration)).isoformat(),
+            "location": o.eventLocation,
+            "organizer": o.eventOrganizer,
+            "recurrence": o.recurRule,
+        } for o in events],
+    }, ensure_ascii=False)
+
+
+FORMATS = {
+    "ics": (render_ics, "text/calendar"),
+    "json": (render_json, "application/json"),
+}
+
+
+def _fingerprint(events: List[Occurrence]) -> str:
+    """Хэш всего, что попадает в ответы (кроме времени рендера)"""
+    rows = [(o.id, o.eventDateTime, o.event.eventDateTime, o.eventName, o.eventDesc, o.eventDuration,
+             o.eventLocation, o.eventOrganizer, o.recurRule, o.recurUntil, o.recurExceptions) for o in events]
+    return hashlib.sha1(repr(rows).encode()).hexdigest()[:16]
+
+
+class Feed:
+    __slots__ = ("body", "content_type", "etag")
+
+    def __init__(self, body: bytes, content_type: str, etag: str) -> None:
+        self.body = body
+        self.content_type = content_type
+        self.etag = etag
+
+
+class CalendarFeed:
+    """Отрендеренные ответы для текущего списка мероприятий"""
+
+    def __init__(self) -> None:
+        self._source: List[Occurrence] | None = None
+        self._fingerprint: str | None = None
+        self.feeds: dict[str, Feed] = {}
+        self.last_modified: dt.datetime | None = None
+        self.renders = 0
+
+    async def get(self, fmt: str) -> Feed:
+        # пока кэш мероприятий действителен, это тот же объект списка и без запроса к базе
+        events = await rq.get_events()
+        if events is not self._source:
+            self._refresh(events)
+        return self.feeds[fmt]
+
+    def _refresh(self, events: List[Occurrence]) -> None:
+        self._source = events
+        fingerprint = _fingerprint(events)
+        if fingerprint == self._fingerprint:
+            return
+        # Last-Modified в HTTP — с точностью до секунды
+        stamp = dt.datetime.now(dt.timezone.utc).replace(microsecond=0)
+        self.feeds = {
+            fmt: Feed(render(events, stamp).encode(), content_type, f'"{fingerprint}-{fmt}"')
+            for fmt, (render, content_type) in FORMATS.items()
+        }
+        self._fingerprint = fingerprint
+        self.last_modified = stamp
+        self.renders += 1
+
+
+calendar = CalendarFeed()
+
+
+def _not_modified(request: web.Request, feed: Feed) -> bool:
+    # If-None-Match главнее If-Modified-Since (RFC 9110, 13.2.2)
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or feed.etag in tags
+    since = request.if_modified_since
+    return since is not None and calendar.last_modified <= since
+
+
+async def calendar_handler(request: web.Request) -> web.Response:
+    feed = await calendar.get(request.match_info["fmt"])
+    headers = {
+        "ETag": feed.etag,
+        "Last-Modified": format_datetime(calendar.last_modified, usegmt=True),
+        "Cache-Control": CACHE_CONTROL,
+    }
+    if _not_modified(request, feed):
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=feed.body, content_type=feed.content_type, charset="utf-8", headers=headers)
+
+
+def setup_calendar(app: web.Application) -> None:
+    app.router.add_get("/calendar.{fmt:ics|json}", calendar_handler)
@@ -0,0 +1,86 @@
+# app/callbacks.py
+"""
+Фабрики callback_data.
+
+Данные кнопки упаковываются в короткую строку "префикс:действие:id"
+(например "g:name:42"), это далеко от лимита Telegram в 64 байта.
+Действие — короткое значение из Enum, так что хендлеры получают
+уже разобранный объект и выбирают ветку по словарю, а не перебором фильтров.
+"""
+from enum import Enum
+
+from aiogram.filters.callback_data import CallbackData
+
+# кнопка-надпись (номер страницы): нажатие ничего не делает
+NOOP = "noop"
+
+
+class GameOp(str, Enum):
+    view = "view"
+    name = "name"
+    desc = "desc"
+    genre = "genre"
+    photo = "photo"
+    author = "author"
+    delete = "del"
+    cancel = "cancel"
+
+
+class GameAction(CallbackData, prefix="g"):
+    """Админ: действие над игрой каталога"""
+    op: GameOp
+    id: int = 0
+
+
+class GenreOp(str, Enum):
+    toggle = "t"
+    mode = "mode"
+    reset = "reset"
+    show = "show"
+
+
+class GenreAction(CallbackData, prefix="ge"):
+    """Фильтр жанров: отметить жанр (id) или управляющая кнопка"""
+    op: GenreOp
+    id: int = 0
+
+
+class ListOp(str, Enum):
+    first = "first"
+    next = "next"
+    prev = "prev"
+    letters = "abc"
+    letter = "at"
+    find = "find"
+    reset = "reset"
+
+
+class AdminList(CallbackData, prefix="al"):
+    """
+    Список игр в админке. id — крайняя игра текущей страницы (для next/prev)
+    или номер буквы в панели перехода: сама буква может оказаться разделителем
+    callback data (":"). Строка поиска и буквы панели хранятся в FSM, а не в кнопке.
+    """
+    op: ListOp
+    id: int = 0
+
+
+class CatalogPage(CallbackData, prefix="p"):
+    """Листание карусели каталога"""
+    page: int
+
+
+class Rsvp(CallbackData, prefix="r"):
+    """Кнопка «Иду» под анонсом"""
+    event_id: int
+
+
+class BroadcastOp(str, Enum):
+    send = "send"
+    cancel = "cancel"
+    stop = "stop"
+
+
+class BroadcastAction(CallbackData, prefix="b"):
+    op: BroadcastOp
+    id: int = 0
@@ -0,0 +1,180 @@
+# app/database/cache.py
+import datetime as dt
+from bisect import insort
+from typing import Iterable, List
+
+from app.database.models import Game, Genre
+from app.database.recurrence import Occurrence
+from app.database.search import NameIndex
+
+
+def _sort_key(game: Game) -> tuple:
+    # тот же порядок, что и ORDER BY gameName в SQLite (побайтовое сравнение UTF-8)
+    return game.gameName, game.id
+
+
+class CatalogCache:
+    """
+    Кэш каталога игр в памяти процесса.
+
+    Хранит игры по id, список, отсортированный по названию, корзины жанров
+    (id жанра -> множество id игр) и индекс названий для инлайн-поиска.
+    Наполняется при первом чтении, дальше поддерживается функциями записи
+    из app/database/requests.py.
+    """
+
+    def __init__(self) -> None:
+        self.name = "catalog"
+        # вызываются при каждом изменении (в многопроцессном режиме — рассылка другим воркерам)
+        self.listeners: list = []
+        self.by_id: dict[int, Game] = {}
+        self.ordered: List[Game] = []
+        self.genres: dict[int, set[int]] = {}
+        self.genre_by_id: dict[int, Genre] = {}
+        self.names = NameIndex()
+        self.loaded = False
+        # растет при каждой записи, чтобы не затереть ее устаревшей выборкой
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def fill(self, games: Iterable[Game], version: int) -> None:
+        """Заполнить кэш результатом полной выборки"""
+        if version != self.version:
+            # пока шла выборка, каталог изменился — загрузим заново
+            return
+        self.by_id.clear()
+        self.ordered = sorted(games, key=_sort_key)
+        self.genres.clear()
+        self.genre_by_id.clear()
+        for game in self.ordered:
+            self.by_id[game.id] = game
+            self._add_genres(game)
+        self.names.rebuild(self.ordered)
+        self.loaded = True
+
+    def put(self, game: Game) -> None:
+        """Добавить или заменить игру после записи в БД"""
+        self.version += 1
+        self._changed()
+        if not self.loaded:
+            return
+        self._discard(game.id)
+        self.by_id[game.id] = game
+        insort(self.ordered, game, key=_sort_key)
+        self._add_genres(game)
+        self.names.add(game)
+
+    def remove(self, game_id: int) -> None:
+        """Убрать игру после удаления из БД"""
+        self.version += 1
+        self._changed()
+        if self.loaded:
+            self._discard(game_id)
+
+    def invalidate(self, notify: bool = True) -> None:
+        """Сбросить кэш целиком"""
+        self.version += 1
+        if notify:
+            self._changed()
+        self.loaded = False
+        self.by_id.clear()
+        self.ordered = []
+        self.genres.clear()
+        self.genre_by_id.clear()
+        self.names.clear()
+
+    def match(self, genre_ids: List[int], mode: str = "and") -> set[int]:
+        """id игр со всеми (mode="and") или хотя бы одним ("or") из жанров"""
+        buckets = [self.genres.get(i, set()) for i in genre_ids]
+        if not buckets:
+            return set(self.by_id)
+        if mode == "or":
+            return set().union(*buckets)
+        # пересечение от самой маленькой корзины
+        buckets.sort(key=len)
+        return buckets[0].intersection(*buckets[1:])
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "games": len(self.by_id),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _changed(self) -> None:
+        for listener in self.listeners:
+            listener(self.name)
+
+    def _add_genres(self, game: Game) -> None:
+        for genre in game.genres:
+            self.genre_by_id[genre.id] = genre
+            self.genres.setdefault(genre.id, set()).add(game.id)
+
+    def _discard(self, game_id: int) -> None:
+        old = self.by_id.pop(game_id, None)
+        if old is None:
+            return
+        self.ordered = [g for g in self.ordered if g.id != game_id]
+        self.names.remove(game_id)
+        for genre in old.genres:
+            bucket = self.genres.get(genre.id)
+            if bucket is not None:
+                bucket.discard(game_id)
+                if not bucket:
+                    del self.genres[genre.id]
+                    del self.genre_by_id[genre.id]
+
+
+class EventsCache:
+    """
+    Ближайшие мероприятия вместе с готовым текстом дайджеста.
+
+    Сбрасывается при добавлении мероприятия и сам истекает в момент начала
+    ближайшего проведения — тогда оно пропадает из списка предстоящих —
+    или в horizon, когда окно повторяющихся серий пора сдвинуть.
+    """
+
+    def __init__(self) -> None:
+        self.name = "events"
+        self.listeners: list = []
+        self.events: List[Occurrence] | None = None
+        self.pages: List[str] | None = None
+        self.expires_at: dt.datetime | None = None
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def valid(self, now: dt.datetime) -> bool:
+        if self.events is None:
+            return False
+        return self.expires_at is None or now < self.expires_at
+
+    def fill(self, events: List[Occurrence], version: int, horizon: dt.datetime | None = None) -> None:
+        if version != self.version:
+            return
+        self.events = events
+        self.pages = None
+        self.expires_at = min(filter(None, (events[0].eventDateTime if events else None, horizon)), default=None)
+
+    def invalidate(self, notify: bool = True) -> None:
+        self.version += 1
+        if notify:
+            for listener in self.listeners:
+                listener(self.name)
+        self.events = None
+        self.pages = None
+        self.expires_at = None
+
+    def stats(self) -> dict:
+        return {
+            "events": len(self.events or []),
+            "expires_at": self.expires_at,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+catalog = CatalogCache()
+events_cache = EventsCache()
@@ -0,0 +1,74 @@
+# app/database/engine.py
+"""
+Подключение к SQLite.
+
+Два движка на один файл базы:
+- writer — одно соединение (pool_size=1), все записи идут через него по очереди,
+  так что в процессе они не спорят за блокировку файла;
+- reader — пул соединений только для чтения (PRAGMA query_only).
+
+База в режиме WAL: читатели не ждут, пока писатель держит транзакцию
+(например вставку пользователя на /start), и видят последнее зафиксированное
+состояние. synchronous=NORMAL в WAL не теряет целостность, а fsync идет
+только на контрольной точке, не на каждом commit.
+
+RoutingSession сама выбирает движок: flush и insert/update/delete — writer,
+остальное — reader. После первой записи транзакция до конца читает через
+writer, чтобы видеть собственные незафиксированные изменения.
+"""
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+from app.metrics import instrument_engine
+from config import DATABASE_URL, DB_READ_POOL, DB_READ_OVERFLOW
+
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,         # мс ожидания блокировки, если пишет другой процесс (воркеры)
+    "cache_size": -16000,         # в КиБ: 16 МБ страничного кэша на соединение
+    "mmap_size": 128 * 1024 ** 2,  # чтение файла через mmap без копирования в кэш
+    "temp_store": "MEMORY",
+}
+
+
+def configure_sqlite(engine: AsyncEngine, read_only: bool = False) -> AsyncEngine:
+    """Прагмы на каждое новое соединение движка и метрики запросов"""
+    @event.listens_for(engine.sync_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+    instrument_engine(engine)
+    return engine
+
+
+writer = configure_sqlite(create_async_engine(DATABASE_URL, pool_size=1, max_overflow=0))
+# размер пула — по числу одновременных апдейтов (см. config.py)
+reader = configure_sqlite(create_async_engine(DATABASE_URL, pool_size=DB_READ_POOL, max_overflow=DB_READ_OVERFLOW),
+                          read_only=True)
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.info.get("writing") or self._flushing or isinstance(clause, UpdateBase):
+            self.info["writing"] = True
+            return writer.sync_engine
+        return reader.sync_engine
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _transaction_end(session, transaction):
+    # следующая транзакция сессии снова начинает с чтения через пул
+    if transaction.parent is None:
+        session.info.pop("writing", None)
+
+
+# expire_on_commit=False чтобы объекты оставались пригодными для чтения после commit
+async_session = async_sessionmaker(class_=AsyncSession, sync_session_class=RoutingSession, expire_on_commit=False)
@@ -0,0 +1,30 @@
+# app/database/genres.py
+import re
+from typing import List
+
+# админы разделяют жанры как придется: запятыми, точкой с запятой, слешем
+_SEPARATORS = re.compile(r"[,;/|\n]+")
+
+
+def genre_key(tag: str) -> str:
+    """Ключ сравнения жанров: "пати", "Пати" и "ПАТИ" — один жанр"""
+    return tag.casefold()
+
+
+def parse_genres(raw: str | None) -> List[str]:
+    """
+    Разобрать ввод админа в теги.
+
+    "пати,  Кооператив; RPG;  для   двоих; Пати" -> ["Пати", "Кооператив", "RPG", "Для двоих"]
+
+    Регистр не меняется, кроме первой буквы (аббревиатуры вроде RPG и D&D
+    остаются как есть); повторы сравниваются по genre_key, остается первое написание.
+    """
+    if not raw:
+        return []
+    tags = {}
+    for part in _SEPARATORS.split(raw):
+        tag = " ".join(part.split())
+        if tag:
+            tags.setdefault(genre_key(tag), tag[0].upper() + tag[1:])
+    return list(tags.values())
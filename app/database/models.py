@@ -1,16 +1,17 @@
 # app/database/models.py
 import datetime
-from sqlalchemy import String, BigInteger, Text, DateTime, Integer
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy.ext.asyncio import AsyncAttrs, create_async_engine, async_sessionmaker
-from sqlalchemy.ext.asyncio import AsyncSession
-
-DATABASE_URL = "sqlite+aiosqlite:///db.sqlite3"
+import logging
+from typing import List
 
-engine = create_async_engine(url=DATABASE_URL, echo=False, future=True)
+from sqlalchemy import (String, BigInteger, Boolean, Text, DateTime, Integer, ForeignKey, UniqueConstraint, Index, text,
+                        select, inspect)
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.ext.asyncio import AsyncAttrs
+from sqlalchemy.ext.asyncio import AsyncSession
 
-# expire_on_commit=False чтобы объекты оставались пригодными для чтения после commit
-async_session = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+from app.database.engine import writer, async_session
+from app.database.genres import genre_key, parse_genres
 
 class Base(AsyncAttrs, DeclarativeBase):
     pass
@@ -20,6 +21,25 @@ class User(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     tg_id: Mapped[int] = mapped_column(BigInteger, unique=True, index=True, nullable=False)
+    # False — пользователь заблокировал бота, рассылки его пропускают
+    is_active: Mapped[bool] = mapped_column(Boolean, default=True, server_default=text("1"), nullable=False)
+
+class Broadcast(Base):
+    """Рассылка и ее контрольная точка: после падения продолжаем с last_user_id"""
+    __tablename__ = "broadcasts"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    from_chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)  # откуда копировать сообщение
+    message_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    admin_chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    progress_message_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    status: Mapped[str] = mapped_column(String(20), default="running", nullable=False)  # running / done / stopped
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    last_user_id: Mapped[int] = mapped_column(Integer, default=0)  # User.id, до которого все обработано
+    sent: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    blocked: Mapped[int] = mapped_column(Integer, default=0)
+    created: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.now)
 
 class Event(Base):
     __tablename__ = "events"
@@ -27,24 +47,146 @@ class Event(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     eventName: Mapped[str] = mapped_column(String(100), nullable=False)
     eventDesc: Mapped[str] = mapped_column(Text, nullable=True)
-    eventDateTime: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+    eventDateTime: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False, index=True)
     eventDuration: Mapped[int] = mapped_column(Integer, nullable=False)  # минуты
     eventLocation: Mapped[str] = mapped_column(String(100), nullable=True)
     eventOrganizer: Mapped[str] = mapped_column(String(100), nullable=True)
     eventAuthor: Mapped[str] = mapped_column(String(100), nullable=True)
+    # повтор (app/database/recurrence.py): None — разовое, иначе weekly / biweekly / monthly
+    recurRule: Mapped[str] = mapped_column(String(20), nullable=True)
+    recurUntil: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True)  # последний день серии
+    recurExceptions: Mapped[str] = mapped_column(Text, nullable=True)  # отмененные даты, ISO через запятую
+
+class Subscription(Base):
+    """Запись на мероприятие (кнопка «Иду»)"""
+    __tablename__ = "subscriptions"
+    __table_args__ = (UniqueConstraint("event_id", "tg_id"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    event_id: Mapped[int] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"), nullable=False)
+    tg_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+class ReminderSent(Base):
+    """Отправленные напоминания: строка вставляется до отправки, поэтому повтора не будет"""
+    __tablename__ = "reminders_sent"
+
+    event_id: Mapped[int] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"), primary_key=True)
+    occurrence: Mapped[datetime.datetime] = mapped_column(DateTime, primary_key=True)  # начало мероприятия
+    lead: Mapped[int] = mapped_column(Integer, primary_key=True)  # минут до начала
+    tg_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
 
 class Game(Base):
     __tablename__ = "games"
+    # порядок каталога: по нему идет постраничный список в админке (keyset по (gameName, id))
+    __table_args__ = (Index("ix_games_name_id", "gameName", "id"),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     gameName: Mapped[str] = mapped_column(String(100), nullable=False)
     gameDesc: Mapped[str] = mapped_column(Text, nullable=True)
-    gameGenre: Mapped[str] = mapped_column(String(100), nullable=True)  # можно хранить CSV тегов
+    gameGenre: Mapped[str] = mapped_column(String(100), nullable=True)  # канонические теги через запятую, для показа
     gamePhoto: Mapped[str] = mapped_column(String(255), nullable=True)  # file_id или URL
     gameAuthor: Mapped[str] = mapped_column(String(100), nullable=True)
 
+    # теги для фильтрации; подгружаются одним запросом вместе со списком игр
+    genres: Mapped[List["Genre"]] = relationship(secondary="game_genres", lazy="selectin", order_by="Genre.name")
+
+class Genre(Base):
+    __tablename__ = "genres"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
+
+class GameGenre(Base):
+    __tablename__ = "game_genres"
+
+    game_id: Mapped[int] = mapped_column(ForeignKey("games.id", ondelete="CASCADE"), primary_key=True)
+    # отдельный индекс по жанру: фильтр идет от жанра к играм
+    genre_id: Mapped[int] = mapped_column(ForeignKey("genres.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+
+# полнотекстовый индекс каталога: FTS5 с триграммами ищет подстроки
+# без учета регистра, в том числе в кириллице (LIKE в sqlite так умеет только для ASCII)
+GAMES_FTS_DDL = [
+    """CREATE VIRTUAL TABLE games_fts USING fts5(
+        gameName, gameDesc, gameGenre,
+        content='games', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER games_fts_ai AFTER INSERT ON games BEGIN
+        INSERT INTO games_fts(rowid, gameName, gameDesc, gameGenre)
+        VALUES (new.id, new.gameName, new.gameDesc, new.gameGenre);
+    END""",
+    """CREATE TRIGGER games_fts_ad AFTER DELETE ON games BEGIN
+        INSERT INTO games_fts(games_fts, rowid, gameName, gameDesc, gameGenre)
+        VALUES ('delete', old.id, old.gameName, old.gameDesc, old.gameGenre);
+    END""",
+    """CREATE TRIGGER games_fts_au AFTER UPDATE ON games BEGIN
+        INSERT INTO games_fts(games_fts, rowid, gameName, gameDesc, gameGenre)
+        VALUES ('delete', old.id, old.gameName, old.gameDesc, old.gameGenre);
+        INSERT INTO games_fts(rowid, gameName, gameDesc, gameGenre)
+        VALUES (new.id, new.gameName, new.gameDesc, new.gameGenre);
+    END""",
+    # проиндексировать строки, добавленные до появления индекса
+    "INSERT INTO games_fts(games_fts) VALUES ('rebuild')",
+]
+
+
+async def migrate_genres(session: AsyncSession) -> None:
+    """Разовый перенос CSV из gameGenre в таблицы genres/game_genres"""
+    if await session.scalar(select(GameGenre).limit(1)) is not None:
+        return
+
+    genres: dict[str, Genre] = {}
+    games = await session.scalars(select(Game).where(Game.gameGenre.is_not(None)))
+    for game in games:
+        tags = parse_genres(game.gameGenre)
+        for tag in tags:
+            # "Пати" и "ПАТИ" в разных играх — один жанр в первом написании
+            if genre_key(tag) not in genres:
+                genres[genre_key(tag)] = Genre(name=tag)
+        game.genres = [genres[genre_key(tag)] for tag in tags]
+        game.gameGenre = ", ".join(g.name for g in game.genres) or None
+    await session.commit()
+
+
+def _sync_schema(conn) -> List[str]:
+    """
+    Сверить базу с моделями и досоздать недостающее: таблицы, колонки,
+    индексы, полнотекстовый индекс. Возвращает список изменений;
+    пустой — схема уже совпадает, и старт обходится одними чтениями sqlite_master.
+    """
+    inspector = inspect(conn)
+    existing = set(inspector.get_table_names())
+    changes = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            table.create(conn)
+            changes.append(f"таблица {table.name}")
+            continue
+        # create_all не добавляет новые колонки и индексы в уже существующие таблицы
+        columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {CreateColumn(column).compile(dialect=conn.dialect)}"))
+                changes.append(f"колонка {table.name}.{column.name}")
+        indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(conn)
+                changes.append(f"индекс {index.name}")
+    if "games_fts" not in existing:
+        for ddl in GAMES_FTS_DDL:
+            conn.execute(text(ddl))
+        changes.append("индекс games_fts")
+    return changes
+
 
-# утилита для создания таблиц
 async def async_main():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+    """Проверка схемы при старте; при расхождении — досоздание и перенос жанров"""
+    async with writer.begin() as conn:
+        changes = await conn.run_sync(_sync_schema)
+    if not changes:
+        return
+    logging.info("Схема базы обновлена: %s", ", ".join(changes))
+
+    async with async_session() as session:
+        await migrate_genres(session)
@@ -0,0 +1,107 @@
+# app/database/recurrence.py
+"""
+Повторяющиеся мероприятия.
+
+Серия хранится одной строкой Event: eventDateTime — первое проведение,
+recurRule — правило повтора, recurUntil — последний день серии (включительно),
+recurExceptions — даты без встречи (ISO через запятую). Отдельные проведения
+в базе не хранятся: генераторы ниже разворачивают их только в запрошенном окне,
+а до начала окна перескакивают арифметикой, так что цена зависит от ширины окна,
+а не от возраста серии. Разовое мероприятие — recurRule = None.
+"""
+import calendar
+import datetime as dt
+import heapq
+import itertools
+from typing import Iterable, Iterator, List
+
+# правило -> как показывать пользователю
+RULES = {
+    "weekly": "каждую неделю",
+    "biweekly": "раз в две недели",
+    "monthly": "раз в месяц",
+}
+_STEPS = {"weekly": dt.timedelta(weeks=1), "biweekly": dt.timedelta(weeks=2)}
+
+
+class Occurrence:
+    """Одно проведение мероприятия: все поля серии, но свое начало"""
+    __slots__ = ("event", "eventDateTime")
+
+    def __init__(self, event, start: dt.datetime) -> None:
+        self.event = event
+        self.eventDateTime = start
+
+    def __getattr__(self, name):
+        return getattr(self.event, name)
+
+    def __repr__(self) -> str:
+        return f"<Occurrence {self.event.id} {self.eventDateTime:%Y-%m-%d %H:%M}>"
+
+
+def parse_exceptions(text: str | None) -> set[dt.date]:
+    if not text:
+        return set()
+    return {dt.date.fromisoformat(part.strip()) for part in text.split(",") if part.strip()}
+
+
+def format_exceptions(dates: Iterable[dt.date]) -> str | None:
+    return ",".join(d.isoformat() for d in sorted(set(dates))) or None
+
+
+def _add_months(start: dt.datetime, months: int) -> dt.datetime:
+    # 31-е в коротком месяце переносится на последний день месяца
+    year, month = divmod(start.month - 1 + months, 12)
+    year += start.year
+    day = min(start.day, calendar.monthrange(year, month + 1)[1])
+    return start.replace(year=year, month=month + 1, day=day)
+
+
+def _candidates(event, after: dt.datetime) -> Iterator[dt.datetime]:
+    """Начала по правилу, начиная с последнего не позже after (без исключений и recurUntil)"""
+    first = event.eventDateTime
+    if event.recurRule in _STEPS:
+        step = _STEPS[event.recurRule]
+        skip = max(0, (after - first) // step)
+        return (first + n * step for n in itertools.count(skip))
+    if event.recurRule == "monthly":
+        skip = max(0, (after.year - first.year) * 12 + after.month - first.month - 1)
+        return (_add_months(first, n) for n in itertools.count(skip))
+    raise ValueError(f"unknown recurrence rule: {event.recurRule}")
+
+
+def occurrences(event, after: dt.datetime, before: dt.datetime) -> Iterator[dt.datetime]:
+    """Начала проведений строго между after и before, по возрастанию"""
+    if event.recurRule is None:
+        if after < event.eventDateTime < before:
+            yield event.eventDateTime
+        return
+
+    skipped = parse_exceptions(event.recurExceptions)
+    last_day = event.recurUntil.date() if event.recurUntil else dt.date.max
+    for start in _candidates(event, after):
+        if start >= before or start.date() > last_day:
+            return
+        if start > after and start.date() not in skipped:
+            yield start
+
+
+def next_occurrence(event, after: dt.datetime) -> dt.datetime | None:
+    return next(occurrences(event, after, dt.datetime.max), None)
+
+
+def occurs_at(event, start: dt.datetime) -> bool:
+    """Есть ли у мероприятия проведение ровно в start (не отменено ли, не изменилось ли)"""
+    moment = dt.timedelta(microseconds=1)
+    return next(occurrences(event, start - moment, start + moment), None) == start
+
+
+def _series(event, after: dt.datetime, before: dt.datetime) -> Iterator[Occurrence]:
+    # отдельная функция, чтобы каждый генератор держал свое мероприятие:
+    # merge сначала собирает все генераторы и только потом читает их
+    return (Occurrence(event, start) for start in occurrences(event, after, before))
+
+
+def expand(events: Iterable, after: dt.datetime, before: dt.datetime) -> List[Occurrence]:
+    """Проведения всех мероприятий в окне, слитые по времени начала"""
+    return list(heapq.merge(*(_series(e, after, before) for e in events), key=lambda o: o.eventDateTime))
@@ -1,111 +1,624 @@
 # app/database/requests.py
+import asyncio
 import datetime as dt
-from typing import List
+import heapq
+from functools import wraps
+from typing import AsyncIterator, Iterable, List, Sequence
 
-from sqlalchemy import select
-from sqlalchemy.exc import NoResultFound
+from sqlalchemy import select, func, text, delete, update, literal, tuple_, or_, and_, DateTime
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database.models import async_session, User, Event, Game
+from app.database.models import async_session, User, Event, Game, Genre, GameGenre, Subscription, ReminderSent, Broadcast
+from app.database.genres import genre_key, parse_genres
+from app.database.cache import catalog, CatalogCache, events_cache
+from app.database.recurrence import Occurrence, expand, next_occurrence
+from app.database.search import normalize
+from app.texts import events_digest
 
 
-async def set_user(tg_id: int) -> None:
-    async with async_session() as session:
-        # ищем существующего пользователя
-        user = await session.scalar(select(User).where(User.tg_id == tg_id))
-        if not user:
-            session.add(User(tg_id=tg_id))
+def connection(func):
+    """
+    Сессия для функции запроса.
+
+    Хендлеры передают session=, полученную от DbSessionMiddleware, — тогда
+    все запросы апдейта идут через одну сессию. Без нее (напоминания,
+    рассылки, скрипты) функция открывает и закрывает свою сессию.
+    Записи функции фиксируют сами.
+
+    Транзакция общей сессии заканчивается вместе с функцией: соединение
+    сразу возвращается в пул и не висит, пока хендлер отправляет сообщения
+    (через Outbox это может длиться секундами). Объекты после commit
+    остаются читаемыми (expire_on_commit=False).
+    """
+    @wraps(func)
+    async def wrapper(*args, session: AsyncSession | None = None, **kwargs):
+        if session is not None:
+            try:
+                result = await func(*args, session=session, **kwargs)
+            except BaseException:
+                await session.rollback()
+                raise
             await session.commit()
+            return result
+        async with async_session() as session:
+            return await func(*args, session=session, **kwargs)
+    return wrapper
+
+
+@connection
+async def set_user(tg_id: int, *, session: AsyncSession) -> None:
+    # один запрос: новый — вставить, заблокировавший — снова активен (раз пишет боту)
+    await session.execute(
+        insert(User).values(tg_id=tg_id)
+        .on_conflict_do_update(index_elements=[User.tg_id], set_={"is_active": True}, where=~User.is_active)
+    )
+    await session.commit()
+
 
+# сколько вперед разворачивать повторяющиеся серии в анонсах
+EVENTS_WINDOW = dt.timedelta(weeks=4)
+# как часто сдвигать окно, даже если ни одно проведение еще не началось
+EVENTS_REFRESH = dt.timedelta(days=1)
 
-async def get_events() -> List[Event]:
+
+def _upcoming(now: dt.datetime, until: dt.datetime):
+    """Разовые мероприятия после now и серии, у которых могут быть проведения до until"""
+    return or_(
+        and_(Event.recurRule.is_(None), Event.eventDateTime > now),
+        and_(Event.recurRule.is_not(None), Event.eventDateTime < until,
+             or_(Event.recurUntil.is_(None), Event.recurUntil >= now.replace(hour=0, minute=0, second=0, microsecond=0))),
+    )
+
+
+async def get_events(*, session: AsyncSession | None = None) -> List[Occurrence]:
+    """
+    Предстоящие проведения по времени начала: все разовые мероприятия
+    и проведения серий в ближайшие EVENTS_WINDOW.
+    """
     now = dt.datetime.now()
-    async with async_session() as session:
-        result = await session.scalars(select(Event).where(Event.eventDateTime > now).order_by(Event.eventDateTime))
-        return result.all()
+    if events_cache.valid(now):
+        events_cache.hits += 1
+        return events_cache.events
+
+    events_cache.misses += 1
+    version = events_cache.version
+    events = await _load_events(now, session=session)
+    events_cache.fill(events, version, horizon=now + EVENTS_REFRESH)
+    return events
+
 
+@connection
+async def _load_events(now: dt.datetime, *, session: AsyncSession) -> List[Occurrence]:
+    until = now + EVENTS_WINDOW
+    result = await session.scalars(select(Event).where(_upcoming(now, until)).order_by(Event.eventDateTime))
+    events = result.all()
+    # разовые показываем все, как и раньше; окно ограничивает только серии
+    once = [Occurrence(e, e.eventDateTime) for e in events if e.recurRule is None]
+    series = expand([e for e in events if e.recurRule is not None], now, until)
+    return list(heapq.merge(once, series, key=lambda o: o.eventDateTime))
 
-async def add_event(event: dict) -> None:
+
+async def get_events_digest(*, session: AsyncSession | None = None) -> List[str]:
+    """Готовые сообщения с анонсами; рендерятся один раз на версию списка"""
+    events = await get_events(session=session)
+    if not events:
+        return []
+    if events_cache.events is not events:
+        # список не попал в кэш (его сбросили во время выборки)
+        return events_digest(events)
+    if events_cache.pages is None:
+        events_cache.pages = events_digest(events)
+    return events_cache.pages
+
+
+@connection
+async def add_event(event: dict, *, session: AsyncSession) -> None:
     """
     event - словарь с ключами:
       eventName, eventDesc, eventDateTime (datetime), eventDuration (int), eventLocation, eventOrganizer, eventAuthor
+    и для серии: recurRule, recurUntil (datetime), recurExceptions (ISO-даты через запятую)
     """
-    async with async_session() as session:
-        event_obj = Event(
-            eventName=event["eventName"],
-            eventDesc=event.get("eventDesc"),
-            eventDateTime=event["eventDateTime"],
-            eventDuration=event["eventDuration"],
-            eventLocation=event.get("eventLocation"),
-            eventOrganizer=event.get("eventOrganizer"),
-            eventAuthor=event.get("eventAuthor"),
-        )
-        session.add(event_obj)
-        await session.commit()
+    event_obj = Event(
+        eventName=event["eventName"],
+        eventDesc=event.get("eventDesc"),
+        eventDateTime=event["eventDateTime"],
+        eventDuration=event["eventDuration"],
+        eventLocation=event.get("eventLocation"),
+        eventOrganizer=event.get("eventOrganizer"),
+        eventAuthor=event.get("eventAuthor"),
+        recurRule=event.get("recurRule"),
+        recurUntil=event.get("recurUntil"),
+        recurExceptions=event.get("recurExceptions"),
+    )
+    session.add(event_obj)
+    await session.commit()
+    events_cache.invalidate()
+
+
+# --- Записи на мероприятия и напоминания ---
+@connection
+async def get_event(event_id: int, *, session: AsyncSession) -> Event | None:
+    return await session.get(Event, event_id)
+
+
+@connection
+async def toggle_subscription(event_id: int, tg_id: int, *, session: AsyncSession) -> bool:
+    """Записать на мероприятие или отменить запись; True — теперь записан"""
+    result = await session.execute(
+        delete(Subscription).where(Subscription.event_id == event_id, Subscription.tg_id == tg_id)
+    )
+    if not result.rowcount:
+        session.add(Subscription(event_id=event_id, tg_id=tg_id))
+    await session.commit()
+    return not result.rowcount
+
+
+@connection
+async def get_subscribed_events(*, session: AsyncSession) -> List[tuple[int, dt.datetime]]:
+    """Мероприятия, на которые кто-то записан: (id, начало ближайшего проведения)"""
+    now = dt.datetime.now()
+    result = await session.scalars(
+        select(Event).where(_upcoming(now, dt.datetime.max), Event.id.in_(select(Subscription.event_id)))
+    )
+    events = ((event.id, next_occurrence(event, now)) for event in result)
+    return [(event_id, start) for event_id, start in events if start is not None]
+
+
+@connection
+async def claim_reminders(event_id: int, occurrence: dt.datetime, lead: int, *, session: AsyncSession) -> List[int]:
+    """
+    Отметить напоминание как отправленное и вернуть, кому его слать.
+
+    Вставка с ON CONFLICT DO NOTHING возвращает только новые строки, так что
+    после перезапуска (или из другого воркера) то же напоминание не уйдет второй раз.
+    """
+    stmt = insert(ReminderSent).from_select(
+        ["event_id", "occurrence", "lead", "tg_id"],
+        select(Subscription.event_id, literal(occurrence, DateTime), literal(lead), Subscription.tg_id)
+        .where(Subscription.event_id == event_id),
+    ).on_conflict_do_nothing().returning(ReminderSent.tg_id)
+    result = await session.scalars(stmt)
+    tg_ids = result.all()
+    await session.commit()
+    return tg_ids
+
+
+# --- Рассылки ---
+@connection
+async def count_active_users(*, session: AsyncSession) -> int:
+    return await session.scalar(select(func.count()).select_from(User).where(User.is_active))
+
+
+@connection
+async def get_active_users_after(last_id: int, limit: int, *, session: AsyncSession) -> List[tuple[int, int]]:
+    """Следующая пачка (id, tg_id) активных пользователей — по ключу, без OFFSET"""
+    result = await session.execute(
+        select(User.id, User.tg_id)
+        .where(User.id > last_id, User.is_active)
+        .order_by(User.id)
+        .limit(limit)
+    )
+    return [tuple(row) for row in result]
+
+
+@connection
+async def create_broadcast(data: dict, *, session: AsyncSession) -> Broadcast:
+    broadcast = Broadcast(**data)
+    session.add(broadcast)
+    await session.commit()
+    return broadcast
+
+
+@connection
+async def get_running_broadcasts(*, session: AsyncSession) -> List[Broadcast]:
+    result = await session.scalars(select(Broadcast).where(Broadcast.status == "running"))
+    return result.all()
+
+
+@connection
+async def stop_broadcast(broadcast_id: int, *, session: AsyncSession) -> bool:
+    """Пометить рассылку остановленной; False — она уже не шла"""
+    result = await session.execute(
+        update(Broadcast).where(Broadcast.id == broadcast_id, Broadcast.status == "running").values(status="stopped")
+    )
+    await session.commit()
+    return result.rowcount > 0
+
+
+@connection
+async def save_broadcast_progress(broadcast_id: int, progress: dict, blocked_tg_ids: List[int] = (), *,
+                                  session: AsyncSession) -> str:
+    """
+    Контрольная точка рассылки и отметка заблокировавших — одной транзакцией.
+
+    Статус из progress пишется, только пока рассылка running: остановку
+    админом (stop_broadcast) он не перетирает. Возвращает статус из базы.
+    """
+    progress = dict(progress)
+    status = progress.pop("status", None)
+    current = await session.scalar(
+        update(Broadcast).where(Broadcast.id == broadcast_id).values(**progress).returning(Broadcast.status)
+    )
+    if status is not None and current == "running":
+        await session.execute(update(Broadcast).where(Broadcast.id == broadcast_id).values(status=status))
+        current = status
+    if blocked_tg_ids:
+        await session.execute(update(User).where(User.tg_id.in_(blocked_tg_ids)).values(is_active=False))
+    await session.commit()
+    return current
 
 
 # --- Методы для каталога игр ---
-async def add_game(data: dict) -> None:
-    async with async_session() as session:
-        game = Game(
-            gameName=data["gameName"],
-            gameDesc=data.get("gameDesc"),
-            gameGenre=data.get("gameGenre"),
-            gamePhoto=data.get("gamePhoto"),  # file_id или URL
-            gameAuthor=data.get("gameAuthor"),
-        )
-        session.add(game)
-        await session.commit()
+_catalog_lock = asyncio.Lock()
+
+
+async def _catalog() -> CatalogCache:
+    """Каталог из кэша; при промахе читаем таблицу целиком один раз"""
+    if catalog.loaded:
+        catalog.hits += 1
+        return catalog
+
+    catalog.misses += 1
+    # одновременные промахи ждут одну загрузку, а не идут в БД каждый
+    async with _catalog_lock:
+        while not catalog.loaded:
+            version = catalog.version
+            async with async_session() as session:
+                result = await session.scalars(select(Game).order_by(Game.gameName))
+                catalog.fill(result.all(), version)
+    return catalog
+
+
+async def _genres_by_key(session, tags: Iterable[str]) -> dict[str, Genre]:
+    """
+    Жанры по genre_key для тегов; недостающие создаются.
+
+    Существующий жанр находится в любом регистре и сохраняет свое написание.
+    Жанров десятки, так что они сравниваются в Python: lower() в SQLite
+    понимает только ASCII. Вставка через ON CONFLICT DO NOTHING и повторное
+    чтение: две игры с одним новым жанром, добавленные одновременно, не падают
+    на уникальности имени.
+    """
+    result = await session.scalars(select(Genre))
+    known = {genre_key(g.name): g for g in result.all()}
+    missing: dict[str, str] = {}
+    for tag in tags:
+        if genre_key(tag) not in known:
+            missing.setdefault(genre_key(tag), tag)
+    if missing:
+        await session.execute(insert(Genre).on_conflict_do_nothing(), [{"name": tag} for tag in missing.values()])
+        result = await session.scalars(select(Genre).where(Genre.name.in_(missing.values())))
+        known.update((genre_key(g.name), g) for g in result.all())
+    return known
+
+
+async def _get_genres(session, tags: List[str]) -> List[Genre]:
+    """Жанры по тегам в их порядке; недостающие создаются"""
+    if not tags:
+        return []
+    known = await _genres_by_key(session, tags)
+    return [known[genre_key(tag)] for tag in tags]
+
+
+@connection
+async def add_game(data: dict, *, session: AsyncSession) -> None:
+    genres = await _get_genres(session, parse_genres(data.get("gameGenre")))
+    game = Game(
+        gameName=data["gameName"],
+        gameDesc=data.get("gameDesc"),
+        gameGenre=", ".join(g.name for g in genres) or None,
+        gamePhoto=data.get("gamePhoto"),  # file_id или URL
+        gameAuthor=data.get("gameAuthor"),
+        genres=genres,
+    )
+    session.add(game)
+    await session.commit()
+    catalog.put(game)
 
 
 async def get_all_games() -> List[Game]:
-    async with async_session() as session:
-        result = await session.scalars(select(Game).order_by(Game.gameName))
-        return result.all()
+    cache = await _catalog()
+    return list(cache.ordered)
 
 
-async def search_games_by_name(query: str) -> List[Game]:
-    async with async_session() as session:
-        # ilike для регистронезависимого поиска (sqlite поддерживает)
-        result = await session.scalars(select(Game).where(Game.gameName.ilike(f"%{query}%")))
-        return result.all()
+ADMIN_PAGE = 10
 
 
-async def get_games_by_genre(genre: str) -> List[Game]:
-    async with async_session() as session:
-        # простая проверка подстроки в поле gameGenre (если у тебя хранятся через запятую)
-        result = await session.scalars(select(Game).where(Game.gameGenre.ilike(f"%{genre}%")))
-        return result.all()
+def _admin_filter(query: str):
+    """Условие «Найти» в админке: от 3 символов — по триграммному индексу, короче — по началу названия"""
+    if len(query) >= 3:
+        match = 'gameName : "' + query.replace('"', '""') + '"'
+        return Game.id.in_(text("SELECT rowid FROM games_fts WHERE games_fts MATCH :match").bindparams(match=match))
+    return or_(Game.gameName.startswith(query, autoescape=True),
+               Game.gameName.startswith(query.capitalize(), autoescape=True))
+
+
+@connection
+async def get_admin_games_page(*, after: int = 0, before: int = 0, start: str = "", query: str = "",
+                               limit: int = ADMIN_PAGE, session: AsyncSession) -> tuple[List[tuple[int, str]], bool]:
+    """
+    Страница списка игр в админке: (id, название) по порядку и есть ли еще строки дальше.
+
+    Keyset по (gameName, id): after/before — id крайней игры соседней страницы
+    (ее название подставляется подзапросом), start — начало названия для перехода
+    по букве. Читается только limit + 1 строка, без OFFSET и подсчета всех игр.
+    """
+    key = tuple_(Game.gameName, Game.id)
+    stmt = select(Game.id, Game.gameName)
+    if query:
+        stmt = stmt.where(_admin_filter(query))
+    if after:
+        stmt = stmt.where(key > tuple_(select(Game.gameName).where(Game.id == after).scalar_subquery(), after))
+    elif before:
+        stmt = stmt.where(key < tuple_(select(Game.gameName).where(Game.id == before).scalar_subquery(), before))
+    elif start:
+        stmt = stmt.where(Game.gameName >= start)
+
+    if before:
+        result = await session.execute(stmt.order_by(Game.gameName.desc(), Game.id.desc()).limit(limit + 1))
+        rows = [tuple(row) for row in result][::-1]
+        return rows[-limit:], len(rows) > limit
+    result = await session.execute(stmt.order_by(Game.gameName, Game.id).limit(limit + 1))
+    rows = [tuple(row) for row in result]
+    return rows[:limit], len(rows) > limit
+
+
+@connection
+async def get_admin_initials(query: str = "", *, session: AsyncSession) -> List[str]:
+    """Первые буквы названий для панели перехода (по индексу ix_games_name_id)"""
+    stmt = select(func.substr(Game.gameName, 1, 1)).distinct().order_by(func.substr(Game.gameName, 1, 1))
+    if query:
+        stmt = stmt.where(_admin_filter(query))
+    result = await session.scalars(stmt)
+    return result.all()
+
+
+@connection
+async def get_games_page(offset: int, limit: int, *, session: AsyncSession) -> tuple[List[Game], int]:
+    """Страница каталога (по названию) и общее число игр"""
+    if catalog.loaded:
+        catalog.hits += 1
+        return catalog.ordered[offset:offset + limit], len(catalog.ordered)
+
+    # холодный кэш: читаем только нужную страницу, а не всю таблицу
+    total = await session.scalar(select(func.count()).select_from(Game))
+    result = await session.scalars(
+        select(Game).order_by(Game.gameName, Game.id).offset(offset).limit(limit)
+    )
+    return result.all(), total
+
+
+SEARCH_LIMIT = 20
+# поля игры, которые меняет update_game как есть (gameGenre разбирается отдельно)
+GAME_FIELDS = ("gameName", "gameDesc", "gamePhoto", "gameAuthor")
+
+
+@connection
+async def search_games_by_name(query: str, limit: int = SEARCH_LIMIT, *, session: AsyncSession) -> List[Game]:
+    """Поиск по названию, описанию и жанру; лучшие совпадения — первыми"""
+    needle = query.strip()
+    if len(needle) < 3:
+        # триграммному индексу нужно хотя бы 3 символа — короткие запросы ищем в кэше
+        cache = await _catalog()
+        needle = needle.casefold()
+        return [g for g in cache.ordered if needle in g.gameName.casefold()][:limit]
+
+    # запрос целиком как фраза: кавычки внутри экранируются удвоением
+    phrase = '"' + needle.replace('"', '""') + '"'
+    # совпадение в названии весит больше, чем в жанре и описании
+    result = await session.scalars(
+        text("SELECT rowid FROM games_fts WHERE games_fts MATCH :q "
+             "ORDER BY bm25(games_fts, 10.0, 1.0, 2.0) LIMIT :n"),
+        {"q": phrase, "n": limit},
+    )
+    ids = result.all()
+    if not ids:
+        return []
+    if catalog.loaded:
+        found = catalog.by_id
+    else:
+        result = await session.scalars(select(Game).where(Game.id.in_(ids)))
+        found = {g.id: g for g in result.all()}
+    return [found[i] for i in ids if i in found]
+
+
+async def search_games_fuzzy(query: str, limit: int = SEARCH_LIMIT) -> List[Game]:
+    """Нечеткий поиск по названиям; самые похожие — первыми"""
+    cache = await _catalog()
+    return [cache.by_id[i] for i in cache.names.fuzzy(query, limit)]
+
+
+async def search_games_inline(query: str, offset: int, limit: int) -> tuple[List[Game], int]:
+    """Страница результатов инлайн-поиска и общее число найденных — только по кэшу"""
+    cache = await _catalog()
+    needle = normalize(query)
+    if not needle:
+        return cache.ordered[offset:offset + limit], len(cache.ordered)
+    # ничего не нашлось — пробуем с опечатками, транслитом и другой раскладкой
+    ids = cache.names.search(needle) or cache.names.fuzzy(query, SEARCH_LIMIT)
+    return [cache.by_id[i] for i in ids[offset:offset + limit]], len(ids)
+
+
+@connection
+async def get_games_by_genre(genre_id: int, *, session: AsyncSession) -> List[Game]:
+    if catalog.loaded:
+        catalog.hits += 1
+        ids = catalog.genres.get(genre_id, set())
+        return [g for g in catalog.ordered if g.id in ids]
+
+    # холодный кэш: выборка по индексу game_genres.genre_id
+    result = await session.scalars(
+        select(Game).join(GameGenre).where(GameGenre.genre_id == genre_id).order_by(Game.gameName, Game.id)
+    )
+    return result.all()
+
+
+async def filter_games(genre_ids: List[int], mode: str = "and") -> tuple[List[Game], dict[int, int]]:
+    """
+    Игры под фильтр жанров и счетчики для кнопок жанров.
+
+    В режиме "and" счетчик жанра — сколько из найденных игр его имеют,
+    в режиме "or" — сколько игр у жанра всего. Считается по индексу
+    жанров в кэше, без обращения к БД.
+    """
+    cache = await _catalog()
+    matched = cache.match(genre_ids, mode)
+    if mode == "and" and genre_ids:
+        counts = {gid: len(bucket & matched) for gid, bucket in cache.genres.items()}
+    else:
+        counts = {gid: len(bucket) for gid, bucket in cache.genres.items()}
+    return [g for g in cache.ordered if g.id in matched], counts
+
+
+async def get_genres() -> List[Genre]:
+    """Жанры, у которых есть хотя бы одна игра, по алфавиту"""
+    cache = await _catalog()
+    return sorted(cache.genre_by_id.values(), key=lambda g: g.name)
 
 
 async def get_game_by_id(game_id: int) -> Game | None:
     """Получить игру по ID"""
-    async with async_session() as session:
-        result = await session.scalar(select(Game).where(Game.id == game_id))
-        return result
+    cache = await _catalog()
+    return cache.by_id.get(game_id)
 
 
-async def update_game(game_id: int, data: dict) -> None:
-    """Обновить данные игры"""
-    async with async_session() as session:
-        game = await session.scalar(select(Game).where(Game.id == game_id))
-        if game:
-            if "gameName" in data:
-                game.gameName = data["gameName"]
-            if "gameDesc" in data:
-                game.gameDesc = data["gameDesc"]
-            if "gameGenre" in data:
-                game.gameGenre = data["gameGenre"]
-            if "gamePhoto" in data:
-                game.gamePhoto = data["gamePhoto"]
-            if "gameAuthor" in data:
-                game.gameAuthor = data["gameAuthor"]
-            await session.commit()
+@connection
+async def update_game(game_id: int, data: dict, *, session: AsyncSession) -> Game | None:
+    """
+    Обновить данные игры; возвращает игру в новом виде или None, если ее нет.
+
+    Поля меняются одним UPDATE ... RETURNING без предварительного SELECT,
+    жанры (если их правят) переписываются в той же транзакции.
+    """
+    values = {field: data[field] for field in GAME_FIELDS if field in data}
+    genres = None
+    if "gameGenre" in data:
+        # жанры в написании каталога
+        genres = await _get_genres(session, parse_genres(data["gameGenre"]))
+        values["gameGenre"] = ", ".join(g.name for g in genres) or None
+    row = (await session.execute(
+        update(Game).where(Game.id == game_id).values(**values).returning(*Game.__table__.c)
+    )).first()
+    if row is None:
+        return None
+
+    if genres is not None:
+        await session.execute(delete(GameGenre).where(GameGenre.game_id == game_id))
+        if genres:
+            await session.execute(insert(GameGenre), [{"game_id": game_id, "genre_id": g.id} for g in genres])
+    elif game_id in catalog.by_id:
+        genres = list(catalog.by_id[game_id].genres)
+    else:
+        result = await session.scalars(
+            select(Genre).join(GameGenre).where(GameGenre.game_id == game_id).order_by(Genre.name)
+        )
+        genres = result.all()
+    await session.commit()
+
+    # новый объект, а не правка закэшированного: его могут читать другие хендлеры
+    game = Game(**row._mapping)
+    game.genres = sorted(genres, key=lambda g: g.name)
+    catalog.put(game)
+    return game
+
+
+@connection
+async def delete_game(game_id: int, *, session: AsyncSession) -> str | None:
+    """Удалить игру; возвращает ее название или None, если ее уже нет"""
+    await session.execute(delete(GameGenre).where(GameGenre.game_id == game_id))
+    name = await session.scalar(delete(Game).where(Game.id == game_id).returning(Game.gameName))
+    await session.commit()
+    if name is not None:
+        catalog.remove(game_id)
+    return name
+
+
+# --- Импорт и экспорт каталога ---
+IMPORT_BATCH = 200
+EXPORT_BATCH = 500
 
 
-async def delete_game(game_id: int) -> None:
-    """Удалить игру"""
+@connection
+async def import_games(rows: List[dict], upsert: bool = False, *, session: AsyncSession) -> dict:
+    """
+    Загрузить проверенные строки (app.database.transfer.parse_import) одной транзакцией.
+
+    Совпадение с существующей игрой — по normalize(названия): такие строки
+    пропускаются или, с upsert, обновляют заполненные поля, кроме самого
+    названия (в файле оно может отличаться регистром или ё). Вставки и
+    обновления идут executemany-пачками по IMPORT_BATCH строк.
+    """
+    result = await session.execute(select(Game.id, Game.gameName))
+    existing = {normalize(name): game_id for game_id, name in result}
+
+    new_rows, updates, skipped = [], [], 0
+    for row in rows:
+        game_id = existing.get(normalize(row["gameName"]))
+        if game_id is None:
+            new_rows.append(row)
+        elif upsert:
+            # название совпало лишь после normalize — в каталоге остается прежнее написание
+            updates.append({"id": game_id, **{k: v for k, v in row.items() if k != "gameName"}})
+        else:
+            skipped += 1
+
+    # все жанры файла: недостающие создаются одним executemany
+    tags = [tag for row in new_rows + updates for tag in parse_genres(row.get("gameGenre"))]
+    genres = await _genres_by_key(session, tags) if tags else {}
+    row_genres: dict[int, List[Genre]] = {}
+    for row in new_rows + updates:
+        if "gameGenre" in row:
+            # в строке игры — жанры в написании каталога
+            row_genres[id(row)] = [genres[genre_key(t)] for t in parse_genres(row["gameGenre"])]
+            row["gameGenre"] = ", ".join(g.name for g in row_genres[id(row)]) or None
+
+    links = []
+    for start in range(0, len(new_rows), IMPORT_BATCH):
+        batch = new_rows[start:start + IMPORT_BATCH]
+        ids = await session.scalars(insert(Game).returning(Game.id, sort_by_parameter_order=True), batch)
+        for game_id, row in zip(ids.all(), batch):
+            links += [{"game_id": game_id, "genre_id": g.id} for g in row_genres.get(id(row), ())]
+    for start in range(0, len(updates), IMPORT_BATCH):
+        batch = updates[start:start + IMPORT_BATCH]
+        await session.execute(update(Game), batch)
+        regenred = [row for row in batch if "gameGenre" in row]
+        if regenred:
+            await session.execute(delete(GameGenre).where(GameGenre.game_id.in_([row["id"] for row in regenred])))
+            for row in regenred:
+                links += [{"game_id": row["id"], "genre_id": g.id} for g in row_genres[id(row)]]
+    for start in range(0, len(links), IMPORT_BATCH):
+        await session.execute(insert(GameGenre), links[start:start + IMPORT_BATCH])
+    await session.commit()
+
+    if new_rows or updates:
+        # изменилось много строк сразу — проще перечитать каталог при следующем обращении
+        catalog.invalidate()
+    return {"added": len(new_rows), "updated": len(updates), "skipped": skipped}
+
+
+async def _stream(stmt) -> AsyncIterator[Sequence]:
+    # своя сессия: выгрузка читает долго и не должна держать сессию апдейта
     async with async_session() as session:
-        game = await session.scalar(select(Game).where(Game.id == game_id))
-        if game:
-            await session.delete(game)
-            await session.commit()
\ No newline at end of file
+        result = await session.stream(stmt.execution_options(yield_per=EXPORT_BATCH))
+        async for partition in result.partitions():
+            yield partition
+
+
+def stream_games() -> AsyncIterator[Sequence]:
+    """Таблица games пачками по EXPORT_BATCH строк, без загрузки в память целиком"""
+    return _stream(select(Game.id, Game.gameName, Game.gameDesc, Game.gameGenre, Game.gamePhoto, Game.gameAuthor)
+                   .order_by(Game.id))
+
+
+def stream_events() -> AsyncIterator[Sequence]:
+    """Таблица events пачками по EXPORT_BATCH строк"""
+    return _stream(select(Event.id, Event.eventName, Event.eventDesc, Event.eventDateTime, Event.eventDuration,
+                          Event.eventLocation, Event.eventOrganizer, Event.eventAuthor,
+                          Event.recurRule, Event.recurUntil, Event.recurExceptions)
+                   .order_by(Event.eventDateTime))
+
+
+def catalog_stats() -> dict:
+    """Счетчики попаданий/промахов кэша каталога"""
+    return catalog.stats()
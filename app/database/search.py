@@ -0,0 +1,192 @@
+# app/database/search.py
+import re
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Iterable, List
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+# кириллица -> латиница: ключи нечеткого поиска пишутся латиницей, так что
+# "манчкин", "munchkin" и "кодовыe" с латинской "e" сравниваются напрямую
+_TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ж": "zh", "з": "z", "и": "i",
+    "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s",
+    "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sch", "ъ": "",
+    "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+})
+
+# набрано не в той раскладке: "vfabz" <-> "мафия"
+_QWERTY = "qwertyuiop[]asdfghjkl;'zxcvbnm,.`"
+_JCUKEN = "йцукенгшщзхъфывапролджэячсмитьбюё"
+_LAYOUT = str.maketrans(_QWERTY + _JCUKEN, _JCUKEN + _QWERTY)
+
+
+def normalize(text: str | None) -> str:
+    """"Кодовые  Имена: Ёлки" -> "кодовые имена елки" """
+    if not text:
+        return ""
+    return " ".join(_NON_WORD.split(text.lower().replace("ё", "е"))).strip()
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def bigrams(text: str) -> set[str]:
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def fuzzy_key(text: str | None) -> str:
+    return normalize(text).translate(_TRANSLIT)
+
+
+def max_errors(length: int) -> int:
+    """Сколько опечаток прощаем запросу такой длины"""
+    if length <= 3:
+        return 0
+    if length <= 5:
+        return 1
+    return 2 if length <= 11 else 3
+
+
+def substring_distance(pattern: str, text: str, limit: int) -> int | None:
+    """
+    Наименьшее расстояние Левенштейна от pattern до любой подстроки text
+    (алгоритм Селлерса); None, если больше limit.
+    """
+    m = len(pattern)
+    prev = list(range(m + 1))
+    best = m
+    for ch in text:
+        cur = [0]
+        for i in range(1, m + 1):
+            cur.append(min(prev[i] + 1, cur[i - 1] + 1, prev[i - 1] + (pattern[i - 1] != ch)))
+        best = min(best, cur[m])
+        prev = cur
+    return best if best <= limit else None
+
+
+class NameIndex:
+    """
+    Индекс названий игр для поиска на каждое нажатие клавиши.
+
+    Отсортированный список (слово, id) отвечает на префиксные запросы бинарным
+    поиском, триграммы (триграмма -> множество id) — на подстроки от 3 символов.
+    Для нечеткого поиска рядом лежат латинские ключи названий и их биграммы.
+    Обновляется по одной игре вместе с кэшем каталога.
+    """
+
+    def __init__(self) -> None:
+        self.names: dict[int, str] = {}
+        self.words: List[tuple[str, int]] = []
+        self.grams: dict[str, set[int]] = {}
+        self.keys: dict[int, str] = {}
+        self.key_grams: dict[str, set[int]] = {}
+
+    def rebuild(self, games: Iterable) -> None:
+        self.clear()
+        words = []
+        for game in games:
+            name = self._index(game)
+            words.extend((word, game.id) for word in set(name.split()))
+        words.sort()
+        self.words = words
+
+    def add(self, game) -> None:
+        self.remove(game.id)
+        for word in set(self._index(game).split()):
+            insort(self.words, (word, game.id))
+
+    def remove(self, game_id: int) -> None:
+        name = self.names.pop(game_id, None)
+        if name is None:
+            return
+        for word in set(name.split()):
+            i = bisect_left(self.words, (word, game_id))
+            if i < len(self.words) and self.words[i] == (word, game_id):
+                del self.words[i]
+        self._discard(self.grams, trigrams(name), game_id)
+        self._discard(self.key_grams, bigrams(self.keys.pop(game_id)), game_id)
+
+    def clear(self) -> None:
+        self.names.clear()
+        self.words = []
+        self.grams.clear()
+        self.keys.clear()
+        self.key_grams.clear()
+
+    def _index(self, game) -> str:
+        name = self.names[game.id] = normalize(game.gameName)
+        for gram in trigrams(name):
+            self.grams.setdefault(gram, set()).add(game.id)
+        key = self.keys[game.id] = name.translate(_TRANSLIT)
+        for gram in bigrams(key):
+            self.key_grams.setdefault(gram, set()).add(game.id)
+        return name
+
+    @staticmethod
+    def _discard(postings: dict[str, set[int]], grams: set[str], game_id: int) -> None:
+        for gram in grams:
+            bucket = postings.get(gram)
+            if bucket is not None:
+                bucket.discard(game_id)
+                if not bucket:
+                    del postings[gram]
+
+    def prefix(self, query: str) -> set[int]:
+        """Игры, в названии которых есть слово, начинающееся с query"""
+        found = set()
+        i = bisect_left(self.words, (query,))
+        while i < len(self.words) and self.words[i][0].startswith(query):
+            found.add(self.words[i][1])
+            i += 1
+        return found
+
+    def search(self, query: str) -> List[int]:
+        """
+        id игр по нормализованному запросу: сначала названия, начинающиеся с него,
+        потом со словом на него, потом просто содержащие его.
+        """
+        if len(query) < 3:
+            found = self.prefix(query.split()[0]) if query else set(self.names)
+        else:
+            buckets = sorted((self.grams.get(g, set()) for g in trigrams(query)), key=len)
+            # пересечение от самой маленькой корзины, затем проверка подстрокой
+            found = {i for i in buckets[0].intersection(*buckets[1:]) if query in self.names[i]}
+
+        def rank(game_id: int) -> tuple:
+            name = self.names[game_id]
+            if name.startswith(query):
+                return 0, name, game_id
+            if f" {query}" in f" {name}":
+                return 1, name, game_id
+            return 2, name, game_id
+
+        return sorted(found, key=rank)
+
+    def fuzzy(self, query: str, limit: int) -> List[int]:
+        """
+        Нечеткий поиск: опечатки, транслит и неверная раскладка.
+
+        Кандидаты отбираются по биграммам: при k ошибках подстрока названия
+        сохраняет хотя бы (число биграмм запроса - 2k) из них, так что
+        расстояние считается только для горстки названий, а не для всего каталога.
+        """
+        variants = {fuzzy_key(query)}
+        variants.add(fuzzy_key(query.lower().translate(_LAYOUT)))
+        best: dict[int, int] = {}
+        for key in filter(None, variants):
+            limit_errors = max_errors(len(key))
+            grams = bigrams(key)
+            need = max(1, len(grams) - 2 * limit_errors)
+            counts = Counter()
+            for gram in grams:
+                counts.update(self.key_grams.get(gram, ()))
+            for game_id, shared in counts.items():
+                if shared < need:
+                    continue
+                distance = substring_distance(key, self.keys[game_id], limit_errors)
+                if distance is not None and distance < best.get(game_id, limit_errors + 1):
+                    best[game_id] = distance
+        ranked = sorted(best, key=lambda i: (best[i], len(self.keys[i]), self.names[i], i))
+        return ranked[:limit]
@@ -0,0 +1,120 @@
+# app/database/transfer.py
+"""
+Разбор файлов для /import и запись выгрузки для /export.
+
+Импорт принимает CSV (разделитель , ; или табуляция, UTF-8, можно с BOM)
+или JSON — список объектов либо {"games": [...]}. Колонки называются как поля
+модели (gameName, gameDesc, gameGenre, gamePhoto, gameAuthor) или по-русски:
+название, описание, жанр, фото, автор.
+"""
+import csv
+import io
+import json
+from typing import AsyncIterator, Iterable, List, Sequence
+
+from app.database.genres import parse_genres
+from app.database.search import normalize
+
+GAME_COLUMNS = ("gameName", "gameDesc", "gameGenre", "gamePhoto", "gameAuthor")
+EVENT_COLUMNS = ("id", "eventName", "eventDesc", "eventDateTime", "eventDuration",
+                 "eventLocation", "eventOrganizer", "eventAuthor", "recurRule", "recurUntil", "recurExceptions")
+
+_ALIASES = {
+    "name": "gameName", "название": "gameName", "игра": "gameName",
+    "description": "gameDesc", "desc": "gameDesc", "описание": "gameDesc",
+    "genre": "gameGenre", "genres": "gameGenre", "жанр": "gameGenre", "жанры": "gameGenre",
+    "photo": "gamePhoto", "фото": "gamePhoto", "картинка": "gamePhoto",
+    "author": "gameAuthor", "автор": "gameAuthor",
+}
+_ALIASES.update({column.lower(): column for column in GAME_COLUMNS})
+
+# длины колонок в таблице games
+_LIMITS = {"gameName": 100, "gameGenre": 100, "gamePhoto": 255, "gameAuthor": 100}
+
+
+def _records(data: bytes, filename: str) -> Iterable[tuple[int, dict]]:
+    """(номер строки или записи, сырой словарь) из файла"""
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("файл не в кодировке UTF-8")
+
+    if filename.lower().endswith(".json") or text.lstrip().startswith(("[", "{")):
+        try:
+            records = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON не разбирается: {e}")
+        if isinstance(records, dict):
+            records = records.get("games")
+        if not isinstance(records, list):
+            raise ValueError('в JSON ожидается список игр или {"games": [...]}')
+        return ((i, r if isinstance(r, dict) else {}) for i, r in enumerate(records, 1))
+
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(io.StringIO(text), dialect=dialect)
+    return ((reader.line_num, row) for row in reader)
+
+
+def _validate(record: dict) -> tuple[dict | None, str | None]:
+    row = {}
+    for key, value in record.items():
+        field = _ALIASES.get(str(key).strip().lower()) if key is not None else None
+        if field is None or value is None:
+            continue
+        value = " ".join(str(value).split()) if field != "gameDesc" else str(value).strip()
+        if value:
+            row[field] = value
+
+    if "gameName" not in row:
+        return None, "нет названия"
+    if "gamePhoto" not in row:
+        # каталог показывает карточки с фото, без него игру не отобразить
+        return None, "нет фото (file_id или ссылка)"
+    if "gameGenre" in row:
+        row["gameGenre"] = ", ".join(parse_genres(row["gameGenre"])) or None
+        if row["gameGenre"] is None:
+            del row["gameGenre"]
+    for field, limit in _LIMITS.items():
+        if len(row.get(field) or "") > limit:
+            return None, f"{field} длиннее {limit} символов"
+    return row, None
+
+
+def parse_import(data: bytes, filename: str) -> tuple[List[dict], List[tuple[int, str]]]:
+    """
+    Проверенные строки и ошибки по строкам.
+
+    Строка — словарь только с заполненными полями (для обновления пустая
+    ячейка значит «не трогать»). Повторы названия внутри файла (после
+    normalize) — ошибка, остается первая строка. ValueError — файл не читается.
+    """
+    rows: List[dict] = []
+    errors: List[tuple[int, str]] = []
+    seen: dict[str, int] = {}
+    for line, record in _records(data, filename):
+        row, error = _validate(record)
+        if error is not None:
+            errors.append((line, error))
+            continue
+        key = normalize(row["gameName"])
+        if key in seen:
+            errors.append((line, f"повтор строки {seen[key]}"))
+            continue
+        seen[key] = line
+        rows.append(row)
+    return rows, errors
+
+
+async def write_csv(path: str, columns: Sequence[str], batches: AsyncIterator[Sequence]) -> int:
+    """Записать пачки строк в CSV по мере чтения из БД; возвращает число строк"""
+    count = 0
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        async for batch in batches:
+            writer.writerows(batch)
+            count += len(batch)
+    return count
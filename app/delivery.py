@@ -0,0 +1,256 @@
+# app/delivery.py
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Any
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+
+# приоритеты: ответы пользователю идут раньше массовых рассылок
+INTERACTIVE = 0
+BULK = 1
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("delivery_priority", default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def bulk():
+    """Все отправки внутри блока уходят с низким приоритетом"""
+    token = _priority.set(BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def delay(self) -> float:
+        """Сколько секунд ждать до следующего токена (0 — можно отправлять)"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def block(self, seconds: float) -> None:
+        """Не выдавать токены seconds секунд (после ответа 429)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def idle(self) -> bool:
+        return self.delay() == 0.0 and self.tokens >= self.capacity
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "chat_id", "call", "future", "created", "retries")
+
+    def __init__(self, priority: int, seq: int, chat_id: Any, call, future: asyncio.Future) -> None:
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.call = call
+        self.future = future
+        self.created = time.monotonic()
+        self.retries = 0
+
+    def __lt__(self, other: "_Job") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Outbox(BaseRequestMiddleware):
+    """
+    Очередь исходящих запросов между хендлерами и Bot API.
+
+    Все методы с chat_id проходят через общую очередь с приоритетами:
+    глобальное ведро держит лимит ~30 сообщений/с, ведро чата — ~1 сообщение/с,
+    внутри одного чата порядок отправки сохраняется. На TelegramRetryAfter чат
+    замораживается на указанное время, и запрос повторяется.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        max_pending: int = 1000,
+        max_retries: int = 3,
+    ) -> None:
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._buckets: dict[Any, TokenBucket] = {}
+        self._pending: dict[Any, list[_Job]] = {}
+        self._ready: list[tuple[int, int, Any]] = []
+        self._busy: set = set()
+        self._waiting: set = set()
+        self._slots = asyncio.Semaphore(max_pending)
+        self._wakeup = asyncio.Event()
+        self._seq = itertools.count()
+        self._task: asyncio.Task | None = None
+        # запросы в полете: цикл событий держит задачи только слабыми ссылками
+        self._running: set[asyncio.Task] = set()
+        # метрики
+        self.queued = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.latencies: deque[float] = deque(maxlen=1000)
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            # getUpdates, answerCallbackQuery и т.п. не ограничиваются
+            return await make_request(bot, method)
+        return await self.submit(chat_id, lambda: make_request(bot, method))
+
+    async def submit(self, chat_id: Any, call, priority: int | None = None):
+        """Поставить запрос в очередь и дождаться его результата"""
+        if priority is None:
+            priority = _priority.get()
+        await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._dispatch())
+
+        job = _Job(priority, next(self._seq), chat_id, call, loop.create_future())
+        self.queued += 1
+        heapq.heappush(self._pending.setdefault(chat_id, []), job)
+        self._schedule(chat_id)
+        try:
+            return await job.future
+        finally:
+            self.queued -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+        return {
+            "queued": self.queued,
+            "active_chats": len(self._busy),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "latency_avg": sum(latencies) / len(latencies) if latencies else 0.0,
+            "latency_p95": p95,
+        }
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Остановить раздачу и дождаться уже отправляемых запросов (не дольше timeout)"""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._running:
+            _, pending = await asyncio.wait(self._running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def _bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if len(self._buckets) > 10000:
+                # не держим ведра всех чатов, которым когда-то писали
+                self._buckets = {k: b for k, b in self._buckets.items() if not b.idle()}
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _schedule(self, chat_id: Any) -> None:
+        """Поставить чат в очередь готовых, как только у него будет токен"""
+        jobs = self._pending.get(chat_id)
+        if not jobs:
+            self._pending.pop(chat_id, None)
+            return
+        if chat_id in self._busy or chat_id in self._waiting:
+            return
+        delay = self._bucket(chat_id).delay()
+        if delay > 0:
+            self._waiting.add(chat_id)
+            asyncio.get_running_loop().call_later(delay, self._wake, chat_id)
+            return
+        head = jobs[0]
+        self._busy.add(chat_id)
+        heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+        self._wakeup.set()
+
+    def _wake(self, chat_id: Any) -> None:
+        self._waiting.discard(chat_id)
+        self._schedule(chat_id)
+
+    async def _dispatch(self) -> None:
+        while True:
+            if not self._ready:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = self.global_bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, chat_id = heapq.heappop(self._ready)
+            job = heapq.heappop(self._pending[chat_id])
+            self.global_bucket.take()
+            self._bucket(chat_id).take()
+            task = asyncio.create_task(self._run(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, job: _Job) -> None:
+        try:
+            if job.future.cancelled():
+                return
+            try:
+                result = await job.call()
+            except asyncio.CancelledError:
+                # close() оборвал запрос: отправитель не должен ждать вечно
+                job.future.cancel()
+                raise
+            except TelegramRetryAfter as e:
+                if job.retries >= self.max_retries:
+                    self.failed += 1
+                    job.future.set_exception(e)
+                    return
+                # повторим тот же запрос первым, когда чат разморозится;
+                # при повторных 429 пауза удваивается
+                job.retries += 1
+                self.retried += 1
+                self._bucket(job.chat_id).block(e.retry_after * 2 ** (job.retries - 1))
+                heapq.heappush(self._pending.setdefault(job.chat_id, []), job)
+                return
+            except Exception as e:
+                self.failed += 1
+                if not job.future.cancelled():
+                    job.future.set_exception(e)
+                return
+            self.sent += 1
+            self.latencies.append(time.monotonic() - job.created)
+            if not job.future.cancelled():
+                job.future.set_result(result)
+        finally:
+            self._busy.discard(job.chat_id)
+            self._schedule(job.chat_id)
+
+
+outbox = Outbox()
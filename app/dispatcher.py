@@ -0,0 +1,50 @@
+# app/dispatcher.py
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.event.handler import HandlerObject
+
+from config import (TOKEN, ADMIN_IDS, MAX_CONCURRENT_UPDATES, MAX_QUEUED_UPDATES,
+                    THROTTLE_RATE, THROTTLE_BURST, THROTTLE_COSTS)
+from app.handlers import router, admin_router
+from app.delivery import Outbox, outbox
+from app.storage import SQLiteStorage
+from app.reminders import reminders
+from app.broadcast import broadcaster
+from app.middlewares import (ApiMetricsMiddleware, DbSessionMiddleware, ThrottlingMiddleware, setup_admin,
+                             setup_metrics, setup_throttling)
+from app.database.models import async_session
+from app.executor import UpdateExecutor
+
+
+def create_bot(sender: Outbox = outbox) -> Bot:
+    bot = Bot(token=TOKEN)
+    # все отправки идут через очередь с ограничением частоты
+    bot.session.middleware(sender)
+    # после очереди: меряем сам запрос к Telegram, без ожидания в очереди
+    bot.session.middleware(ApiMetricsMiddleware())
+    return bot
+
+
+def create_dispatcher() -> Dispatcher:
+    # состояния мастеров переживают перезапуск бота
+    db = Dispatcher(storage=SQLiteStorage())
+    db.include_router(router)
+    setup_metrics(router)
+    # после фильтров: цена действия берется из флага хендлера
+    setup_throttling(router, ThrottlingMiddleware(THROTTLE_RATE, THROTTLE_BURST, THROTTLE_COSTS))
+    # одна проверка прав на все хендлеры админки (внутренние middleware роутера-родителя идут раньше)
+    setup_admin(admin_router, ADMIN_IDS)
+    # очередь апдейтов с последовательной обработкой внутри чата
+    executor = UpdateExecutor(db, MAX_CONCURRENT_UPDATES, MAX_QUEUED_UPDATES)
+    db.update.outer_middleware(executor)
+    db["executor"] = executor
+    # после исполнителя: сессия открывается, когда апдейт реально обрабатывается
+    db.update.outer_middleware(DbSessionMiddleware(async_session))
+    # доработать принятые апдейты нужно до закрытия хранилища FSM (оно зарегистрировано первым)
+    db.shutdown.handlers.insert(0, HandlerObject(executor.close))
+    # напоминания о мероприятиях живут, пока работает диспетчер (при шардинге — в первом воркере)
+    db.startup.register(reminders.start)
+    db.shutdown.register(reminders.stop)
+    # прерванные рассылки продолжаются с контрольной точки
+    db.startup.register(broadcaster.resume)
+    db.shutdown.register(broadcaster.close)
+    return db
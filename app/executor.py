@@ -0,0 +1,163 @@
+# app/executor.py
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+from typing import Any
+
+from aiogram import BaseMiddleware, Router
+from aiogram.dispatcher.event.bases import CancelHandler, SkipHandler
+from aiogram.dispatcher.middlewares.error import ErrorsMiddleware
+from aiogram.types import Update
+
+from app.metrics import update_queue_seconds, updates_coalesced
+
+# тексты кнопок меню: повторное нажатие, пока первое не отработало, ничего не добавляет
+MENU_TEXTS = {"Анонсы", "Каталог игр", "О нас", "Контакты"}
+
+
+class _Job:
+    __slots__ = ("handler", "update", "data", "key", "queued")
+
+    def __init__(self, handler, update: Update, data: dict, key: tuple | None) -> None:
+        self.handler = handler
+        self.update = update
+        self.data = data
+        self.key = key
+        self.queued = time.perf_counter()
+
+
+class UpdateExecutor(BaseMiddleware):
+    """
+    Исполнитель апдейтов: внешний middleware на dp.update.
+
+    Апдейты одного чата выполняются строго по очереди (мастера не гоняются
+    за state.update_data), разных чатов — параллельно, не больше
+    max_concurrency одновременно; готовые чаты обслуживаются по кругу, так что
+    поток из одного чата не задерживает остальные. Повторное нажатие той же
+    кнопки, пока первое еще в очереди или выполняется, отбрасывается.
+
+    Middleware возвращает управление сразу после постановки в очередь;
+    если в очереди уже max_queued апдейтов, он ждет — polling перестает
+    забирать апдейты, вебхук медлит с ответом Telegram.
+
+    Хендлер выполняется уже после того, как ErrorsMiddleware диспетчера
+    вернул управление, поэтому воркер оборачивает его своим ErrorsMiddleware
+    того же роутера: исключения по-прежнему доходят до @router.error.
+    """
+
+    def __init__(self, router: Router, max_concurrency: int = 32, max_queued: int = 1000) -> None:
+        self._errors = ErrorsMiddleware(router)
+        self.max_concurrency = max_concurrency
+        self._slots = asyncio.Semaphore(max_queued)
+        self._chats: dict[Any, deque[_Job]] = {}
+        self._keys: dict[Any, set] = {}
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._workers: list[asyncio.Task] = []
+        self._pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        # вызываются с апдейтом, когда он обработан или отброшен как повтор (воркер шлет фронту ack)
+        self.listeners: list = []
+
+    async def __call__(self, handler, event: Update, data: dict):
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        chat_id = chat.id if chat else user.id if user else None
+        key = self._key(event)
+        if key is not None:
+            keys = self._keys.setdefault(chat_id, set())
+            if key in keys:
+                updates_coalesced.inc()
+                if event.callback_query is not None:
+                    # снять «часики» с кнопки, раз ответа не будет
+                    with contextlib.suppress(Exception):
+                        await event.callback_query.answer()
+                self._done(event)
+                return None
+            # ключ занимаем до ожидания места в очереди: повторные нажатия, пока прием
+            # стоит из-за backpressure, тоже должны отбрасываться
+            keys.add(key)
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            if key is not None:
+                self._release_key(chat_id, key)
+            raise
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.max_concurrency)]
+        self._pending += 1
+        self._idle.clear()
+        jobs = self._chats.get(chat_id)
+        if jobs is None:
+            # чат не в работе и не в очереди готовых — ставим
+            self._chats[chat_id] = deque([_Job(handler, event, data, key)])
+            self._ready.put_nowait(chat_id)
+        else:
+            jobs.append(_Job(handler, event, data, key))
+        return None
+
+    @staticmethod
+    def _key(update: Update) -> tuple | None:
+        if update.callback_query is not None:
+            callback = update.callback_query
+            message_id = callback.message.message_id if callback.message else callback.inline_message_id
+            return "callback", message_id, callback.data
+        if update.message is not None and update.message.text in MENU_TEXTS:
+            return "message", update.message.text
+        return None
+
+    async def _work(self) -> None:
+        while True:
+            chat_id = await self._ready.get()
+            jobs = self._chats[chat_id]
+            job = jobs.popleft()
+            update_queue_seconds.observe(time.perf_counter() - job.queued)
+            try:
+                state = job.data.get("state")
+                if state is not None:
+                    # FSM-middleware прочитал состояние при постановке в очередь, а предыдущий
+                    # апдейт чата мог его сменить (следующий шаг мастера) — перечитываем
+                    job.data["raw_state"] = await state.get_state()
+                await self._errors(job.handler, job.update, job.data)
+            except (SkipHandler, CancelHandler):
+                pass
+            except Exception as e:
+                # ни один обработчик ошибок не взялся — как aiogram при обычной обработке
+                logging.exception("Cause exception while process update id=%d: %s", job.update.update_id, e)
+            finally:
+                self._done(job.update)
+                if job.key is not None:
+                    self._release_key(chat_id, job.key)
+                self._slots.release()
+                self._pending -= 1
+                if jobs:
+                    # в конец круга: следующий апдейт чата после апдейтов других чатов
+                    self._ready.put_nowait(chat_id)
+                else:
+                    del self._chats[chat_id]
+                if not self._pending:
+                    self._idle.set()
+
+    def _release_key(self, chat_id: Any, key: tuple) -> None:
+        keys = self._keys[chat_id]
+        keys.discard(key)
+        if not keys:
+            del self._keys[chat_id]
+
+    def _done(self, update: Update) -> None:
+        for listener in self.listeners:
+            listener(update)
+
+    def stats(self) -> dict:
+        return {"pending": self._pending, "chats": len(self._chats)}
+
+    async def close(self, timeout: float = 30.0) -> None:
+        """Дождаться уже принятых апдейтов и остановить воркеры"""
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
@@ -1,19 +1,40 @@
 # app/handlers.py
 import datetime as dt
+import html
 import locale
+import contextlib
+import os
+import tempfile
+from functools import partial
 from aiogram import F, Router
-from aiogram.filters import CommandStart, Command
-from aiogram.types import Message, CallbackQuery
+from aiogram.filters import CommandStart, Command, CommandObject
+from aiogram.types import (Message, CallbackQuery, InputMediaPhoto, InlineQuery, FSInputFile, ReplyKeyboardRemove,
+                           InlineQueryResultCachedPhoto, InlineQueryResultPhoto, InlineQueryResultArticle,
+                           InputTextMessageContent)
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
+from aiogram.exceptions import TelegramBadRequest
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import app.keyboards as kb
+from app.callbacks import (NOOP, GameAction, GameOp, GenreAction, GenreOp, CatalogPage, Rsvp,
+                           BroadcastAction, BroadcastOp, AdminList, ListOp)
 import app.database.requests as rq
-from config import ADMIN_IDS
+from app.database.genres import parse_genres
+from app.database.recurrence import RULES, format_exceptions
+from app.database.transfer import GAME_COLUMNS, EVENT_COLUMNS, parse_import, write_csv
+from app.delivery import bulk, Outbox
+from app import metrics
+from app.texts import stats_text, import_report
+from app.reminders import reminders
+from app.broadcast import broadcaster
 
 locale.setlocale(locale.LC_TIME, 'ru_RU.UTF-8')
 
 router = Router()
+# команды и кнопки админов; права проверяет AdminMiddleware (app/dispatcher.py)
+admin_router = Router(name="admin")
+router.include_router(admin_router)
 
 
 # ==========================
@@ -23,10 +44,14 @@ class AddEvent(StatesGroup):
     eventName = State()
     eventDesc = State()
     eventDateTime = State()
+    eventRecur = State()
+    eventRecurUntil = State()
+    eventRecurExceptions = State()
     eventDuration = State()
     eventLocation = State()
     eventOrganizer = State()
     eventAuthor = State()
+    confirm = State()
 
 
 # ==========================
@@ -53,21 +78,30 @@ class EditGame(StatesGroup):
     new_value = State()
 
 
+class AdminFind(StatesGroup):
+    query = State()
+
+
+class ImportGames(StatesGroup):
+    document = State()
+
+
+class BroadcastMessage(StatesGroup):
+    message = State()
+    confirm = State()
+
+
 # ==========================
 # --- ОБЩИЕ КОМАНДЫ
 # ==========================
-@router.message(CommandStart())
-async def cmd_start(message: Message):
-    await rq.set_user(message.from_user.id)
+@router.message(CommandStart(), flags={"throttle": "start"})
+async def cmd_start(message: Message, session: AsyncSession):
+    await rq.set_user(message.from_user.id, session=session)
     await message.answer('Привет! Ты попал в бот клуба "Игры разума"', reply_markup=kb.main)
 
 
-@router.message(Command("help"))
+@admin_router.message(Command("help"))
 async def cmd_help(message: Message):
-    if not is_admin(message.from_user.id):
-        await message.answer("❌ У вас нет прав доступа к этой команде.")
-        return
-    
     # Полная справка только для админов
     help_text = (
         "📖 *Справка по командам бота*\n\n"
@@ -78,23 +112,32 @@ async def cmd_help(message: Message):
         
         "🔹 *Работа с мероприятиями:*\n"
         "• `/add` — добавить новое мероприятие в календарь\n"
-        "  _Процесс добавления: название → описание → дата/время → длительность → локация → организатор → автор_\n"
-        "• `Анонсы` (кнопка в меню) — просмотр всех предстоящих мероприятий\n\n"
+        "  _Процесс добавления: название → описание → дата/время → повтор → длительность → локация → организатор → автор_\n"
+        "  _Повтор: каждую неделю, раз в две недели или раз в месяц, с датой окончания и датами без встречи "
+        "(`/skip` — пропустить шаг)_\n"
+        "• `Анонсы` (кнопка в меню) — просмотр всех предстоящих мероприятий\n"
+        "  _Кнопка «Иду» записывает на мероприятие: бот напомнит за сутки и за час до начала_\n\n"
         
         "🔹 *Работа с играми:*\n"
         "• `/addgame` — добавить новую игру в каталог\n"
         "  _Процесс добавления: название → описание → жанр → фото → автор_\n"
-        "• `/search` — поиск игры по названию или части названия\n"
+        "• `/search` — поиск игры по названию, описанию или жанру\n"
         "• `Каталог игр` (кнопка в меню) — просмотр всех игр с фильтрацией по жанрам\n\n"
         
         "🔐 *Админ-команды:*\n"
         "• `/admin_games` — управление играми в каталоге\n"
-        "  _Позволяет просмотреть все игры, редактировать их поля (название, описание, жанр, фото, автор) или удалить игру_\n\n"
+        "  _Список по 10 игр с листанием, переходом по букве (🔤) и поиском (🔍); "
+        "у игры можно изменить поля (название, описание, жанр, фото, автор) или удалить ее_\n"
+        "• `/import` — загрузить игры из CSV или JSON; `/import upsert` — заодно обновить уже существующие\n"
+        "• `/export` — выгрузить игры и мероприятия в CSV\n"
+        "• `/broadcast` — разослать сообщение всем пользователям бота\n"
+        "• `/stats` — время работы хендлеров, запросов к БД и Bot API\n\n"
         
         "💡 *Советы:*\n"
         "• Используйте кнопки меню для быстрого доступа к основным функциям\n"
         "• При добавлении мероприятия дату вводите в формате: `дд/мм/гггг чч:мм:сс`\n"
         "• Для поиска игры можно вводить часть названия\n"
+        "• Искать можно в любом чате: напишите `@имя_бота` и начало названия игры\n"
         "• Админ может редактировать любую игру через команду `/admin_games`"
     )
     
@@ -104,22 +147,36 @@ async def cmd_help(message: Message):
 # ==========================
 # --- АНОНСЫ (мероприятия)
 # ==========================
-@router.message(F.text == "Анонсы")
-async def eventlist(message: Message):
-    events = await rq.get_events()
-    if not events:
+@router.message(F.text == "Анонсы", flags={"throttle": "events"})
+async def eventlist(message: Message, session: AsyncSession):
+    pages = await rq.get_events_digest(session=session)
+    if not pages:
         await message.answer("Пока нет предстоящих мероприятий 😔")
         return
 
-    for event in events:
-        end_time = event.eventDateTime + dt.timedelta(minutes=event.eventDuration)
-        text = (f"*{event.eventName}*\n"
-                f"_{event.eventDesc}_\n\n"
-                f"{event.eventDateTime.day} {event.eventDateTime.strftime('%B')}\n"
-                f"С *{event.eventDateTime.strftime('%H:%M')}* до *{end_time.strftime('%H:%M')}*\n"
-                f"📍 {event.eventLocation}\n"
-                f"👤 Организатор: {event.eventOrganizer}")
-        await message.answer(text, parse_mode="Markdown")
+    # один дайджест вместо сообщения на каждое мероприятие, кнопки «Иду» — под последней частью
+    for text in pages[:-1]:
+        await message.answer(text, parse_mode="HTML")
+    events = await rq.get_events(session=session)
+    await message.answer(pages[-1], parse_mode="HTML", reply_markup=kb.rsvp_keyboard(events))
+
+
+@router.callback_query(Rsvp.filter())
+async def rsvp(callback: CallbackQuery, callback_data: Rsvp, session: AsyncSession):
+    event_id = callback_data.event_id
+    event = next((e for e in await rq.get_events(session=session) if e.id == event_id), None)
+    if event is None:
+        await callback.answer("Это мероприятие уже прошло", show_alert=True)
+        return
+
+    going = await rq.toggle_subscription(event_id, callback.from_user.id, session=session)
+    if going:
+        reminders.schedule(event.id, event.eventDateTime)
+        when = "каждого проведения" if event.recurRule else "начала"
+        await callback.answer(f"✅ Записали на «{event.eventName}». Напомним за сутки и за час до {when}",
+                              show_alert=True)
+    else:
+        await callback.answer(f"Запись на «{event.eventName}» отменена")
 
 
 # ==========================
@@ -150,12 +207,67 @@ async def add_eventDuration(message: Message, state: FSMContext):
     try:
         date = dt.datetime.strptime(message.text, "%d/%m/%Y %H:%M:%S")
         await state.update_data(eventDateTime=date)
-        await state.set_state(AddEvent.eventDuration)
-        await message.answer("Введи длительность мероприятия (в минутах):")
+        await state.set_state(AddEvent.eventRecur)
+        await message.answer("Повторять мероприятие?", reply_markup=kb.event_recur)
     except Exception:
         await message.answer("⛔ Неверный формат. Пример: 25/12/2025 18:00:00")
 
 
+# --- повтор: правило, последний день серии, отмененные даты (/skip — пропустить шаг)
+RECUR_CHOICES = {title.capitalize(): rule for rule, title in RULES.items()}
+
+
+async def ask_event_duration(message: Message, state: FSMContext):
+    await state.set_state(AddEvent.eventDuration)
+    await message.answer("Введи длительность мероприятия (в минутах):", reply_markup=ReplyKeyboardRemove())
+
+
+@router.message(AddEvent.eventRecur)
+async def add_eventRecur(message: Message, state: FSMContext):
+    if message.text in ("Разово", "/skip"):
+        await state.update_data(recurRule=None, recurUntil=None, recurExceptions=None)
+        await ask_event_duration(message, state)
+        return
+    if message.text not in RECUR_CHOICES:
+        await message.answer("⛔ Выбери вариант на клавиатуре", reply_markup=kb.event_recur)
+        return
+    await state.update_data(recurRule=RECUR_CHOICES[message.text])
+    await state.set_state(AddEvent.eventRecurUntil)
+    await message.answer('До какой даты повторять? Формат "%d/%m/%Y", /skip — без конца',
+                         reply_markup=ReplyKeyboardRemove())
+
+
+@router.message(AddEvent.eventRecurUntil)
+async def add_eventRecurUntil(message: Message, state: FSMContext):
+    until = None
+    if message.text != "/skip":
+        try:
+            until = dt.datetime.strptime(message.text or "", "%d/%m/%Y")
+        except ValueError:
+            await message.answer("⛔ Неверный формат. Пример: 31/05/2026")
+            return
+        if until.date() < (await state.get_data())["eventDateTime"].date():
+            await message.answer("⛔ Серия не может закончиться раньше первой встречи")
+            return
+    await state.update_data(recurUntil=until)
+    await state.set_state(AddEvent.eventRecurExceptions)
+    await message.answer('Даты без встречи через запятую в формате "%d/%m/%Y", /skip — без исключений')
+
+
+@router.message(AddEvent.eventRecurExceptions)
+async def add_eventRecurExceptions(message: Message, state: FSMContext):
+    skipped = []
+    if message.text != "/skip":
+        try:
+            skipped = [dt.datetime.strptime(part.strip(), "%d/%m/%Y").date()
+                       for part in (message.text or "").split(",") if part.strip()]
+        except ValueError:
+            await message.answer("⛔ Неверный формат. Пример: 31/12/2025, 07/01/2026")
+            return
+    await state.update_data(recurExceptions=format_exceptions(skipped))
+    await ask_event_duration(message, state)
+
+
 @router.message(AddEvent.eventDuration)
 async def add_eventLocation(message: Message, state: FSMContext):
     try:
@@ -184,58 +296,129 @@ async def add_eventAuthor(message: Message, state: FSMContext):
 @router.message(AddEvent.eventAuthor)
 async def event_confirm(message: Message, state: FSMContext):
     await state.update_data(eventAuthor=message.text)
+    # кнопки подтверждения — отдельный шаг, иначе их текст попал бы в автора
+    await state.set_state(AddEvent.confirm)
     data = await state.get_data()
 
-    text = (f"*ПРОВЕРКА*\n\n"
-            f"*{data['eventName']}*\n"
-            f"_{data['eventDesc']}_\n\n"
+    recur = ""
+    if data.get("recurRule"):
+        recur = f"🔁 {RULES[data['recurRule']].capitalize()}"
+        if data.get("recurUntil"):
+            recur += f" до {data['recurUntil'].strftime('%d %B %Y')}"
+        if data.get("recurExceptions"):
+            recur += f", кроме {data['recurExceptions'].count(',') + 1} дат"
+        recur += "\n"
+    # поля ввел организатор — экранируем, как в карточке мероприятия (app/texts.py)
+    text = (f"<b>ПРОВЕРКА</b>\n\n"
+            f"<b>{html.escape(data['eventName'] or '')}</b>\n"
+            f"<i>{html.escape(data['eventDesc'] or '')}</i>\n\n"
             f"{data['eventDateTime'].strftime('%d %B %Y %H:%M')} "
             f"на {data['eventDuration']} мин.\n"
-            f"📍 {data['eventLocation']}\n"
-            f"Организатор: {data['eventOrganizer']}\n"
-            f"Автор: {data['eventAuthor']}")
-    await message.answer(text, parse_mode="Markdown", reply_markup=kb.event_edit)
+            f"{recur}"
+            f"📍 {html.escape(data['eventLocation'] or '')}\n"
+            f"Организатор: {html.escape(data['eventOrganizer'] or '')}\n"
+            f"Автор: {html.escape(data['eventAuthor'] or '')}")
+    await message.answer(text, parse_mode="HTML", reply_markup=kb.event_edit)
 
 
-@router.message(AddEvent.eventAuthor, F.text == "Подтвердить")
-async def confirm_event(message: Message, state: FSMContext):
+@router.message(AddEvent.confirm, F.text == "Подтвердить")
+async def confirm_event(message: Message, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
-    await rq.add_event(data)
+    await rq.add_event(data, session=session)
     await state.clear()
     await message.answer("✅ Мероприятие добавлено!", reply_markup=kb.main)
 
 
-@router.message(AddEvent.eventAuthor, F.text == "Отмена")
+@router.message(AddEvent.confirm, F.text == "Отмена")
 async def cancel_event(message: Message, state: FSMContext):
     await state.clear()
     await message.answer("❌ Добавление мероприятия отменено.", reply_markup=kb.main)
 
 
-@router.message(AddEvent.eventAuthor, F.text == "Изменить")
+@router.message(AddEvent.confirm, F.text == "Изменить")
 async def edit_event_restart(message: Message, state: FSMContext):
     await state.clear()
     await state.set_state(AddEvent.eventName)
-    await message.answer("Введи новое название мероприятия:")
+    await message.answer("Введи новое название мероприятия:", reply_markup=ReplyKeyboardRemove())
+
+
+@router.message(AddEvent.confirm)
+async def event_confirm_unknown(message: Message):
+    await message.answer("Выбери действие на клавиатуре", reply_markup=kb.event_edit)
 
 
 # ==========================
 # --- КАТАЛОГ ИГР
 # ==========================
-@router.message(F.text == "Каталог игр")
-async def show_games(message: Message):
-    games = await rq.get_all_games()
-    if not games:
+def game_caption(game) -> str:
+    return (f"*{game.gameName}*\n"
+            f"_{game.gameGenre}_\n\n"
+            f"{game.gameDesc}\n\n"
+            f"Добавил: {game.gameAuthor}")
+
+
+# сколько последних отфильтрованных каруселей чата помнят свой фильтр
+CATALOG_FILTERS = 10
+
+
+async def remember_catalog_filter(state: FSMContext, message_id: int, genres: list[int], mode: str) -> None:
+    """Снимок фильтра для карусели message_id: каждая карточка листает свою выборку"""
+    filters = dict((await state.get_data()).get("catalog_filters", {}))
+    # ключи JSON — строки
+    filters[str(message_id)] = {"genres": genres, "mode": mode}
+    await state.update_data(catalog_filters=dict(list(filters.items())[-CATALOG_FILTERS:]))
+
+
+async def catalog_page_games(state: FSMContext, message_id: int, page: int) -> tuple[list, int]:
+    """Страница карусели: весь каталог или игры под фильтр, с которым ее открыли"""
+    snapshot = (await state.get_data()).get("catalog_filters", {}).get(str(message_id))
+    if snapshot:
+        games, _ = await rq.filter_games(snapshot["genres"], snapshot["mode"])
+        return games[page:page + 1], len(games)
+    return await rq.get_games_page(page, 1)
+
+
+@router.message(F.text == "Каталог игр", flags={"throttle": "catalog"})
+async def show_games(message: Message, state: FSMContext):
+    games, total = await rq.get_games_page(0, 1)
+    if not total:
         await message.answer("Каталог пока пуст 😔")
         return
 
-    await message.answer("🎲 Каталог настольных игр:", reply_markup=kb.genre_keyboard())
+    await state.update_data(genres_selected=[], genres_mode="and")
+    genres = await rq.get_genres()
+    _, counts = await rq.filter_games([])
+    await message.answer("🎲 Каталог настольных игр:", reply_markup=kb.genre_keyboard(genres, counts=counts))
+
+    # одна карточка-карусель вместо отдельного сообщения на каждую игру
+    game = games[0]
+    await message.answer_photo(photo=game.gamePhoto, caption=game_caption(game),
+                               parse_mode="Markdown", reply_markup=kb.catalog_keyboard(0, total))
+
+
+@router.callback_query(CatalogPage.filter())
+async def catalog_page(callback: CallbackQuery, callback_data: CatalogPage, state: FSMContext):
+    page, message_id = callback_data.page, callback.message.message_id
+    games, total = await catalog_page_games(state, message_id, page)
+    if not games and total:
+        # каталог уменьшился, пока карточка была открыта
+        page = total - 1
+        games, total = await catalog_page_games(state, message_id, page)
+    if not games:
+        await callback.answer("Каталог пока пуст 😔")
+        return
 
-    for game in games:
-        caption = (f"*{game.gameName}*\n"
-                   f"_{game.gameGenre}_\n\n"
-                   f"{game.gameDesc}\n\n"
-                   f"Добавил: {game.gameAuthor}")
-        await message.answer_photo(photo=game.gamePhoto, caption=caption, parse_mode="Markdown")
+    game = games[0]
+    await callback.message.edit_media(
+        InputMediaPhoto(media=game.gamePhoto, caption=game_caption(game), parse_mode="Markdown"),
+        reply_markup=kb.catalog_keyboard(page, total)
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data == NOOP)
+async def noop(callback: CallbackQuery):
+    await callback.answer()
 
 
 # ==========================
@@ -263,7 +446,11 @@ async def add_game_genre(message: Message, state: FSMContext):
 
 @router.message(AddGame.gameGenre)
 async def add_game_photo(message: Message, state: FSMContext):
-    await state.update_data(gameGenre=message.text)
+    tags = parse_genres(message.text)
+    if not tags:
+        await message.answer("⛔ Укажи хотя бы один жанр, через запятую:")
+        return
+    await state.update_data(gameGenre=", ".join(tags))
     await state.set_state(AddGame.gamePhoto)
     await message.answer("Отправь фото игры:")
 
@@ -277,10 +464,10 @@ async def receive_game_photo(message: Message, state: FSMContext):
 
 
 @router.message(AddGame.gameAuthor)
-async def finalize_game(message: Message, state: FSMContext):
+async def finalize_game(message: Message, state: FSMContext, session: AsyncSession):
     await state.update_data(gameAuthor=message.text)
     data = await state.get_data()
-    await rq.add_game(data)
+    await rq.add_game(data, session=session)
     await state.clear()
     await message.answer("✅ Игра успешно добавлена!", reply_markup=kb.main)
 
@@ -294,71 +481,233 @@ async def search_start(message: Message, state: FSMContext):
     await message.answer("🔍 Введи название или часть названия игры:")
 
 
-@router.message(SearchGame.query)
-async def search_games(message: Message, state: FSMContext):
+@router.message(SearchGame.query, flags={"throttle": "search"})
+async def search_games(message: Message, state: FSMContext, session: AsyncSession):
     query = message.text
     await state.clear()
-    games = await rq.search_games_by_name(query)
+    games = await rq.search_games_by_name(query, session=session)
     if not games:
-        await message.answer("❌ Ничего не найдено.")
-        return
+        games = await rq.search_games_fuzzy(query)
+        if not games:
+            await message.answer("❌ Ничего не найдено.")
+            return
+        await message.answer(f"🤔 Точных совпадений нет. Возможно, вы имели в виду «{games[0].gameName}»?")
+
+    with bulk():
+        for game in games:
+            caption = f"*{game.gameName}*\n_{game.gameGenre}_\n\n{game.gameDesc}"
+            await message.answer_photo(photo=game.gamePhoto, caption=caption, parse_mode="Markdown")
 
+
+# ==========================
+# --- ИНЛАЙН-ПОИСК (@bot название)
+# ==========================
+INLINE_PAGE = 20
+
+
+@router.inline_query()
+async def inline_search(inline_query: InlineQuery):
+    offset = int(inline_query.offset or 0)
+    games, total = await rq.search_games_inline(inline_query.query, offset, INLINE_PAGE)
+
+    results = []
     for game in games:
-        caption = f"*{game.gameName}*\n_{game.gameGenre}_\n\n{game.gameDesc}"
-        await message.answer_photo(photo=game.gamePhoto, caption=caption, parse_mode="Markdown")
+        if game.gamePhoto and game.gamePhoto.startswith("http"):
+            results.append(InlineQueryResultPhoto(
+                id=str(game.id), photo_url=game.gamePhoto, thumbnail_url=game.gamePhoto, title=game.gameName,
+                description=game.gameGenre, caption=game_caption(game), parse_mode="Markdown",
+            ))
+        elif game.gamePhoto:
+            results.append(InlineQueryResultCachedPhoto(
+                id=str(game.id), photo_file_id=game.gamePhoto, title=game.gameName,
+                description=game.gameGenre, caption=game_caption(game), parse_mode="Markdown",
+            ))
+        else:
+            results.append(InlineQueryResultArticle(
+                id=str(game.id), title=game.gameName, description=game.gameGenre,
+                input_message_content=InputTextMessageContent(message_text=game_caption(game), parse_mode="Markdown"),
+            ))
+
+    next_offset = offset + len(games)
+    # выдача одинакова для всех, каталог меняется редко — пусть Telegram кэширует
+    await inline_query.answer(results, cache_time=300, is_personal=False,
+                              next_offset=str(next_offset) if next_offset < total else "")
 
 
 # ==========================
 # --- ФИЛЬТР ПО ЖАНРАМ
 # ==========================
-@router.callback_query(F.data.startswith("genre_"))
-async def filter_by_genre(callback: CallbackQuery, state: FSMContext):
-    genre = callback.data.split("_", 1)[1]
-    games = await rq.get_games_by_genre(genre)
+async def redraw_genre_keyboard(callback: CallbackQuery, selected: list[int], mode: str):
+    """Перерисовать кнопки жанров на месте; все считается по кэшу, без БД"""
+    genres = await rq.get_genres()
+    games, counts = await rq.filter_games(selected, mode)
+    await callback.message.edit_reply_markup(
+        reply_markup=kb.genre_keyboard(genres, selected, counts, mode, found=len(games))
+    )
+    await callback.answer()
+
+
+async def genre_toggle_mode(callback: CallbackQuery, genre_id: int, state: FSMContext):
+    data = await state.get_data()
+    mode = "or" if data.get("genres_mode", "and") == "and" else "and"
+    await state.update_data(genres_mode=mode)
+    await redraw_genre_keyboard(callback, data.get("genres_selected", []), mode)
+
+
+async def genre_reset(callback: CallbackQuery, genre_id: int, state: FSMContext):
+    data = await state.get_data()
+    await state.update_data(genres_selected=[])
+    await redraw_genre_keyboard(callback, [], data.get("genres_mode", "and"))
 
+
+@router.callback_query(GenreAction.filter(F.op == GenreOp.show), flags={"throttle": "search"})
+async def genre_show(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    selected = data.get("genres_selected", [])
+    mode = data.get("genres_mode", "and")
+    games, _ = await rq.filter_games(selected, mode)
     if not games:
-        await callback.message.answer(f"Нет игр жанра *{genre}* 😔", parse_mode="Markdown")
+        await callback.answer("Под выбранные жанры игр нет 😔", show_alert=True)
         return
 
-    for game in games:
-        caption = f"*{game.gameName}*\n_{game.gameGenre}_\n\n{game.gameDesc}"
-        await callback.message.answer_photo(photo=game.gamePhoto, caption=caption, parse_mode="Markdown")
-
+    game = games[0]
+    sent = await callback.message.answer_photo(photo=game.gamePhoto, caption=game_caption(game),
+                                               parse_mode="Markdown", reply_markup=kb.catalog_keyboard(0, len(games)))
+    # карусель листает снимок фильтра, дальнейшие нажатия и другие карусели ее не меняют
+    await remember_catalog_filter(state, sent.message_id, selected, mode)
     await callback.answer()
 
 
+async def filter_by_genre(callback: CallbackQuery, genre_id: int, state: FSMContext):
+    data = await state.get_data()
+    selected = list(data.get("genres_selected", []))
+    if genre_id in selected:
+        selected.remove(genre_id)
+    else:
+        selected.append(genre_id)
+    await state.update_data(genres_selected=selected)
+    await redraw_genre_keyboard(callback, selected, data.get("genres_mode", "and"))
+
+
+GENRE_ACTIONS = {
+    GenreOp.toggle: filter_by_genre,
+    GenreOp.mode: genre_toggle_mode,
+    GenreOp.reset: genre_reset,
+}
+
+
+@router.callback_query(GenreAction.filter())
+async def genre_action(callback: CallbackQuery, callback_data: GenreAction, state: FSMContext):
+    await GENRE_ACTIONS[callback_data.op](callback, callback_data.id, state)
+
+
 # ==========================
 # --- АДМИН: УПРАВЛЕНИЕ ИГРАМИ
 # ==========================
-def is_admin(user_id: int) -> bool:
-    """Проверка, является ли пользователь администратором"""
-    return user_id in ADMIN_IDS
+async def render_admin_list(state: FSMContext, session: AsyncSession, op: ListOp = ListOp.first,
+                            game_id: int = 0) -> tuple[str, object]:
+    """Текст и кнопки страницы списка игр; читает из БД только строки страницы"""
+    data = await state.get_data()
+    query = data.get("admin_find", "")
+    has_prev = has_next = False
+    rows = []
+    if op == ListOp.next:
+        rows, has_next = await rq.get_admin_games_page(after=game_id, query=query, session=session)
+        has_prev = True
+    elif op == ListOp.prev:
+        rows, has_prev = await rq.get_admin_games_page(before=game_id, query=query, session=session)
+        has_next = True
+    elif op == ListOp.letter:
+        # game_id — номер буквы в панели, которую видел админ
+        letters = data.get("admin_letters", [])
+        if game_id < len(letters):
+            rows, has_next = await rq.get_admin_games_page(start=letters[game_id], query=query, session=session)
+            has_prev = True
+    if not rows:
+        # первая страница, или соседняя страница исчезла (игры удалили, пока список был открыт)
+        rows, has_next = await rq.get_admin_games_page(query=query, session=session)
+        has_prev = False
+
+    title = f"📋 Игры каталога — поиск «{query}»" if query else "📋 Игры каталога"
+    if not rows:
+        return f"{title}\n\n📭 Ничего не найдено." if query else "📭 Каталог игр пуст.", \
+            kb.admin_games_page_keyboard(rows, False, False, bool(query))
+    text = f"{title}\nС «{rows[0][1]}» по «{rows[-1][1]}»\n\nВыберите игру для редактирования:"
+    return text, kb.admin_games_page_keyboard(rows, has_prev, has_next, bool(query))
+
+
+@admin_router.message(Command("admin_games"))
+async def admin_games_list(message: Message, state: FSMContext, session: AsyncSession):
+    """Команда для админов: постраничный список игр с возможностью редактирования"""
+    await state.update_data(admin_find="")
+    text, markup = await render_admin_list(state, session)
+    await message.answer(text, reply_markup=markup)
+
+
+async def admin_list_page(callback: CallbackQuery, data: AdminList, state: FSMContext, session: AsyncSession):
+    text, markup = await render_admin_list(state, session, data.op, data.id)
+    # страница могла не измениться (тот же список после сброса) — Telegram ответит ошибкой
+    with contextlib.suppress(TelegramBadRequest):
+        await callback.message.edit_text(text, reply_markup=markup)
+    await callback.answer()
 
 
-@router.message(Command("admin_games"))
-async def admin_games_list(message: Message):
-    """Команда для админов: список всех игр с возможностью редактирования"""
-    if not is_admin(message.from_user.id):
-        await message.answer("❌ У вас нет прав доступа к этой команде.")
-        return
+async def admin_list_letters(callback: CallbackQuery, data: AdminList, state: FSMContext, session: AsyncSession):
+    query = (await state.get_data()).get("admin_find", "")
+    # лимит Telegram — 100 кнопок на сообщение
+    letters = (await rq.get_admin_initials(query, session=session))[:96]
+    # в кнопках только номера букв
+    await state.update_data(admin_letters=letters)
+    await callback.message.edit_reply_markup(reply_markup=kb.admin_letters_keyboard(letters))
+    await callback.answer()
 
-    games = await rq.get_all_games()
-    if not games:
-        await message.answer("📭 Каталог игр пуст.")
-        return
 
-    text = f"📋 *Список всех игр* ({len(games)} шт.):\n\nВыберите игру для редактирования:"
-    await message.answer(text, parse_mode="Markdown", reply_markup=kb.admin_games_list_keyboard(games))
+async def admin_list_find(callback: CallbackQuery, data: AdminList, state: FSMContext, session: AsyncSession):
+    await state.update_data(admin_list_message=callback.message.message_id)
+    await state.set_state(AdminFind.query)
+    await callback.message.answer("🔍 Введите часть названия игры:")
+    await callback.answer()
 
 
-@router.callback_query(F.data.startswith("admin_edit_game_"))
-async def admin_show_game_details(callback: CallbackQuery, state: FSMContext):
-    """Показать детали игры и опции редактирования"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("❌ У вас нет прав доступа.", show_alert=True)
-        return
+async def admin_list_reset(callback: CallbackQuery, data: AdminList, state: FSMContext, session: AsyncSession):
+    await state.update_data(admin_find="")
+    await admin_list_page(callback, AdminList(op=ListOp.first), state, session)
+
 
-    game_id = int(callback.data.split("_")[-1])
+LIST_ACTIONS = {
+    ListOp.first: admin_list_page,
+    ListOp.next: admin_list_page,
+    ListOp.prev: admin_list_page,
+    ListOp.letter: admin_list_page,
+    ListOp.letters: admin_list_letters,
+    ListOp.find: admin_list_find,
+    ListOp.reset: admin_list_reset,
+}
+
+
+@admin_router.callback_query(AdminList.filter())
+async def admin_list_action(callback: CallbackQuery, callback_data: AdminList, state: FSMContext,
+                            session: AsyncSession):
+    await LIST_ACTIONS[callback_data.op](callback, callback_data, state, session)
+
+
+@admin_router.message(AdminFind.query, F.text)
+async def admin_list_query(message: Message, state: FSMContext, session: AsyncSession):
+    """Сузить список до игр с этой строкой в названии и перерисовать его на месте"""
+    await state.set_state(None)
+    await state.update_data(admin_find=" ".join(message.text.split())[:50])
+    text, markup = await render_admin_list(state, session)
+    list_message = (await state.get_data()).get("admin_list_message")
+    try:
+        await message.bot.edit_message_text(text, chat_id=message.chat.id, message_id=list_message,
+                                            reply_markup=markup)
+    except TelegramBadRequest:
+        # список слишком старый или удален — пришлем новый
+        await message.answer(text, reply_markup=markup)
+
+
+async def admin_show_game_details(callback: CallbackQuery, game_id: int, state: FSMContext, session: AsyncSession):
+    """Показать детали игры и опции редактирования"""
     game = await rq.get_game_by_id(game_id)
 
     if not game:
@@ -387,123 +736,81 @@ async def admin_show_game_details(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("admin_edit_name_"))
-async def admin_edit_game_name(callback: CallbackQuery, state: FSMContext):
-    """Начать редактирование названия игры"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("❌ У вас нет прав доступа.", show_alert=True)
-        return
-
-    game_id = int(callback.data.split("_")[-1])
-    await state.update_data(game_id=game_id, field="gameName")
+async def admin_start_edit(field: str, prompt: str, callback: CallbackQuery, game_id: int, state: FSMContext,
+                           session: AsyncSession):
+    """Начать редактирование поля игры: следующее сообщение админа — новое значение"""
+    await state.update_data(game_id=game_id, field=field)
     await state.set_state(EditGame.new_value)
-    await callback.message.answer("✏️ Введите новое название игры:")
+    await callback.message.answer(prompt)
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("admin_edit_desc_"))
-async def admin_edit_game_desc(callback: CallbackQuery, state: FSMContext):
-    """Начать редактирование описания игры"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("❌ У вас нет прав доступа.", show_alert=True)
-        return
-
-    game_id = int(callback.data.split("_")[-1])
-    await state.update_data(game_id=game_id, field="gameDesc")
-    await state.set_state(EditGame.new_value)
-    await callback.message.answer("✏️ Введите новое описание игры:")
-    await callback.answer()
-
-
-@router.callback_query(F.data.startswith("admin_edit_genre_"))
-async def admin_edit_game_genre(callback: CallbackQuery, state: FSMContext):
-    """Начать редактирование жанра игры"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("❌ У вас нет прав доступа.", show_alert=True)
-        return
-
-    game_id = int(callback.data.split("_")[-1])
-    await state.update_data(game_id=game_id, field="gameGenre")
-    await state.set_state(EditGame.new_value)
-    await callback.message.answer("✏️ Введите новый жанр игры:")
-    await callback.answer()
-
-
-@router.callback_query(F.data.startswith("admin_edit_photo_"))
-async def admin_edit_game_photo(callback: CallbackQuery, state: FSMContext):
-    """Начать редактирование фото игры"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("❌ У вас нет прав доступа.", show_alert=True)
-        return
-
-    game_id = int(callback.data.split("_")[-1])
-    await state.update_data(game_id=game_id, field="gamePhoto")
-    await state.set_state(EditGame.new_value)
-    await callback.message.answer("✏️ Отправьте новое фото игры:")
-    await callback.answer()
-
-
-@router.callback_query(F.data.startswith("admin_edit_author_"))
-async def admin_edit_game_author(callback: CallbackQuery, state: FSMContext):
-    """Начать редактирование автора игры"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("❌ У вас нет прав доступа.", show_alert=True)
-        return
-
-    game_id = int(callback.data.split("_")[-1])
-    await state.update_data(game_id=game_id, field="gameAuthor")
-    await state.set_state(EditGame.new_value)
-    await callback.message.answer("✏️ Введите нового автора игры:")
-    await callback.answer()
-
-
-@router.callback_query(F.data.startswith("admin_delete_game_"))
-async def admin_delete_game(callback: CallbackQuery, state: FSMContext):
+async def admin_delete_game(callback: CallbackQuery, game_id: int, state: FSMContext, session: AsyncSession):
     """Удалить игру"""
-    if not is_admin(callback.from_user.id):
-        await callback.answer("❌ У вас нет прав доступа.", show_alert=True)
-        return
-
-    game_id = int(callback.data.split("_")[-1])
-    game = await rq.get_game_by_id(game_id)
+    name = await rq.delete_game(game_id, session=session)
 
-    if not game:
+    if name is None:
         await callback.answer("❌ Игра не найдена.", show_alert=True)
         return
 
-    await rq.delete_game(game_id)
-    await callback.message.answer(f"✅ Игра *{game.gameName}* удалена.", parse_mode="Markdown")
+    await callback.message.answer(f"✅ Игра *{name}* удалена.", parse_mode="Markdown")
     await callback.answer("✅ Игра удалена")
 
 
-@router.callback_query(F.data == "admin_cancel_edit")
-async def admin_cancel_edit(callback: CallbackQuery, state: FSMContext):
+async def admin_cancel_edit(callback: CallbackQuery, game_id: int, state: FSMContext, session: AsyncSession):
     """Отменить редактирование"""
     await state.clear()
     await callback.message.answer("❌ Редактирование отменено.")
     await callback.answer()
 
 
-@router.message(EditGame.new_value, F.photo)
-async def admin_receive_photo(message: Message, state: FSMContext):
+GAME_ACTIONS = {
+    GameOp.view: admin_show_game_details,
+    GameOp.name: partial(admin_start_edit, "gameName", "✏️ Введите новое название игры:"),
+    GameOp.desc: partial(admin_start_edit, "gameDesc", "✏️ Введите новое описание игры:"),
+    GameOp.genre: partial(admin_start_edit, "gameGenre", "✏️ Введите жанры игры через запятую:"),
+    GameOp.photo: partial(admin_start_edit, "gamePhoto", "✏️ Отправьте новое фото игры:"),
+    GameOp.author: partial(admin_start_edit, "gameAuthor", "✏️ Введите нового автора игры:"),
+    GameOp.delete: admin_delete_game,
+    GameOp.cancel: admin_cancel_edit,
+}
+
+
+@admin_router.callback_query(GameAction.filter())
+async def admin_game_action(callback: CallbackQuery, callback_data: GameAction, state: FSMContext,
+                            session: AsyncSession):
+    await GAME_ACTIONS[callback_data.op](callback, callback_data.id, state, session)
+
+
+@admin_router.message(EditGame.new_value, F.photo)
+async def admin_receive_photo(message: Message, state: FSMContext, session: AsyncSession):
     """Получить новое фото игры"""
     data = await state.get_data()
     file_id = message.photo[-1].file_id
-    await rq.update_game(data["game_id"], {data["field"]: file_id})
-    game = await rq.get_game_by_id(data["game_id"])
+    game = await rq.update_game(data["game_id"], {data["field"]: file_id}, session=session)
+    if game is None:
+        await message.answer("❌ Игра не найдена.")
+        await state.clear()
+        return
     await message.answer(f"✅ Фото игры *{game.gameName}* обновлено!", parse_mode="Markdown")
     await state.clear()
 
 
-@router.message(EditGame.new_value)
-async def admin_save_edit(message: Message, state: FSMContext):
+@admin_router.message(EditGame.new_value)
+async def admin_save_edit(message: Message, state: FSMContext, session: AsyncSession):
     """Сохранить изменения в игре"""
     data = await state.get_data()
     field = data["field"]
     new_value = message.text
+    if field == "gameGenre" and not parse_genres(new_value):
+        await message.answer("⛔ Укажи хотя бы один жанр, через запятую:")
+        return
 
-    await rq.update_game(data["game_id"], {field: new_value})
-    game = await rq.get_game_by_id(data["game_id"])
+    game = await rq.update_game(data["game_id"], {field: new_value}, session=session)
+    if game is None:
+        await message.answer("❌ Игра не найдена.")
+        await state.clear()
+        return
 
     field_names = {
         "gameName": "название",
@@ -515,3 +822,156 @@ async def admin_save_edit(message: Message, state: FSMContext):
     field_name = field_names.get(field, field)
     await message.answer(f"✅ {field_name.capitalize()} игры *{game.gameName}* обновлено!", parse_mode="Markdown")
     await state.clear()
+
+
+# ==========================
+# --- АДМИН: ИМПОРТ И ЭКСПОРТ
+# ==========================
+IMPORT_MAX_SIZE = 5 * 1024 * 1024
+
+
+@admin_router.message(Command("import"))
+async def import_start(message: Message, state: FSMContext, command: CommandObject):
+    """Команда для админов: загрузка каталога из файла"""
+    upsert = (command.args or "").strip().lower() == "upsert"
+    await state.set_state(ImportGames.document)
+    await state.update_data(import_upsert=upsert)
+    await message.answer(
+        "📥 Пришли файл CSV или JSON с колонками gameName, gameDesc, gameGenre, gamePhoto, gameAuthor "
+        "(или название, описание, жанр, фото, автор).\n"
+        + ("Существующие игры будут обновлены." if upsert else "Игры, которые уже есть в каталоге, будут пропущены.")
+    )
+
+
+@admin_router.message(Command("cancel_import"))
+async def import_cancel(message: Message, state: FSMContext):
+    await state.clear()
+    await message.answer("❌ Импорт отменен.")
+
+
+@admin_router.message(ImportGames.document, F.document)
+async def import_document(message: Message, state: FSMContext, session: AsyncSession):
+    document = message.document
+    if document.file_size and document.file_size > IMPORT_MAX_SIZE:
+        await message.answer("⛔ Файл больше 5 МБ. Раздели его на части.")
+        return
+
+    data = await state.get_data()
+    await state.clear()
+    content = await message.bot.download(document)
+    try:
+        rows, errors = parse_import(content.getvalue(), document.file_name or "")
+    except ValueError as e:
+        await message.answer(f"⛔ Не удалось прочитать файл: {e}")
+        return
+
+    result = await rq.import_games(rows, data.get("import_upsert", False), session=session)
+    for page in import_report(result, errors):
+        await message.answer(page)
+
+
+@admin_router.message(ImportGames.document)
+async def import_not_document(message: Message):
+    await message.answer("Нужен файл CSV или JSON документом. Отменить — /cancel_import")
+
+
+@admin_router.message(Command("export"))
+async def export_catalog(message: Message):
+    """Команда для админов: выгрузка игр и мероприятий в CSV"""
+    stamp = dt.datetime.now().strftime("%Y%m%d-%H%M")
+    # таблицы пишутся в файлы пачками, целиком в памяти не держатся
+    with tempfile.TemporaryDirectory(prefix="export-") as workdir:
+        games_path = os.path.join(workdir, f"games-{stamp}.csv")
+        events_path = os.path.join(workdir, f"events-{stamp}.csv")
+        games = await write_csv(games_path, ("id",) + GAME_COLUMNS, rq.stream_games())
+        events = await write_csv(events_path, EVENT_COLUMNS, rq.stream_events())
+        await message.answer_document(FSInputFile(games_path), caption=f"🎲 Игры: {games}")
+        await message.answer_document(FSInputFile(events_path), caption=f"📅 Мероприятия: {events}")
+
+
+# ==========================
+# --- АДМИН: РАССЫЛКА
+# ==========================
+@admin_router.message(Command("broadcast"))
+async def broadcast_start(message: Message, state: FSMContext):
+    """Команда для админов: рассылка сообщения всем пользователям бота"""
+    await state.set_state(BroadcastMessage.message)
+    await message.answer("📣 Пришли сообщение для рассылки — текст, фото, что угодно. Оно уйдет всем как есть.")
+
+
+@admin_router.message(BroadcastMessage.message)
+async def broadcast_preview(message: Message, state: FSMContext, session: AsyncSession):
+    total = await rq.count_active_users(session=session)
+    await state.update_data(broadcast_chat_id=message.chat.id, broadcast_message_id=message.message_id)
+    await state.set_state(BroadcastMessage.confirm)
+    await message.answer(f"Разослать это сообщение {total} пользователям?",
+                         reply_markup=kb.broadcast_confirm_keyboard())
+
+
+async def broadcast_send(callback: CallbackQuery, broadcast_id: int, state: FSMContext, session: AsyncSession):
+    if await state.get_state() != BroadcastMessage.confirm.state:
+        await callback.answer("Это подтверждение уже неактуально", show_alert=True)
+        return
+
+    data = await state.get_data()
+    await state.clear()
+
+    total = await rq.count_active_users(session=session)
+    await callback.message.edit_text("📣 Рассылка запускается…")
+    broadcast = await rq.create_broadcast({
+        "from_chat_id": data["broadcast_chat_id"],
+        "message_id": data["broadcast_message_id"],
+        "admin_chat_id": callback.message.chat.id,
+        "progress_message_id": callback.message.message_id,
+        "total": total,
+    }, session=session)
+    broadcaster.start(callback.bot, broadcast)
+    await callback.answer()
+
+
+async def broadcast_cancel(callback: CallbackQuery, broadcast_id: int, state: FSMContext, session: AsyncSession):
+    await state.clear()
+    await callback.message.edit_text("❌ Рассылка отменена.")
+    await callback.answer()
+
+
+async def broadcast_stop(callback: CallbackQuery, broadcast_id: int, state: FSMContext, session: AsyncSession):
+    if await broadcaster.stop(broadcast_id):
+        await callback.answer("⏹ Рассылка остановлена")
+    else:
+        await callback.answer("Рассылка уже не идет", show_alert=True)
+
+
+BROADCAST_ACTIONS = {
+    BroadcastOp.send: broadcast_send,
+    BroadcastOp.cancel: broadcast_cancel,
+    BroadcastOp.stop: broadcast_stop,
+}
+
+
+@admin_router.callback_query(BroadcastAction.filter())
+async def broadcast_action(callback: CallbackQuery, callback_data: BroadcastAction, state: FSMContext,
+                           session: AsyncSession):
+    await BROADCAST_ACTIONS[callback_data.op](callback, callback_data.id, state, session)
+
+
+# ==========================
+# --- АДМИН: МЕТРИКИ
+# ==========================
+@admin_router.message(Command("stats"))
+async def admin_stats(message: Message):
+    sender = next((m for m in message.bot.session.middleware if isinstance(m, Outbox)), None)
+    await message.answer(stats_text(metrics.summary(), sender.stats() if sender else None, rq.catalog_stats()))
+
+
+# ==========================
+# --- УСТАРЕВШИЕ КНОПКИ
+# ==========================
+# подключается последним: сюда доходят только нажатия, которые никто не разобрал
+stale_router = Router(name="stale")
+router.include_router(stale_router)
+
+
+@stale_router.callback_query()
+async def stale_button(callback: CallbackQuery):
+    await callback.answer("Эта кнопка устарела — откройте раздел из меню заново")
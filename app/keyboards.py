@@ -7,6 +7,9 @@ from aiogram.types import (
 )
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from app.callbacks import (NOOP, GameAction, GameOp, GenreAction, GenreOp, CatalogPage, Rsvp,
+                           BroadcastAction, BroadcastOp, AdminList, ListOp)
+
 # --- Главное меню
 main = ReplyKeyboardMarkup(
     keyboard=[
@@ -29,28 +32,99 @@ event_edit = ReplyKeyboardMarkup(
     input_field_placeholder="Выбери действие"
 )
 
+# --- Повтор мероприятия
+event_recur = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="Разово")],
+        [KeyboardButton(text="Каждую неделю"), KeyboardButton(text="Раз в две недели")],
+        [KeyboardButton(text="Раз в месяц")],
+    ],
+    resize_keyboard=True,
+    input_field_placeholder="Как часто проводится"
+)
+
 # --- Фильтр жанров
-def genre_keyboard(selected: list[str] = None) -> InlineKeyboardMarkup:
+def genre_keyboard(genres: list, selected: list[int] = None, counts: dict[int, int] = None,
+                   mode: str = "and", found: int = 0) -> InlineKeyboardMarkup:
+    """Кнопки жанров из реального набора тегов каталога с мультивыбором"""
     selected = selected or []
-    genres = [
-        "Пати", "Стратегия", "Кооператив", "Детектив",
-        "Для двоих", "Экономическая", "Фантастика", "Семейная"
-    ]
+    counts = counts or {}
     builder = InlineKeyboardBuilder()
     for g in genres:
-        check = "✅ " if g in selected else ""
-        builder.button(text=f"{check}{g}", callback_data=f"genre_{g}")
+        check = "✅ " if g.id in selected else ""
+        count = f" ({counts[g.id]})" if g.id in counts else ""
+        builder.button(text=f"{check}{g.name}{count}", callback_data=GenreAction(op=GenreOp.toggle, id=g.id))
     builder.adjust(2)
+
+    controls = InlineKeyboardBuilder()
+    mode_text = "🔀 Все выбранные жанры" if mode == "and" else "🔀 Любой из выбранных"
+    controls.button(text=mode_text, callback_data=GenreAction(op=GenreOp.mode))
+    if selected:
+        controls.button(text=f"🎲 Показать ({found})", callback_data=GenreAction(op=GenreOp.show))
+        controls.button(text="♻️ Сбросить", callback_data=GenreAction(op=GenreOp.reset))
+    controls.adjust(1, 2)
+    builder.attach(controls)
+    return builder.as_markup()
+
+
+# --- Запись на мероприятия
+def rsvp_keyboard(events: list) -> InlineKeyboardMarkup:
+    """Кнопка «Иду» под дайджестом для каждого мероприятия (у серии — одна на все проведения)"""
+    builder = InlineKeyboardBuilder()
+    seen = set()
+    for event in events:
+        # у Telegram лимит в 100 кнопок на сообщение
+        if event.id in seen or len(seen) == 50:
+            continue
+        seen.add(event.id)
+        builder.button(text=f"✋ Иду: {event.eventName[:40]}", callback_data=Rsvp(event_id=event.id))
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+# --- Карусель каталога
+def catalog_keyboard(page: int, total: int) -> InlineKeyboardMarkup:
+    """Кнопки листания карточек каталога (по кругу)"""
+    builder = InlineKeyboardBuilder()
+    builder.button(text="◀️", callback_data=CatalogPage(page=(page - 1) % total))
+    builder.button(text=f"{page + 1}/{total}", callback_data=NOOP)
+    builder.button(text="▶️", callback_data=CatalogPage(page=(page + 1) % total))
+    builder.adjust(3)
     return builder.as_markup()
 
 
 # --- Клавиатура для списка игр (админ)
-def admin_games_list_keyboard(games: list) -> InlineKeyboardMarkup:
-    """Создает клавиатуру со списком всех игр для админа"""
+def admin_games_page_keyboard(rows: list[tuple[int, str]], has_prev: bool, has_next: bool,
+                              searching: bool = False) -> InlineKeyboardMarkup:
+    """Страница списка игр: кнопка на игру, листание, переход по букве и поиск"""
     builder = InlineKeyboardBuilder()
-    for game in games:
-        builder.button(text=f"✏️ {game.gameName}", callback_data=f"admin_edit_game_{game.id}")
+    for game_id, name in rows:
+        builder.button(text=f"✏️ {name}", callback_data=GameAction(op=GameOp.view, id=game_id))
     builder.adjust(1)
+
+    nav = InlineKeyboardBuilder()
+    if has_prev:
+        nav.button(text="◀️", callback_data=AdminList(op=ListOp.prev, id=rows[0][0]))
+    nav.button(text="🔤", callback_data=AdminList(op=ListOp.letters))
+    nav.button(text="🔍", callback_data=AdminList(op=ListOp.find))
+    if searching:
+        nav.button(text="✖️", callback_data=AdminList(op=ListOp.reset))
+    if has_next:
+        nav.button(text="▶️", callback_data=AdminList(op=ListOp.next, id=rows[-1][0]))
+    nav.adjust(5)
+    builder.attach(nav)
+    return builder.as_markup()
+
+
+def admin_letters_keyboard(letters: list[str]) -> InlineKeyboardMarkup:
+    """Панель перехода по первой букве названия"""
+    builder = InlineKeyboardBuilder()
+    for index, letter in enumerate(letters):
+        builder.button(text=letter, callback_data=AdminList(op=ListOp.letter, id=index))
+    builder.adjust(8)
+    back = InlineKeyboardBuilder()
+    back.button(text="⏮ В начало", callback_data=AdminList(op=ListOp.first))
+    builder.attach(back)
     return builder.as_markup()
 
 
@@ -58,12 +132,28 @@ def admin_games_list_keyboard(games: list) -> InlineKeyboardMarkup:
 def admin_game_edit_keyboard(game_id: int) -> InlineKeyboardMarkup:
     """Клавиатура с опциями редактирования игры"""
     builder = InlineKeyboardBuilder()
-    builder.button(text="📝 Название", callback_data=f"admin_edit_name_{game_id}")
-    builder.button(text="📄 Описание", callback_data=f"admin_edit_desc_{game_id}")
-    builder.button(text="🎭 Жанр", callback_data=f"admin_edit_genre_{game_id}")
-    builder.button(text="📷 Фото", callback_data=f"admin_edit_photo_{game_id}")
-    builder.button(text="👤 Автор", callback_data=f"admin_edit_author_{game_id}")
-    builder.button(text="🗑️ Удалить", callback_data=f"admin_delete_game_{game_id}")
-    builder.button(text="❌ Отмена", callback_data="admin_cancel_edit")
+    builder.button(text="📝 Название", callback_data=GameAction(op=GameOp.name, id=game_id))
+    builder.button(text="📄 Описание", callback_data=GameAction(op=GameOp.desc, id=game_id))
+    builder.button(text="🎭 Жанр", callback_data=GameAction(op=GameOp.genre, id=game_id))
+    builder.button(text="📷 Фото", callback_data=GameAction(op=GameOp.photo, id=game_id))
+    builder.button(text="👤 Автор", callback_data=GameAction(op=GameOp.author, id=game_id))
+    builder.button(text="🗑️ Удалить", callback_data=GameAction(op=GameOp.delete, id=game_id))
+    builder.button(text="❌ Отмена", callback_data=GameAction(op=GameOp.cancel))
     builder.adjust(2, 2, 1, 1)
     return builder.as_markup()
+
+
+# --- Рассылка (админ)
+def broadcast_confirm_keyboard() -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.button(text="📣 Разослать", callback_data=BroadcastAction(op=BroadcastOp.send))
+    builder.button(text="❌ Отмена", callback_data=BroadcastAction(op=BroadcastOp.cancel))
+    builder.adjust(2)
+    return builder.as_markup()
+
+
+def broadcast_keyboard(broadcast_id: int) -> InlineKeyboardMarkup:
+    """Кнопка под сообщением с прогрессом рассылки"""
+    builder = InlineKeyboardBuilder()
+    builder.button(text="⏹ Остановить", callback_data=BroadcastAction(op=BroadcastOp.stop, id=broadcast_id))
+    return builder.as_markup()
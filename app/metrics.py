@@ -0,0 +1,214 @@
+# app/metrics.py
+"""
+Метрики в формате Prometheus без внешних зависимостей.
+
+Наблюдение — это bisect по границам корзин и пара сложений под меткой,
+так что метрики можно держать включенными постоянно.
+"""
+import contextvars
+import time
+from bisect import bisect_left
+from typing import Iterable
+
+from aiohttp import web
+from sqlalchemy import event
+
+# границы корзин по умолчанию, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+REGISTRY: list = []
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v).replace(chr(34), chr(39))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.values: dict[tuple, float] = {}
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class _Series:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self, size: int) -> None:
+        self.buckets = [0] * (size + 1)  # последняя — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: tuple = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.bounds = buckets
+        self.series: dict[tuple, _Series] = {}
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = _Series(len(self.bounds))
+        series.buckets[bisect_left(self.bounds, value)] += 1
+        series.sum += value
+        series.count += 1
+
+    def quantile(self, q: float, *labels) -> float:
+        """Оценка квантиля по корзинам (верхняя граница корзины)"""
+        series = self.series.get(labels)
+        if series is None or not series.count:
+            return 0.0
+        rank = q * series.count
+        seen = 0
+        for bound, count in zip(self.bounds, series.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), series.buckets):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), labels + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series.sum}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series.count}")
+        return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ==========================
+# --- МЕТРИКИ БОТА
+# ==========================
+handler_seconds = Histogram("bot_handler_seconds", "Время обработки апдейта хендлером",
+                            ("handler", "outcome"))
+db_query_seconds = Histogram("bot_db_query_seconds", "Время SQL-запроса", ("statement",), QUERY_BUCKETS)
+db_queries_per_update = Histogram("bot_db_queries_per_update", "SQL-запросов на один апдейт",
+                                  ("handler",), COUNT_BUCKETS)
+api_seconds = Histogram("bot_api_seconds", "Время вызова Bot API", ("method", "outcome"))
+update_queue_seconds = Histogram("bot_update_queue_seconds", "Ожидание апдейта в очереди исполнителя до запуска хендлера")
+updates_coalesced = Counter("bot_updates_coalesced_total", "Отброшенные повторные нажатия")
+throttled = Counter("bot_throttled_total", "Апдейты, отклоненные антифлудом", ("action",))
+db_errors = Counter("bot_db_errors_total", "SQL-запросы, завершившиеся ошибкой")
+
+
+class UpdateStats:
+    """Что накопилось за обработку одного апдейта"""
+    __slots__ = ("handler", "queries")
+
+    def __init__(self) -> None:
+        self.handler = "unhandled"
+        self.queries = 0
+
+
+current_update: contextvars.ContextVar[UpdateStats | None] = contextvars.ContextVar("current_update", default=None)
+
+
+def summary() -> dict:
+    """Сводка для /stats: по хендлерам и методам Bot API"""
+    handlers: dict[str, dict] = {}
+    for (handler, outcome), series in handler_seconds.series.items():
+        row = handlers.setdefault(handler, {"count": 0, "errors": 0, "sum": 0.0, "p95": 0.0, "queries": 0.0})
+        row["count"] += series.count
+        row["sum"] += series.sum
+        row["p95"] = max(row["p95"], handler_seconds.quantile(0.95, handler, outcome))
+        if outcome == "error":
+            row["errors"] += series.count
+    for (handler,), series in db_queries_per_update.series.items():
+        if handler in handlers and series.count:
+            handlers[handler]["queries"] = series.sum / series.count
+    methods: dict[str, dict] = {}
+    for (method, outcome), series in api_seconds.series.items():
+        row = methods.setdefault(method, {"count": 0, "sum": 0.0})
+        row["count"] += series.count
+        row["sum"] += series.sum
+    queries = sum(s.count for s in db_query_seconds.series.values())
+    query_time = sum(s.sum for s in db_query_seconds.series.values())
+    queue = update_queue_seconds.series.get(())
+    return {
+        "handlers": handlers,
+        "methods": methods,
+        "queries": queries,
+        "query_time": query_time,
+        "queue_avg": queue.sum / queue.count if queue and queue.count else 0.0,
+        "queue_p95": update_queue_seconds.quantile(0.95),
+        "coalesced": updates_coalesced.values.get((), 0),
+    }
+
+
+# ==========================
+# --- SQLALCHEMY
+# ==========================
+def instrument_engine(engine) -> None:
+    """Время каждого запроса и счетчик запросов текущего апдейта"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+        stats = current_update.get()
+        if stats is not None:
+            stats.queries += 1
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        db_query_seconds.observe(time.perf_counter() - started, verb)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        db_errors.inc()
+        stack = context.connection.info.get("query_started") if context.connection is not None else None
+        if stack:
+            stack.pop()
+
+
+# ==========================
+# --- HTTP
+# ==========================
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Prometheus-Text-Format": "0.0.4"})
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Отдельный сервер с /metrics и календарем (для режима polling и воркеров)"""
+    # календарь читает базу, а app.database сам импортирует метрики — поэтому здесь
+    from app.calendar_feed import setup_calendar
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    setup_calendar(app)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,179 @@
+# app/middlewares.py
+import time
+from collections import OrderedDict
+
+from aiogram import BaseMiddleware, Router
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.metrics import UpdateStats, current_update, handler_seconds, db_queries_per_update, api_seconds, throttled
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Внешний: время обработки апдейта и число SQL-запросов за нее"""
+
+    async def __call__(self, handler, event, data):
+        stats = UpdateStats()
+        token = current_update.set(stats)
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await handler(event, data)
+            outcome = "unhandled" if result is UNHANDLED else "ok"
+            return result
+        finally:
+            current_update.reset(token)
+            handler_seconds.observe(time.perf_counter() - started, stats.handler, outcome)
+            db_queries_per_update.observe(stats.queries, stats.handler)
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Внутренний: запоминает, какой хендлер прошел фильтры (внешнему это еще неизвестно)"""
+
+    async def __call__(self, handler, event, data):
+        stats = current_update.get()
+        if stats is not None:
+            stats.handler = data["handler"].callback.__name__
+        return await handler(event, data)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Время каждого вызова Bot API по методам"""
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot, method):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await make_request(bot, method)
+            outcome = "ok"
+            return result
+        finally:
+            api_seconds.observe(time.perf_counter() - started, method.__api_method__, outcome)
+
+
+def setup_metrics(router: Router) -> None:
+    for name, observer in router.observers.items():
+        if name in ("update", "error"):
+            continue
+        observer.outer_middleware(MetricsMiddleware())
+        observer.middleware(HandlerNameMiddleware())
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Одна сессия БД на апдейт: хендлер получает ее аргументом session и передает
+    в функции app/database/requests.py. Соединение берется на время одной
+    функции запроса (см. requests.connection), а не на весь апдейт.
+    """
+
+    def __init__(self, session_pool: async_sessionmaker) -> None:
+        self.session_pool = session_pool
+
+    async def __call__(self, handler, event, data):
+        async with self.session_pool() as session:
+            data["session"] = session
+            return await handler(event, data)
+
+
+class AdminMiddleware(BaseMiddleware):
+    """Внутренний, на роутер админки: хендлеры вызываются только для админов"""
+
+    def __init__(self, admin_ids) -> None:
+        self.admin_ids = frozenset(admin_ids)
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is not None and user.id in self.admin_ids:
+            return await handler(event, data)
+        if isinstance(event, CallbackQuery):
+            await event.answer("❌ У вас нет прав доступа.", show_alert=True)
+        else:
+            await event.answer("❌ У вас нет прав доступа к этой команде.")
+        return None
+
+
+def setup_admin(router: Router, admin_ids) -> None:
+    guard = AdminMiddleware(admin_ids)
+    router.message.middleware(guard)
+    router.callback_query.middleware(guard)
+
+
+# ==========================
+# --- АНТИФЛУД
+# ==========================
+SLOW_DOWN = "⏳ Слишком часто. Подождите пару секунд и попробуйте снова."
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Внутренний: ведро жетонов на пару (пользователь, действие).
+
+    Действие — флаг хендлера throttle (по умолчанию "default"), цена — из costs.
+    Ведро пополняется на rate жетонов в секунду до burst. Если жетонов не хватает,
+    хендлер не вызывается: на кнопку — пустой ответ, на сообщение — одно
+    предупреждение до тех пор, пока действие снова не пройдет.
+
+    Ведра хранятся в OrderedDict в порядке последнего обращения, не больше
+    max_buckets; полностью восстановившиеся ведра ничем не отличаются от новых
+    и выбрасываются с головы по ходу работы.
+    """
+
+    def __init__(self, rate: float, burst: float, costs: dict[str, float], max_buckets: int = 100_000) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.costs = costs
+        self.max_buckets = max_buckets
+        self.idle = burst / rate  # за это время пустое ведро наполняется целиком
+        # (user_id, action) -> [жетоны, время последнего обращения, предупрежден]
+        self._buckets: OrderedDict[tuple, list] = OrderedDict()
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+        action = get_flag(data, "throttle", default="default")
+        cost = min(self.costs.get(action, self.costs.get("default", 1)), self.burst)
+        now = time.monotonic()
+        key = (user.id, action)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now, False]
+            self._evict(now)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            bucket[2] = False
+            return await handler(event, data)
+
+        throttled.inc(action)
+        if isinstance(event, CallbackQuery):
+            await event.answer()
+        elif not bucket[2]:
+            await event.answer(SLOW_DOWN)
+        bucket[2] = True
+        return None
+
+    def _evict(self, now: float) -> None:
+        # голова — самые давние обращения: пара шагов на апдейт держит словарь компактным
+        for _ in range(2):
+            key, bucket = next(iter(self._buckets.items()))
+            if now - bucket[1] < self.idle:
+                break
+            del self._buckets[key]
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+def setup_throttling(router: Router, throttle: ThrottlingMiddleware) -> None:
+    router.message.middleware(throttle)
+    router.callback_query.middleware(throttle)
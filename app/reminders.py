@@ -0,0 +1,150 @@
+# app/reminders.py
+import asyncio
+import contextlib
+import datetime as dt
+import heapq
+import logging
+import math
+from typing import Callable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
+
+import app.database.requests as rq
+from app.database.recurrence import Occurrence, occurs_at, next_occurrence
+from app.delivery import bulk
+from app.texts import reminder_text
+
+# за сколько до начала напоминать
+LEADS = (dt.timedelta(hours=24), dt.timedelta(hours=1))
+
+
+class ReminderScheduler:
+    """
+    Напоминания о мероприятиях записавшимся.
+
+    Все сроки лежат в одной куче (время срабатывания, id мероприятия, начало, отступ),
+    задача спит ровно до ближайшего и просыпается раньше, только если в кучу
+    добавили более ранний срок. При старте куча собирается из базы заново,
+    а повторной отправки после перезапуска не дает таблица reminders_sent.
+    Запись на серию действует на все проведения: после напоминаний об одном
+    ставятся напоминания о следующем, пока на серию кто-то записан.
+
+    В многопроцессном режиме напоминания шлет только первый воркер: остальные
+    не запускают задачу, а новые сроки передают в listeners (через фронт к первому).
+    """
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[dt.datetime, int, dt.datetime, int]] = []
+        # (мероприятие, начало) -> сколько его сроков еще лежит в куче
+        self._scheduled: dict[tuple[int, dt.datetime], int] = {}
+        # отправки в полете: цикл событий держит задачи только слабыми ссылками
+        self._sending: set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._bot: Bot | None = None
+        # False — напоминания шлет другой воркер
+        self._local = True
+        # вызываются с (мероприятие, начало) вместо постановки в свою кучу
+        self.listeners: list[Callable[[int, dt.datetime], None]] = []
+
+    async def start(self, bot: Bot, worker_index: int = 0) -> None:
+        if worker_index != 0:
+            self._local = False
+            return
+        self._bot = bot
+        for event_id, start in await rq.get_subscribed_events():
+            self.schedule(event_id, start)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        for task in self._sending:
+            task.cancel()
+        await asyncio.gather(*self._sending, return_exceptions=True)
+
+    def schedule(self, event_id: int, start: dt.datetime) -> None:
+        """Поставить напоминания о мероприятии (повторный вызов ничего не меняет)"""
+        if not self._local:
+            for listener in self.listeners:
+                listener(event_id, start)
+            return
+        if (event_id, start) in self._scheduled:
+            return
+        now = dt.datetime.now()
+        entries = []
+        missed = None
+        for lead in sorted(LEADS, reverse=True):
+            fire_at = start - lead
+            if fire_at > now:
+                entries.append((fire_at, event_id, start, int(lead.total_seconds() // 60)))
+            else:
+                missed = lead
+        if missed is not None and not entries and start > now:
+            # бот лежал (или записались поздно), пока подошел срок: шлем только самое
+            # свежее из пропущенных и только если впереди не осталось своего срока
+            entries.append((now, event_id, start, int(missed.total_seconds() // 60)))
+        if not entries:
+            return
+        self._scheduled[(event_id, start)] = len(entries)
+        for entry in entries:
+            heapq.heappush(self._heap, entry)
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            delay = (self._heap[0][0] - dt.datetime.now()).total_seconds()
+            if delay > 0:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                continue
+            _, event_id, start, lead = heapq.heappop(self._heap)
+            # последний срок этого проведения — его снова можно поставить
+            key = (event_id, start)
+            self._scheduled[key] -= 1
+            if not self._scheduled[key]:
+                del self._scheduled[key]
+            try:
+                await self._fire(event_id, start, lead)
+            except Exception:
+                logging.exception("reminder for event %s failed", event_id)
+
+    async def _fire(self, event_id: int, start: dt.datetime, lead: int) -> None:
+        event = await rq.get_event(event_id)
+        if event is None or not occurs_at(event, start):
+            # мероприятие удалили, перенесли или это проведение отменили
+            return
+        # догоняющее напоминание уходит позже своего срока: в тексте — сколько осталось на деле
+        left = math.ceil((start - dt.datetime.now()).total_seconds() / 60)
+        text = reminder_text(Occurrence(event, start), min(lead, max(left, 1)))
+        # строки в reminders_sent вставлены до отправки: упадем посередине — повторов не будет
+        tg_ids = await rq.claim_reminders(event_id, start, lead)
+        for tg_id in tg_ids:
+            task = asyncio.create_task(self._send(tg_id, text))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+        if tg_ids and event.recurRule is not None:
+            following = next_occurrence(event, start)
+            if following is not None:
+                self.schedule(event_id, following)
+
+    async def _send(self, tg_id: int, text: str) -> None:
+        with bulk():
+            try:
+                await self._bot.send_message(tg_id, text, parse_mode="HTML")
+            except (TelegramForbiddenError, TelegramBadRequest):
+                # пользователь заблокировал бота или удалил чат
+                pass
+            except Exception:
+                logging.exception("reminder to %s failed", tg_id)
+
+
+reminders = ReminderScheduler()
@@ -0,0 +1,332 @@
+# app/sharding.py
+"""
+Многопроцессный режим.
+
+Фронт-процесс получает апдейты (polling или вебхук) и раскладывает их по N
+воркерам по хешу chat id, так что FSM и порядок сообщений каждого чата
+всегда живут в одном процессе. Воркеры — отдельные процессы `python -m
+app.sharding <index> <count>`, апдейты им идут построчным JSON через stdin,
+обратно по stdout приходят служебные сообщения: сброс кэшей после записи,
+новые сроки напоминаний (их шлет только первый воркер) и ack — апдейт обработан. Упавший воркер перезапускается, не трогая остальные,
+и заново получает апдейты, ack на которые не пришел (доставка «хотя бы раз»).
+
+offset getUpdates сдвигается сразу после раскладки: придержать его до ack
+нельзя — Telegram отдает не больше 100 апдейтов за раз, и polling встал бы,
+пока в работе больше сотни апдейтов.
+"""
+import asyncio
+import contextlib
+import datetime as dt
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Any
+
+from aiogram import Bot
+from aiogram.methods import GetUpdates
+from aiohttp import web
+
+from config import BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEB_HOST, WEB_PORT, METRICS_PORT
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# сколько раз отдавать апдейт перезапущенному воркеру: апдейт, на котором воркер
+# падает, не должен ронять его бесконечно
+MAX_REPLAYS = 3
+
+# ключи апдейтов, в которых чат лежит прямо в объекте
+_CHAT_KEYS = ("message", "edited_message", "channel_post", "edited_channel_post",
+              "business_message", "edited_business_message", "my_chat_member", "chat_member",
+              "chat_join_request")
+
+
+def update_chat_id(update: dict) -> int:
+    """Чат, к которому относится апдейт (для инлайн-запросов и т.п. — пользователь)"""
+    for key in _CHAT_KEYS:
+        if key in update:
+            return update[key]["chat"]["id"]
+    callback = update.get("callback_query")
+    if callback:
+        if callback.get("message"):
+            return callback["message"]["chat"]["id"]
+        return callback["from"]["id"]
+    for value in update.values():
+        if isinstance(value, dict):
+            for key in ("from", "user"):
+                if key in value:
+                    return value[key]["id"]
+    return 0
+
+
+def _worker_env() -> dict:
+    # рабочий каталог тот же, что у фронта (пути к базам относительные),
+    # а пакет app должен импортироваться откуда угодно
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    return env
+
+
+class WorkerProcess:
+    """Один воркер: процесс, его входная очередь и перезапуск при падении"""
+
+    def __init__(self, index: int, count: int, front: "ShardedFront") -> None:
+        self.index = index
+        self.count = count
+        self.front = front
+        # ограниченная очередь: если воркер не успевает, фронт ждет (backpressure)
+        # (update_id, строка); у служебных сообщений update_id = None
+        self.queue: asyncio.Queue[tuple[int | None, bytes]] = asyncio.Queue(maxsize=1000)
+        self.proc: asyncio.subprocess.Process | None = None
+        self.restarts = 0
+        self._item: tuple[int | None, bytes] | None = None
+        # отданные процессу, но не подтвержденные апдейты: update_id -> [строка, сколько раз отдавали повторно]
+        self.unacked: dict[int, list] = {}
+        self._replay: list[bytes] = []
+
+    async def supervise(self) -> None:
+        while not self.front.stopping:
+            started = time.monotonic()
+            self.proc = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "app.sharding", str(self.index), str(self.count),
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, env=_worker_env(),
+            )
+            self._prepare_replay()
+            tasks = [asyncio.create_task(self._write()), asyncio.create_task(self._read())]
+            code = await self.proc.wait()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.front.stopping:
+                break
+            self.restarts += 1
+            logging.warning("worker %s exited with code %s, restarting", self.index, code)
+            if time.monotonic() - started < 5:
+                # падает сразу после старта — не крутим перезапуски вхолостую
+                await asyncio.sleep(min(30, 2 ** min(self.restarts, 5)))
+
+    def _prepare_replay(self) -> None:
+        """Перед запуском процесса: неподтвержденные апдейты уйдут ему первыми, в прежнем порядке"""
+        if self._item is not None:
+            # недописанная строка — либо апдейт, уже лежащий в unacked, либо служебное
+            # сообщение, ненужное новому процессу (кэш пуст, напоминания читаются из базы)
+            self._item = None
+            self.queue.task_done()
+        for update_id, entry in list(self.unacked.items()):
+            entry[1] += 1
+            if entry[1] > MAX_REPLAYS:
+                logging.error("worker %s: update %s dropped after %s replays", self.index, update_id, MAX_REPLAYS)
+                del self.unacked[update_id]
+        self._replay = [line for line, _ in self.unacked.values()]
+
+    async def _write(self) -> None:
+        while self._replay:
+            try:
+                self.proc.stdin.write(self._replay[0])
+                await self.proc.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            self._replay.pop(0)
+        while True:
+            if self._item is None:
+                self._item = await self.queue.get()
+            update_id, line = self._item
+            if update_id is not None:
+                self.unacked[update_id] = [line, 0]
+            try:
+                self.proc.stdin.write(line)
+                await self.proc.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                # апдейт уже в unacked и уйдет перезапущенному воркеру
+                return
+            self._item = None
+            self.queue.task_done()
+
+    async def _read(self) -> None:
+        while line := await self.proc.stdout.readline():
+            await self.front.on_worker_message(self, json.loads(line))
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Дождаться разбора очереди, закрыть stdin и дать воркеру завершиться"""
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self.queue.join(), timeout)
+        if self.proc is None or self.proc.returncode is not None:
+            return
+        with contextlib.suppress(BrokenPipeError, ConnectionResetError):
+            self.proc.stdin.write_eof()
+        try:
+            await asyncio.wait_for(self.proc.wait(), timeout)
+        except asyncio.TimeoutError:
+            self.proc.kill()
+
+
+class ShardedFront:
+    def __init__(self, count: int) -> None:
+        self.stopping = False
+        self.workers = [WorkerProcess(i, count, self) for i in range(count)]
+
+    async def route(self, update: dict) -> None:
+        worker = self.workers[update_chat_id(update) % len(self.workers)]
+        line = json.dumps({"update": update}, ensure_ascii=False).encode() + b"\n"
+        await worker.queue.put((update["update_id"], line))
+
+    async def on_worker_message(self, sender: WorkerProcess, message: dict) -> None:
+        if "ack" in message:
+            sender.unacked.pop(message["ack"], None)
+        elif "invalidate" in message:
+            # каталог/анонсы изменились в одном воркере — остальные сбрасывают кэш
+            line = json.dumps(message).encode() + b"\n"
+            for worker in self.workers:
+                if worker is not sender:
+                    await worker.queue.put((None, line))
+        elif "remind" in message:
+            # запись на мероприятие в другом воркере — напоминание поставит первый
+            await self.workers[0].queue.put((None, json.dumps(message).encode() + b"\n"))
+
+    async def poll(self, bot: Bot, allowed_updates: list[str]) -> None:
+        offset = None
+        while True:
+            try:
+                updates = await bot(GetUpdates(offset=offset, timeout=30, allowed_updates=allowed_updates))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("getUpdates failed")
+                await asyncio.sleep(5)
+                continue
+            for update in updates:
+                await self.route(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+                offset = update.update_id + 1
+
+    def create_app(self) -> web.Application:
+        async def handle(request: web.Request) -> web.Response:
+            if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+                return web.Response(status=401)
+            await self.route(await request.json())
+            return web.json_response({})
+
+        app = web.Application()
+        app.router.add_post(WEBHOOK_PATH, handle)
+        return app
+
+    async def run(self, bot: Bot, allowed_updates: list[str]) -> None:
+        supervisors = [asyncio.create_task(w.supervise()) for w in self.workers]
+        runner = None
+        try:
+            if BOT_MODE == "webhook":
+                runner = web.AppRunner(self.create_app())
+                await runner.setup()
+                await web.TCPSite(runner, WEB_HOST, WEB_PORT).start()
+                if WEBHOOK_URL:
+                    await bot.set_webhook(WEBHOOK_URL, secret_token=WEBHOOK_SECRET or None,
+                                          allowed_updates=allowed_updates)
+                await asyncio.Event().wait()
+            else:
+                await self.poll(bot, allowed_updates)
+        finally:
+            self.stopping = True
+            if runner is not None:
+                await runner.cleanup()
+            await asyncio.gather(*(w.stop() for w in self.workers))
+            for task in supervisors:
+                task.cancel()
+            await asyncio.gather(*supervisors, return_exceptions=True)
+
+
+async def run_sharded(count: int) -> None:
+    """Фронт: принимает апдейты и раздает их count воркерам"""
+    from app.dispatcher import create_bot, create_dispatcher
+
+    bot = create_bot()
+    allowed_updates = create_dispatcher().resolve_used_update_types()
+    try:
+        await ShardedFront(count).run(bot, allowed_updates)
+    finally:
+        await bot.session.close()
+
+
+# ==========================
+# --- ВОРКЕР
+# ==========================
+# строки для фронта: слушатели кэшей и исполнителя синхронные, поэтому пишет отдельная задача
+_outgoing: asyncio.Queue[bytes] = asyncio.Queue()
+
+
+def _send_to_front(message: dict) -> None:
+    _outgoing.put_nowait(json.dumps(message).encode() + b"\n")
+
+
+async def _write_to_front(writer: asyncio.StreamWriter) -> None:
+    # неблокирующая запись: если фронт не читает, ждем drain, а цикл событий работает дальше
+    while True:
+        line = await _outgoing.get()
+        writer.write(line)
+        await writer.drain()
+        _outgoing.task_done()
+
+
+async def worker_main(index: int, count: int) -> None:
+    from app.database.cache import catalog, events_cache
+    from app.delivery import Outbox
+    from app.dispatcher import create_bot, create_dispatcher
+    from app.metrics import start_metrics_server
+    from app.reminders import reminders
+
+    # Ctrl+C останавливает фронт, а он уже аккуратно закрывает воркеры
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # общий лимит Telegram делится между воркерами
+    sender = Outbox(global_rate=30.0 / count)
+    bot = create_bot(sender)
+    dp = create_dispatcher()
+    caches = {c.name: c for c in (catalog, events_cache)}
+    for cache in caches.values():
+        cache.listeners.append(lambda name: _send_to_front({"invalidate": name}))
+    dp["executor"].listeners.append(lambda update: _send_to_front({"ack": update.update_id}))
+    reminders.listeners.append(lambda event_id, start: _send_to_front({"remind": [event_id, start.isoformat()]}))
+
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=2 ** 24)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+    writer = asyncio.create_task(_write_to_front(asyncio.StreamWriter(transport, protocol, None, loop)))
+
+    # у каждого воркера свои метрики — и свой порт
+    metrics = await start_metrics_server(WEB_HOST, METRICS_PORT + 1 + index) if METRICS_PORT else None
+    await dp.emit_startup(bot=bot, worker_index=index)
+    try:
+        while line := await reader.readline():
+            message: dict[str, Any] = json.loads(line)
+            if "invalidate" in message:
+                caches[message["invalidate"]].invalidate(notify=False)
+                continue
+            if "remind" in message:
+                event_id, start = message["remind"]
+                reminders.schedule(event_id, dt.datetime.fromisoformat(start))
+                continue
+            # порядок внутри чата держит UpdateExecutor; когда его очередь полна,
+            # воркер перестает читать stdin и фронт упирается в свою очередь
+            try:
+                await dp.feed_raw_update(bot, message["update"])
+            except Exception:
+                # до исполнителя не дошел — повтор не поможет, подтверждаем
+                logging.exception("update %s failed", message["update"].get("update_id"))
+                _send_to_front({"ack": message["update"].get("update_id")})
+        # stdin закрыт — фронт останавливается; shutdown дорабатывает принятые апдейты
+    finally:
+        await dp.emit_shutdown(bot=bot)
+        # последние ack, пока фронт еще читает
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(_outgoing.join(), 5)
+        writer.cancel()
+        if metrics is not None:
+            await metrics.cleanup()
+        await sender.close()
+        await bot.session.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    asyncio.run(worker_main(int(sys.argv[1]), int(sys.argv[2])))
@@ -1 +1,239 @@
-users = set()
\ No newline at end of file
+# app/storage.py
+import asyncio
+import contextlib
+import datetime as dt
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from sqlalchemy import Column, Float, MetaData, String, Table, Text, delete, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database.engine import configure_sqlite
+
+FSM_DATABASE_URL = "sqlite+aiosqlite:///fsm.sqlite3"
+
+metadata = MetaData()
+
+fsm_states = Table(
+    "fsm_states",
+    metadata,
+    Column("key", String(200), primary_key=True),
+    Column("state", String(100), nullable=True),
+    Column("data", Text, nullable=False),
+    Column("updated", Float, nullable=False, index=True),  # unix time последнего изменения
+)
+
+
+def _encode(value: Any) -> Any:
+    # в данных мастеров лежат datetime (eventDateTime), json их сам не умеет
+    if isinstance(value, dt.datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _dump(data: dict) -> str:
+    return json.dumps(data, default=_encode, ensure_ascii=False)
+
+
+def _decode(obj: dict) -> Any:
+    if "__datetime__" in obj:
+        return dt.datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+class _Record:
+    __slots__ = ("state", "data", "updated")
+
+    def __init__(self, state: Optional[str] = None, data: Optional[dict] = None, updated: float = 0.0) -> None:
+        self.state = state
+        self.data = data or {}
+        self.updated = updated
+
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище FSM в SQLite, переживающее перезапуск бота.
+
+    Перед базой — горячий LRU-кэш на cache_size ключей. Записи не идут в базу
+    сразу: изменения копятся и сбрасываются одной транзакцией раз в
+    flush_interval секунд или при накоплении flush_batch ключей, так что
+    шаги мастеров (update_data на каждом сообщении) не стоят по fsync каждый.
+    Состояния, не менявшиеся дольше ttl секунд, считаются брошенными и удаляются.
+    """
+
+    def __init__(
+        self,
+        url: str = FSM_DATABASE_URL,
+        cache_size: int = 10000,
+        ttl: float = 7 * 24 * 3600,
+        flush_interval: float = 1.0,
+        flush_batch: int = 100,
+    ) -> None:
+        # те же прагмы, что у базы бота: сброс пачки в WAL не ждет fsync
+        self.engine = configure_sqlite(create_async_engine(url, echo=False))
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._cache: OrderedDict[str, _Record] = OrderedDict()
+        self._dirty: dict[str, _Record] = {}
+        self._flushing: dict[str, _Record] = {}
+        self._flush_lock = asyncio.Lock()
+        self._prepare_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+        self._ready = False
+        self._last_purge = 0.0
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return (f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:"
+                f"{key.business_connection_id or ''}:{key.destiny}")
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get(self._key(key))
+        record.state = state.state if isinstance(state, State) else state
+        self._touch(self._key(key), record)
+        await self._after_write()
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await self._get(self._key(key))
+        return record.state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise TypeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        # несериализуемое значение отклоняем сразу, у вызывающего: попади оно в
+        # _dirty, сброс падал бы на нем раз за разом и не сохранял бы ничьи состояния
+        _dump(data)
+        record = await self._get(self._key(key))
+        record.data = dict(data)
+        self._touch(self._key(key), record)
+        await self._after_write()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await self._get(self._key(key))
+        return dict(record.data)
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flush_task
+            self._flush_task = None
+        await self.flush()
+        await self.engine.dispose()
+
+    async def flush(self) -> None:
+        """Записать накопленные изменения одной транзакцией"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            await self._prepare()
+            batch, self._dirty = self._dirty, {}
+            self._flushing = batch
+            upserts, removed = [], []
+            for k, r in batch.items():
+                if r.empty():
+                    removed.append(k)
+                    continue
+                try:
+                    data = _dump(r.data)
+                except (TypeError, ValueError):
+                    # данные поменяли в обход set_data — теряем одну запись, а не всю пачку
+                    logging.exception("FSM data for %s is not serializable, dropped", k)
+                    continue
+                upserts.append({"key": k, "state": r.state, "data": data, "updated": r.updated})
+            try:
+                async with self.engine.begin() as conn:
+                    if upserts:
+                        stmt = insert(fsm_states)
+                        stmt = stmt.on_conflict_do_update(
+                            index_elements=[fsm_states.c.key],
+                            set_={"state": stmt.excluded.state, "data": stmt.excluded.data,
+                                  "updated": stmt.excluded.updated},
+                        )
+                        await conn.execute(stmt, upserts)
+                    if removed:
+                        await conn.execute(delete(fsm_states).where(fsm_states.c.key.in_(removed)))
+                    now = time.time()
+                    if now - self._last_purge > 3600:
+                        # брошенные мастера, до которых больше никто не дошел
+                        await conn.execute(delete(fsm_states).where(fsm_states.c.updated < now - self.ttl))
+                        self._last_purge = now
+            except Exception:
+                # вернем несохраненное, если за это время ключ не переписали
+                for k, r in batch.items():
+                    self._dirty.setdefault(k, r)
+                raise
+            finally:
+                self._flushing = {}
+
+    async def _prepare(self) -> None:
+        if self._ready:
+            return
+        # первые апдейты после старта приходят пачкой — таблицу создаем один раз
+        async with self._prepare_lock:
+            if not self._ready:
+                async with self.engine.begin() as conn:
+                    await conn.run_sync(metadata.create_all)
+                self._ready = True
+
+    async def _get(self, key: str) -> _Record:
+        now = time.time()
+        record = self._cache.get(key)
+        if record is not None:
+            self._cache.move_to_end(key)
+        else:
+            # вытесненная из LRU, но еще не записанная в базу запись
+            record = self._dirty.get(key) or self._flushing.get(key)
+            if record is None:
+                record = await self._load(key)
+            self._remember(key, record)
+        if not record.empty() and now - record.updated > self.ttl:
+            record.state = None
+            record.data = {}
+            self._touch(key, record)
+        return record
+
+    async def _load(self, key: str) -> _Record:
+        await self._prepare()
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(
+                select(fsm_states.c.state, fsm_states.c.data, fsm_states.c.updated).where(fsm_states.c.key == key)
+            )).first()
+        if row is None:
+            return _Record()
+        return _Record(row.state, json.loads(row.data, object_hook=_decode), row.updated)
+
+    def _remember(self, key: str, record: _Record) -> None:
+        self._cache[key] = record
+        while len(self._cache) > self.cache_size:
+            # вытесненная запись не теряется: если она не сброшена, она лежит в _dirty
+            self._cache.popitem(last=False)
+
+    def _touch(self, key: str, record: _Record) -> None:
+        record.updated = time.time()
+        self._dirty[key] = record
+
+    async def _after_write(self) -> None:
+        if len(self._dirty) >= self.flush_batch:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush()
+        except Exception:
+            # изменения остались в _dirty и уйдут со следующим сбросом
+            logging.exception("FSM storage flush failed")
@@ -0,0 +1,137 @@
+# app/texts.py
+import datetime as dt
+from html import escape
+from typing import List
+
+from app.database.recurrence import RULES
+
+# лимит Telegram на длину сообщения (в UTF-16 единицах)
+MESSAGE_LIMIT = 4096
+
+
+def _utf16_len(text: str) -> int:
+    # эмодзи вроде 📍 занимают две UTF-16 единицы, Telegram считает именно их
+    return len(text.encode("utf-16-le")) // 2
+
+
+def event_text(event) -> str:
+    """
+    Карточка мероприятия в HTML (parse_mode="HTML").
+
+    Поля вводят организаторы, поэтому они экранируются: подчеркивание в
+    названии не должно ломать разбор всего дайджеста. Каждая строка закрывает
+    свои теги, так что split_message может резать между строками.
+    """
+    end_time = event.eventDateTime + dt.timedelta(minutes=event.eventDuration)
+    description = "\n".join(f"<i>{escape(line)}</i>" for line in (event.eventDesc or "").splitlines() if line.strip())
+    return (f"<b>{escape(str(event.eventName))}</b>\n"
+            f"{description}\n\n"
+            f"{event.eventDateTime.day} {event.eventDateTime.strftime('%B')}\n"
+            f"С <b>{event.eventDateTime.strftime('%H:%M')}</b> до <b>{end_time.strftime('%H:%M')}</b>\n"
+            f"📍 {escape(str(event.eventLocation))}\n"
+            f"👤 Организатор: {escape(str(event.eventOrganizer))}"
+            + (f"\n🔁 Повторяется {RULES[event.recurRule]}" if event.recurRule else ""))
+
+
+def _cut(block: str, limit: int) -> int:
+    """Где резать блок длиннее limit: по последнему переводу строки, иначе по лимиту"""
+    cut = limit
+    while _utf16_len(block[:cut]) > limit:
+        cut -= 1
+    line_end = block.rfind("\n", 0, cut)
+    return line_end + 1 if line_end > 0 else cut
+
+
+def split_message(blocks: List[str], separator: str = "\n\n", limit: int = MESSAGE_LIMIT) -> List[str]:
+    """
+    Склеить блоки в сообщения не длиннее limit, не разрывая блок без нужды.
+
+    Блок длиннее limit режется по строкам (разметка в блоках не переходит
+    через перевод строки); посреди строки — только если одна строка длиннее limit.
+    """
+    pages = []
+    current = ""
+    for block in blocks:
+        while _utf16_len(block) > limit:
+            # один блок длиннее лимита — режем по строкам
+            if current:
+                pages.append(current)
+                current = ""
+            cut = _cut(block, limit)
+            pages.append(block[:cut].rstrip("\n"))
+            block = block[cut:]
+        candidate = f"{current}{separator}{block}" if current else block
+        if _utf16_len(candidate) > limit:
+            pages.append(current)
+            current = block
+        else:
+            current = candidate
+    if current:
+        pages.append(current)
+    return pages
+
+
+def events_digest(events) -> List[str]:
+    """Все анонсы одним сообщением (или несколькими, если не влезает); HTML"""
+    blocks = ["📅 <b>Ближайшие мероприятия</b>"] + [event_text(e) for e in events]
+    return split_message(blocks, separator="\n\n➖➖➖\n\n")
+
+
+def reminder_text(event, lead: int) -> str:
+    """Напоминание записавшимся (HTML, как event_text); lead — минут до начала"""
+    if lead % 60 == 0:
+        hours = lead // 60
+        when = "через сутки" if hours == 24 else "через час" if hours == 1 else f"через {hours} ч."
+    else:
+        when = f"через {lead} мин."
+    return f"⏰ Напоминаем: {when} начнется мероприятие\n\n{event_text(event)}"
+
+
+def broadcast_progress(broadcast) -> str:
+    done = broadcast.sent + broadcast.failed + broadcast.blocked
+    percent = min(100, done * 100 // broadcast.total) if broadcast.total else 100
+    title = {"running": "📣 Рассылка идет", "done": "✅ Рассылка завершена",
+             "stopped": "⏹ Рассылка остановлена"}[broadcast.status]
+    return (f"*{title}* — {percent}%\n\n"
+            f"Обработано: {done} из {broadcast.total}\n"
+            f"✉️ Доставлено: {broadcast.sent}\n"
+            f"🚫 Заблокировали бота: {broadcast.blocked}\n"
+            f"⚠️ Ошибки: {broadcast.failed}")
+
+
+def stats_text(summary: dict, outbox: dict | None, catalog: dict) -> str:
+    """Сводка метрик для админа (без Markdown: в именах хендлеров есть подчеркивания)"""
+    lines = ["📊 Хендлеры (вызовов, среднее / p95 мс, SQL на апдейт):"]
+    handlers = sorted(summary["handlers"].items(), key=lambda item: -item[1]["sum"])
+    for name, row in handlers[:15]:
+        errors = f", ошибок {row['errors']}" if row["errors"] else ""
+        lines.append(f"• {name}: {row['count']}, {row['sum'] / row['count'] * 1000:.1f} / "
+                     f"≤{row['p95'] * 1000:.0f} мс, {row['queries']:.1f} SQL{errors}")
+    lines.append("")
+    lines.append("📡 Bot API (вызовов, среднее мс):")
+    for method, row in sorted(summary["methods"].items(), key=lambda item: -item[1]["count"]):
+        lines.append(f"• {method}: {row['count']}, {row['sum'] / row['count'] * 1000:.1f}")
+    lines.append("")
+    lines.append(f"⏳ Ожидание в очереди: в среднем {summary['queue_avg'] * 1000:.1f} мс, "
+                 f"p95 ≤{summary['queue_p95'] * 1000:.0f} мс, отброшено повторов {summary['coalesced']:.0f}")
+    avg = summary["query_time"] / summary["queries"] * 1000 if summary["queries"] else 0.0
+    lines.append(f"🗄 SQL: {summary['queries']} запросов, в среднем {avg:.2f} мс")
+    lines.append(f"📚 Кэш каталога: {catalog['games']} игр, попаданий {catalog['hits']}, промахов {catalog['misses']}")
+    if outbox is not None:
+        lines.append(f"📤 Очередь отправки: в очереди {outbox['queued']}, отправлено {outbox['sent']}, "
+                     f"повторов {outbox['retried']}, ошибок {outbox['failed']}, "
+                     f"p95 ожидания {outbox['latency_p95'] * 1000:.0f} мс")
+    return "\n".join(lines)
+
+
+def import_report(result: dict, errors: List[tuple[int, str]], limit: int = 50) -> List[str]:
+    """Итог /import: счетчики и ошибки по строкам (первые limit)"""
+    lines = [f"📥 Импорт завершен\n\n"
+             f"➕ Добавлено: {result['added']}\n"
+             f"✏️ Обновлено: {result['updated']}\n"
+             f"⏭ Уже в каталоге, пропущено: {result['skipped']}\n"
+             f"⚠️ Строк с ошибками: {len(errors)}"]
+    lines += [f"строка {line}: {error}" for line, error in errors[:limit]]
+    if len(errors) > limit:
+        lines.append(f"… и еще {len(errors) - limit}")
+    return split_message(lines, separator="\n")
@@ -0,0 +1,55 @@
+# app/web.py
+import asyncio
+import contextlib
+import signal
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from app.calendar_feed import setup_calendar
+from app.metrics import metrics_handler
+from config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEB_HOST, WEB_PORT
+
+
+def create_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    app = web.Application()
+    # апдейт только ставится в очередь UpdateExecutor, так что ответ Telegram уходит сразу;
+    # когда очередь полна, ответ задерживается — это и есть обратное давление на Telegram
+    handler = SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET or None,
+        handle_in_background=False,
+    )
+    handler.register(app, path=WEBHOOK_PATH)
+    app.router.add_get("/metrics", metrics_handler)
+    setup_calendar(app)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """Запустить встроенный веб-сервер и ждать до Ctrl+C / SIGTERM"""
+    app = create_app(dp, bot)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEB_HOST, WEB_PORT)
+    await site.start()
+
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    with contextlib.suppress(NotImplementedError):
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        # сервер перестает принимать запросы, shutdown диспетчера дорабатывает очередь
+        await runner.cleanup()
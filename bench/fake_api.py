@@ -0,0 +1,93 @@
+# bench/fake_api.py
+"""
+Локальная замена api.telegram.org для бенчмарка.
+
+Отдает апдейты из очереди через getUpdates (long polling) и отвечает на
+send*/edit*/answer* правдоподобными объектами, считая вызовы по методам.
+Сеть наружу не нужна.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+
+class FakeTelegram:
+    def __init__(self) -> None:
+        self.updates: asyncio.Queue[dict] = asyncio.Queue()
+        self.calls: Counter[str] = Counter()
+        self._message_ids = itertools.count(1000)
+        self._runner: web.AppRunner | None = None
+        self.base_url = ""
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def push(self, update: dict) -> None:
+        self.updates.put_nowait(update)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        params = dict(await request.post())
+        handler = getattr(self, f"on_{method}", None)
+        result = await handler(params) if handler is not None else self.default(method, params)
+        return web.json_response({"ok": True, "result": result})
+
+    # --- методы Bot API
+    async def on_getUpdates(self, params: dict) -> list:
+        timeout = float(params.get("timeout") or 0)
+        batch = []
+        try:
+            batch.append(await asyncio.wait_for(self.updates.get(), timeout) if timeout else self.updates.get_nowait())
+        except (asyncio.TimeoutError, asyncio.QueueEmpty):
+            return []
+        while len(batch) < int(params.get("limit") or 100) and not self.updates.empty():
+            batch.append(self.updates.get_nowait())
+        return batch
+
+    async def on_getMe(self, params: dict) -> dict:
+        return BOT_USER
+
+    def default(self, method: str, params: dict):
+        if method.startswith("copy"):
+            return {"message_id": next(self._message_ids)}
+        if method.startswith(("send", "forward", "edit")) and "chat_id" in params:
+            return self.message(params)
+        return True
+
+    def message(self, params: dict) -> dict:
+        message = {
+            "message_id": int(params.get("message_id") or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": {"id": int(params["chat_id"]), "type": "private"},
+            "from": BOT_USER,
+        }
+        if "text" in params:
+            message["text"] = params["text"]
+        if "photo" in params or "media" in params:
+            message["photo"] = [{"file_id": "photo", "file_unique_id": "photo", "width": 1, "height": 1}]
+            if "caption" in params:
+                message["caption"] = params["caption"]
+        if "reply_markup" in params:
+            markup = json.loads(params["reply_markup"])
+            if "inline_keyboard" in markup:
+                message["reply_markup"] = markup
+        return message
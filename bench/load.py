@@ -0,0 +1,309 @@
+# bench/load.py
+"""
+Нагрузочный бенчмарк бота.
+
+    python -m bench.load --users 100 --rounds 3 --out bench.json
+
+Поднимает bench.fake_api вместо api.telegram.org, запускает настоящий
+диспетчер (polling) во временном каталоге с пустыми базами и гоняет N
+одновременных пользователей по сценариям из app/handlers.py: /start,
+каталог, жанры, /search, мастера /addgame и /add. Каждый пользователь ждет
+обработки своего апдейта, прежде чем слать следующий. В конце проверяется,
+что мастер /add действительно создал мероприятия.
+
+Результат — JSON, который удобно сравнивать между версиями: апдейтов в
+секунду, задержки p50/p95/p99, вызовов Bot API и запросов к БД на апдейт.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.callbacks import CatalogPage, GenreAction, GenreOp  # noqa: E402
+
+GENRES = ["Стратегия", "Кооператив", "Пати", "Семейная", "Детектив", "Для двоих", "Экономическая", "Абстрактная"]
+WORDS = ["Кодовые", "имена", "Азул", "Мафия", "Манчкин", "Каркассон", "поезд", "Билет", "Колонизаторы",
+         "Диксит", "Ужас", "Аркхэма", "Остров", "Сокровища", "Замок", "Драконы", "Звезды", "Империя"]
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class Bench:
+    def __init__(self, api, users: int, rounds: int, seed: int) -> None:
+        self.api = api
+        self.users = users
+        self.rounds = rounds
+        self.random = random.Random(seed)
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.pending: dict[int, asyncio.Future] = {}
+        self.actions: dict[int, str] = {}
+        self.handler_ms: dict[str, list[float]] = defaultdict(list)
+        self.e2e_ms: list[float] = []
+        self.pushed: dict[int, float] = {}
+        self.db_queries = 0
+        self.genre_ids: list[int] = []
+
+    # --- учет
+    async def middleware(self, handler, event, data):
+        """Внешний middleware на dp.update: время обработки апдейта и сигнал пользователю"""
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            finished = time.perf_counter()
+            action = self.actions.pop(event.update_id, "other")
+            self.handler_ms[action].append((finished - started) * 1000)
+            self.e2e_ms.append((finished - self.pushed.pop(event.update_id, started)) * 1000)
+            future = self.pending.pop(event.update_id, None)
+            if future is not None and not future.done():
+                future.set_result(None)
+
+    def count_query(self, *args) -> None:
+        self.db_queries += 1
+
+    # --- апдейты
+    def _message(self, uid: int, text: str | None = None, photo: str | None = None) -> dict:
+        message = {"message_id": next(self.message_ids), "date": int(time.time()),
+                   "chat": {"id": uid, "type": "private"},
+                   "from": {"id": uid, "is_bot": False, "first_name": f"user{uid}"}}
+        if text is not None:
+            message["text"] = text
+            if text.startswith("/"):
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        if photo is not None:
+            message["photo"] = [{"file_id": photo, "file_unique_id": photo, "width": 640, "height": 480}]
+        return {"message": message}
+
+    def _callback(self, uid: int, data: str) -> dict:
+        return {"callback_query": {
+            "id": str(next(self.update_ids)), "chat_instance": str(uid), "data": data,
+            "from": {"id": uid, "is_bot": False, "first_name": f"user{uid}"},
+            "message": {"message_id": 1, "date": int(time.time()), "chat": {"id": uid, "type": "private"},
+                        "text": "…"},
+        }}
+
+    async def send(self, action: str, update: dict) -> None:
+        update_id = next(self.update_ids)
+        update["update_id"] = update_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[update_id] = future
+        self.actions[update_id] = action
+        self.pushed[update_id] = time.perf_counter()
+        self.api.push(update)
+        await future
+
+    # --- сценарии
+    async def player(self, uid: int) -> None:
+        rnd = random.Random(self.random.random())
+        await self.send("start", self._message(uid, "/start"))
+        for round_ in range(self.rounds):
+            await self.send("catalog", self._message(uid, "Каталог игр"))
+            for genre_id in rnd.sample(self.genre_ids, 2):
+                await self.send("genre", self._callback(uid, GenreAction(op=GenreOp.toggle, id=genre_id).pack()))
+            await self.send("genre", self._callback(uid, GenreAction(op=GenreOp.show).pack()))
+            await self.send("catalog_page", self._callback(uid, CatalogPage(page=1).pack()))
+            await self.send("search", self._message(uid, "/search"))
+            await self.send("search", self._message(uid, rnd.choice(WORDS)[:rnd.randint(3, 6)]))
+            if (uid + round_) % 10 == 0:
+                await self.add_game(uid, rnd)
+
+    async def organizer(self, uid: int) -> None:
+        rnd = random.Random(self.random.random())
+        for _ in range(self.rounds):
+            await self.send("add", self._message(uid, "/add"))
+            await self.send("add", self._message(uid, f"Вечер {rnd.choice(WORDS)}"))
+            await self.send("add", self._message(uid, "Играем до утра"))
+            await self.send("add", self._message(uid, "25/12/2030 18:00:00"))
+            await self.send("add", self._message(uid, "Разово"))
+            await self.send("add", self._message(uid, "180"))
+            await self.send("add", self._message(uid, "Антикафе"))
+            await self.send("add", self._message(uid, "Клуб"))
+            await self.send("add", self._message(uid, "bench"))
+            await self.send("add", self._message(uid, "Подтвердить"))
+            await self.send("events", self._message(uid, "Анонсы"))
+
+    async def add_game(self, uid: int, rnd: random.Random) -> None:
+        await self.send("addgame", self._message(uid, "/addgame"))
+        await self.send("addgame", self._message(uid, " ".join(rnd.sample(WORDS, 2))))
+        await self.send("addgame", self._message(uid, "Описание"))
+        await self.send("addgame", self._message(uid, ", ".join(rnd.sample(GENRES, 2))))
+        await self.send("addgame", self._message(uid, photo=f"photo{uid}"))
+        await self.send("addgame", self._message(uid, "bench"))
+
+
+async def seed(games: int, rnd: random.Random) -> None:
+    import datetime as dt
+
+    import app.database.requests as rq
+    from app.database.models import async_main
+
+    await async_main()
+    for i in range(games):
+        await rq.add_game({
+            "gameName": f"{' '.join(rnd.sample(WORDS, 2))} {i}",
+            "gameDesc": "Описание игры",
+            "gameGenre": ", ".join(rnd.sample(GENRES, rnd.randint(1, 3))),
+            "gamePhoto": f"photo{i}",
+            "gameAuthor": "bench",
+        })
+    for i in range(10):
+        await rq.add_event({
+            "eventName": f"Игротека {i}", "eventDesc": "Приходите",
+            "eventDateTime": dt.datetime.now() + dt.timedelta(days=i + 1), "eventDuration": 180,
+            "eventLocation": "Антикафе", "eventOrganizer": "Клуб",
+        })
+
+
+async def count_created_events() -> int:
+    """Мероприятия, добавленные организаторами через /add (у seed автора нет)"""
+    from sqlalchemy import func, select
+
+    from app.database.models import Event, async_session
+
+    async with async_session() as session:
+        return await session.scalar(select(func.count(Event.id)).where(Event.eventAuthor == "bench"))
+
+
+async def run(args) -> dict:
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from sqlalchemy import event
+
+    import app.database.requests as rq
+    import app.dispatcher
+    from app.database.engine import reader, writer
+    from app.delivery import Outbox
+    from app.dispatcher import create_dispatcher
+    from bench.fake_api import FakeTelegram
+
+    await seed(args.games, random.Random(args.seed))
+
+    api = FakeTelegram()
+    base_url = await api.start()
+    bench = Bench(api, args.users, args.rounds, args.seed)
+    bench.genre_ids = [g.id for g in await rq.get_genres()]
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(base_url))
+    bot = Bot(token="123456:BENCH", session=session)
+    sender = None
+    if args.outbox:
+        # с ограничением частоты, как в бою (тогда упираемся в ~30 сообщений/с)
+        sender = Outbox()
+        session.middleware(sender)
+    if not args.throttle:
+        # пользователи бенчмарка шлют апдейты без пауз: антифлуд резал бы сценарии
+        # (мастер /add вставал на середине), а проверки ведер все равно меряются
+        app.dispatcher.THROTTLE_BURST = 1_000_000
+    dp = create_dispatcher()
+    dp.update.outer_middleware(bench.middleware)
+    for db in (reader, writer, dp.storage.engine):
+        event.listen(db.sync_engine, "before_cursor_execute", bench.count_query)
+
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False,
+                                                   handle_as_tasks=False, polling_timeout=1))
+    await asyncio.sleep(0.2)
+    api.calls.clear()
+    bench.db_queries = 0
+
+    organizers = max(1, args.users // 10)
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(bench.player(10_000 + i) for i in range(args.users - organizers)),
+        *(bench.organizer(20_000 + i) for i in range(organizers)),
+    )
+    elapsed = time.perf_counter() - started
+    events_created = await count_created_events()
+    calls = Counter(api.calls)
+    calls.pop("getUpdates", None)
+
+    await dp.stop_polling()
+    await polling
+    if sender is not None:
+        await sender.close()
+    await bot.session.close()
+    await dp.storage.close()
+    await api.stop()
+
+    updates = sum(len(v) for v in bench.handler_ms.values())
+    all_ms = [ms for v in bench.handler_ms.values() for ms in v]
+    return {
+        "users": args.users,
+        "rounds": args.rounds,
+        "games": args.games,
+        "outbox": args.outbox,
+        "throttle": args.throttle,
+        "updates": updates,
+        # мастер /add дошел до конца: иначе замер /add ничего не стоит
+        "events_created": events_created,
+        "events_expected": organizers * args.rounds,
+        "duration_s": round(elapsed, 3),
+        "updates_per_s": round(updates / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(all_ms, 50), 2),
+            "p95": round(percentile(all_ms, 95), 2),
+            "p99": round(percentile(all_ms, 99), 2),
+            "max": round(max(all_ms, default=0.0), 2),
+        },
+        "e2e_latency_ms": {
+            "p50": round(percentile(bench.e2e_ms, 50), 2),
+            "p95": round(percentile(bench.e2e_ms, 95), 2),
+            "p99": round(percentile(bench.e2e_ms, 99), 2),
+        },
+        "api_calls_per_update": round(sum(calls.values()) / updates, 3),
+        "db_queries_per_update": round(bench.db_queries / updates, 3),
+        "api_calls": dict(sorted(calls.items())),
+        "actions": {
+            action: {"count": len(ms), "p50_ms": round(percentile(ms, 50), 2), "p95_ms": round(percentile(ms, 95), 2)}
+            for action, ms in sorted(bench.handler_ms.items())
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=50, help="одновременных пользователей")
+    parser.add_argument("--rounds", type=int, default=3, help="повторов сценария на пользователя")
+    parser.add_argument("--games", type=int, default=300, help="игр в каталоге")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--outbox", action="store_true", help="включить очередь с лимитами Telegram")
+    parser.add_argument("--throttle", action="store_true", help="оставить антифлуд с лимитами из config.py")
+    parser.add_argument("--out", help="куда записать JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out) if args.out else None
+    # базы создаются по относительным путям — работаем в пустом временном каталоге
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        os.chdir(workdir)
+        report = asyncio.run(run(args))
+        os.chdir(ROOT)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if report["events_created"] != report["events_expected"]:
+        sys.exit(f"сценарий /add не дошел до конца: создано {report['events_created']} "
+                 f"мероприятий из {report['events_expected']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,4 +4,55 @@ TOKEN = '7684118989:AAEVXRQRf6_QcH9_16OXw-f23QfBkhhb55Q'
 ADMIN_IDS = [
     1023456789, 1479898485  # Ваш ID
     # Добавьте другие ID администраторов здесь
-]
\ No newline at end of file
+]
+
+# Режим получения обновлений: "polling" (по умолчанию) или "webhook"
+BOT_MODE = "polling"
+
+# --- Настройки вебхука (используются только при BOT_MODE = "webhook")
+# Публичный https-адрес, который получит Telegram, например "https://bot.example.com/webhook".
+# Пустая строка — setWebhook не вызывается: удобно для локальной проверки через POST
+WEBHOOK_URL = ""
+WEBHOOK_PATH = "/webhook"
+# Секрет из заголовка X-Telegram-Bot-Api-Secret-Token; пустая строка — без проверки
+WEBHOOK_SECRET = ""
+# Адрес, на котором слушает встроенный aiohttp-сервер
+WEB_HOST = "0.0.0.0"
+WEB_PORT = 8080
+
+# Число воркер-процессов. 0 или 1 — все в одном процессе; N > 1 — фронт-процесс
+# принимает апдейты и раскладывает их по N воркерам по chat id
+WORKERS = 0
+
+# Апдейты одного чата обрабатываются по очереди, разных — параллельно, но не больше
+# MAX_CONCURRENT_UPDATES одновременно. Когда в очереди MAX_QUEUED_UPDATES апдейтов,
+# бот перестает забирать новые, пока очередь не разберется
+MAX_CONCURRENT_UPDATES = 32
+MAX_QUEUED_UPDATES = 1000
+
+# Антифлуд: у каждого пользователя на каждое действие свое ведро из THROTTLE_BURST жетонов,
+# которое пополняется на THROTTLE_RATE жетонов в секунду. Действие стоит THROTTLE_COSTS[...]
+# жетонов; хендлеры без флага throttle считаются действием "default"
+THROTTLE_RATE = 1.0
+THROTTLE_BURST = 5
+THROTTLE_COSTS = {
+    "default": 1,
+    "start": 0.5,
+    "events": 2,
+    "search": 2,
+    "catalog": 3,
+}
+
+# Порт отдельного сервера метрик Prometheus (/metrics) и календаря (/calendar.ics, /calendar.json)
+# для режима polling. В режиме webhook они отдаются на WEB_PORT. Воркеры слушают METRICS_PORT + 1 + номер.
+# 0 — отдельный сервер не поднимается
+METRICS_PORT = 0
+
+# База бота (SQLAlchemy URL). Чтения идут через пул соединений, записи — через одно соединение по очереди
+DATABASE_URL = "sqlite+aiosqlite:///db.sqlite3"
+# Пул чтения связан с MAX_CONCURRENT_UPDATES: каждый из одновременно обрабатываемых апдейтов
+# может занимать соединение (на время одного запроса), поэтому пул не меньше их числа.
+# DB_READ_OVERFLOW — запас для фоновых задач: напоминания, рассылка, выгрузка, календарь.
+# Когда и пул, и запас заняты, запрос ждет соединение до 30 с, затем падает с TimeoutError
+DB_READ_POOL = MAX_CONCURRENT_UPDATES
+DB_READ_OVERFLOW = 8
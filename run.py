@@ -1,21 +1,39 @@
 import asyncio
-from aiogram import Bot, Dispatcher, F
 
-from config import TOKEN
-from app.handlers import router
+from config import BOT_MODE, WORKERS, WEB_HOST, METRICS_PORT
 from app.database.models import async_main
+from app.delivery import outbox
+from app.dispatcher import create_bot, create_dispatcher
+from app.metrics import start_metrics_server
+from app.sharding import run_sharded
+from app.web import run_webhook
 
 
 async def main():
     await async_main()
-    bot = Bot(token=TOKEN)
-    db = Dispatcher()
-    db.include_router(router)
-    await db.start_polling(bot)
+    if WORKERS > 1:
+        await run_sharded(WORKERS)
+        return
+
+    bot = create_bot()
+    db = create_dispatcher()
+    metrics = None
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(db, bot)
+        else:
+            if METRICS_PORT:
+                metrics = await start_metrics_server(WEB_HOST, METRICS_PORT)
+            # апдейты раздает UpdateExecutor; polling ждет только постановки в его очередь
+            await db.start_polling(bot, handle_as_tasks=False)
+    finally:
+        if metrics is not None:
+            await metrics.cleanup()
+        await outbox.close()
 
 
 if __name__ == '__main__':
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        print('Exit')
\ No newline at end of file
+        print('Exit')
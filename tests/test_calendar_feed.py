@@ -0,0 +1,125 @@
+# tests/test_calendar_feed.py
+import asyncio
+import datetime as dt
+import json
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import app.calendar_feed as feed
+from app.database.recurrence import Occurrence, expand
+
+
+def event(id=1, start=dt.datetime(2026, 1, 5, 19), rule=None, **fields):
+    values = dict(id=id, eventName=f"Игротека {id}", eventDesc="Приходите, будет весело", eventDateTime=start,
+                  eventDuration=180, eventLocation="Антикафе; 2 этаж", eventOrganizer="Клуб",
+                  recurRule=rule, recurUntil=None, recurExceptions=None)
+    values.update(fields)
+    return SimpleNamespace(**values)
+
+
+@pytest.fixture
+def source(monkeypatch):
+    """Подменяет rq.get_events: список в state["events"], число обращений в state["calls"]"""
+    state = {"events": [Occurrence(event(), event().eventDateTime)], "calls": 0}
+
+    async def get_events():
+        state["calls"] += 1
+        return state["events"]
+
+    monkeypatch.setattr(feed.rq, "get_events", get_events)
+    monkeypatch.setattr(feed, "calendar", feed.CalendarFeed())
+    return state
+
+
+def run(scenario):
+    """scenario(client) на приложении только с календарем"""
+    async def main():
+        app = web.Application()
+        feed.setup_calendar(app)
+        async with TestClient(TestServer(app)) as client:
+            return await scenario(client)
+    return asyncio.run(main())
+
+
+def test_ics_body(source):
+    source["events"] = expand([event(rule="weekly", recurExceptions="2026-01-12")],
+                              dt.datetime(2026, 1, 1), dt.datetime(2026, 2, 1))
+
+    async def scenario(client):
+        response = await client.get("/calendar.ics")
+        assert response.status == 200
+        assert response.content_type == "text/calendar"
+        return await response.text()
+
+    body = run(scenario)
+    assert body.startswith("BEGIN:VCALENDAR\r\n") and body.endswith("END:VCALENDAR\r\n")
+    # проведения серии — одно событие с правилом повтора
+    assert body.count("BEGIN:VEVENT") == 1
+    assert "DTSTART:20260105T190000\r\n" in body
+    assert "DTEND:20260105T220000\r\n" in body
+    assert "RRULE:FREQ=WEEKLY\r\n" in body
+    assert "EXDATE:20260112T190000\r\n" in body
+    assert "LOCATION:Антикафе\\; 2 этаж\r\n" in body
+    assert all(len(line.encode()) <= 75 for line in body.split("\r\n"))
+
+
+def test_json_lists_occurrences(source):
+    source["events"] = expand([event(rule="weekly")], dt.datetime(2026, 1, 1), dt.datetime(2026, 1, 20))
+
+    async def scenario(client):
+        response = await client.get("/calendar.json")
+        assert response.content_type == "application/json"
+        return json.loads(await response.text())
+
+    body = run(scenario)
+    assert [e["start"] for e in body["events"]] == ["2026-01-05T19:00:00", "2026-01-12T19:00:00",
+                                                     "2026-01-19T19:00:00"]
+    assert body["events"][0]["end"] == "2026-01-05T22:00:00"
+    assert body["events"][0]["recurrence"] == "weekly"
+
+
+def test_etag_and_last_modified_give_304(source):
+    async def scenario(client):
+        first = await client.get("/calendar.ics")
+        etag, modified = first.headers["ETag"], first.headers["Last-Modified"]
+        by_etag = await client.get("/calendar.ics", headers={"If-None-Match": etag})
+        weak = await client.get("/calendar.ics", headers={"If-None-Match": f'"other", W/{etag}'})
+        by_date = await client.get("/calendar.ics", headers={"If-Modified-Since": modified})
+        # If-None-Match главнее даты
+        other = await client.get("/calendar.ics", headers={"If-None-Match": '"other"', "If-Modified-Since": modified})
+        json_etag = (await client.get("/calendar.json")).headers["ETag"]
+        return etag, by_etag, weak, by_date, other, json_etag
+
+    etag, by_etag, weak, by_date, other, json_etag = run(scenario)
+    assert by_etag.status == weak.status == by_date.status == 304
+    assert by_etag.headers["ETag"] == etag
+    assert by_etag.headers["Cache-Control"] == feed.CACHE_CONTROL
+    assert other.status == 200
+    assert json_etag != etag
+
+
+def test_render_once_per_list(source):
+    async def scenario(client):
+        first = (await client.get("/calendar.ics")).headers["ETag"]
+        await client.get("/calendar.json")
+        # тот же список перечитан заново (кэш истек) — содержимое не менялось
+        source["events"] = list(source["events"])
+        same = (await client.get("/calendar.ics")).headers["ETag"]
+        source["events"] = source["events"] + [Occurrence(event(id=2), dt.datetime(2026, 2, 1, 12))]
+        changed = (await client.get("/calendar.ics")).headers["ETag"]
+        return first, same, changed
+
+    first, same, changed = run(scenario)
+    assert first == same != changed
+    assert feed.calendar.renders == 2
+    assert source["calls"] == 4
+
+
+def test_unknown_format_is_404(source):
+    async def scenario(client):
+        return (await client.get("/calendar.xml")).status
+
+    assert run(scenario) == 404
@@ -0,0 +1,141 @@
+# tests/test_delivery.py
+import asyncio
+import datetime as dt
+import time
+
+import pytest
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import Chat, Message
+
+from app.delivery import Outbox, TokenBucket, bulk
+
+
+class FakeSession(BaseSession):
+    """Сессия без сети: пишет (чат, текст, время) в log, ответ задает reply"""
+
+    def __init__(self, reply=None) -> None:
+        super().__init__()
+        self.log: list[tuple[int, str, float]] = []
+        self.reply = reply
+
+    async def make_request(self, bot, method, timeout=None):
+        self.log.append((method.chat_id, method.text, time.monotonic()))
+        if self.reply is not None:
+            await self.reply(method)
+        return Message(message_id=len(self.log), date=dt.datetime.now(),
+                       chat=Chat(id=method.chat_id, type="private"), text=method.text)
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def run(scenario, reply=None, **options):
+    """scenario(bot, outbox, session) на боте, чьи отправки идут через Outbox"""
+    async def main():
+        session = FakeSession(reply)
+        outbox = Outbox(**options)
+        bot = Bot("42:TEST", session=session)
+        bot.session.middleware(outbox)
+        try:
+            return await scenario(bot, outbox, session)
+        finally:
+            await outbox.close(timeout=1)
+    return asyncio.run(main())
+
+
+def test_bucket_burst_then_rate(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.delivery.time.monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=2, capacity=3)
+    for _ in range(3):
+        assert bucket.delay() == 0.0
+        bucket.take()
+    assert bucket.delay() == pytest.approx(0.5)
+    now[0] += 0.5
+    assert bucket.delay() == 0.0
+    bucket.block(10)
+    now[0] += 5
+    assert bucket.delay() == pytest.approx(5)
+    now[0] += 100
+    assert bucket.idle()
+
+
+def test_chat_rate_keeps_order():
+    async def scenario(bot, outbox, session):
+        await asyncio.gather(*(bot.send_message(1, f"msg {i}") for i in range(4)))
+        return session.log
+
+    log = run(scenario, chat_rate=20, chat_burst=2)
+    assert [text for _, text, _ in log] == [f"msg {i}" for i in range(4)]
+    # два сразу, дальше по токену раз в 1/20 с
+    assert log[1][2] - log[0][2] < 0.03
+    assert log[3][2] - log[1][2] >= 0.09
+
+
+def test_interactive_goes_before_bulk():
+    async def scenario(bot, outbox, session):
+        with bulk():
+            sends = [asyncio.create_task(bot.send_message(chat, "рассылка")) for chat in range(1, 6)]
+        sends.append(asyncio.create_task(bot.send_message(100, "ответ")))
+        await asyncio.gather(*sends)
+        return session.log
+
+    log = run(scenario)
+    assert log[0][:2] == (100, "ответ")
+    assert [chat for chat, _, _ in log[1:]] == [1, 2, 3, 4, 5]
+
+
+def test_retry_after_requeues_first():
+    failed = set()
+
+    async def reply(method):
+        if method.text == "a" and "a" not in failed:
+            failed.add("a")
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0)
+
+    async def scenario(bot, outbox, session):
+        await asyncio.gather(bot.send_message(1, "a"), bot.send_message(1, "b"))
+        return session.log, outbox.stats()
+
+    log, stats = run(scenario, reply=reply)
+    assert [text for _, text, _ in log] == ["a", "a", "b"]
+    assert stats["retried"] == 1 and stats["sent"] == 2 and stats["failed"] == 0
+
+
+def test_retry_after_gives_up_after_max_retries():
+    async def reply(method):
+        raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0)
+
+    async def scenario(bot, outbox, session):
+        with pytest.raises(TelegramRetryAfter):
+            await bot.send_message(1, "a")
+        return len(session.log), outbox.stats()
+
+    attempts, stats = run(scenario, reply=reply, max_retries=2)
+    assert attempts == 3
+    assert stats["retried"] == 2 and stats["failed"] == 1 and stats["queued"] == 0
+
+
+def test_close_settles_in_flight_requests():
+    async def reply(method):
+        await asyncio.sleep(0.05 if method.text == "быстро" else 60)
+
+    async def scenario(bot, outbox, session):
+        fast = asyncio.create_task(bot.send_message(1, "быстро"))
+        slow = asyncio.create_task(bot.send_message(2, "долго"))
+        await asyncio.sleep(0.01)
+        await outbox.close(timeout=0.2)
+        # успевший запрос доставлен, зависший оборван, и отправитель об этом знает
+        sent = await fast
+        with pytest.raises(asyncio.CancelledError):
+            await slow
+        return sent, outbox.stats()
+
+    sent, stats = run(scenario, reply=reply)
+    assert sent.text == "быстро"
+    assert stats["sent"] == 1 and stats["queued"] == 0
@@ -0,0 +1,178 @@
+# tests/test_executor.py
+import asyncio
+from types import SimpleNamespace
+
+from aiogram import Router
+from aiogram.types import Update
+
+from app.executor import UpdateExecutor
+
+_ids = iter(range(1, 1_000_000))
+
+
+def message(chat_id: int, text: str) -> tuple[Update, dict]:
+    update = Update.model_validate({"update_id": next(_ids), "message": {
+        "message_id": 1, "date": 0, "text": text,
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "user"},
+    }})
+    return update, {"event_chat": SimpleNamespace(id=chat_id), "event_from_user": SimpleNamespace(id=chat_id)}
+
+
+class Recorder:
+    """Хендлер: пишет (чат, текст) в log; пока gate закрыт — ждет"""
+
+    def __init__(self) -> None:
+        self.log: list[tuple[int, str]] = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.running = 0
+        self.max_running = 0
+
+    async def __call__(self, update: Update, data: dict):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0)
+        await self.gate.wait()
+        self.log.append((update.message.chat.id, update.message.text))
+        self.running -= 1
+
+
+def run(scenario):
+    async def main():
+        return await scenario()
+    return asyncio.run(main())
+
+
+def test_chat_order_and_parallel_chats():
+    async def scenario():
+        executor = UpdateExecutor(Router(), max_concurrency=4)
+        handler = Recorder()
+        for i in range(5):
+            for chat in (1, 2):
+                await executor(handler, *message(chat, f"msg {i}"))
+        await executor.close()
+        return handler
+
+    handler = run(scenario)
+    for chat in (1, 2):
+        assert [text for c, text in handler.log if c == chat] == [f"msg {i}" for i in range(5)]
+    # разные чаты шли параллельно, один чат — никогда
+    assert handler.max_running == 2
+
+
+def test_repeated_menu_press_is_coalesced():
+    async def scenario():
+        executor = UpdateExecutor(Router())
+        handler = Recorder()
+        handler.gate.clear()
+        done = []
+        executor.listeners.append(lambda update: done.append(update.update_id))
+        for _ in range(3):
+            await executor(handler, *message(1, "Анонсы"))
+        # другой чат и не-меню не склеиваются
+        await executor(handler, *message(2, "Анонсы"))
+        await executor(handler, *message(1, "привет"))
+        coalesced = len(done)
+        handler.gate.set()
+        await executor.close()
+        # после обработки та же кнопка снова принимается
+        await executor(handler, *message(1, "Анонсы"))
+        await executor.close()
+        return handler, coalesced, done
+
+    handler, coalesced, done = run(scenario)
+    assert coalesced == 2
+    assert sorted(handler.log) == [(1, "Анонсы"), (1, "Анонсы"), (1, "привет"), (2, "Анонсы")]
+    assert len(done) == 6
+
+
+def test_backpressure_blocks_intake_and_coalesces_waiting_presses():
+    async def scenario():
+        executor = UpdateExecutor(Router(), max_concurrency=1, max_queued=1)
+        handler = Recorder()
+        handler.gate.clear()
+        await executor(handler, *message(1, "первое"))
+        # очередь полна: следующий апдейт ждет места
+        waiting = asyncio.create_task(executor(handler, *message(2, "Каталог игр")))
+        await asyncio.sleep(0.01)
+        blocked = not waiting.done()
+        # пока прием стоит, повторные нажатия той же кнопки сразу отбрасываются
+        repeats = [asyncio.create_task(executor(handler, *message(2, "Каталог игр"))) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        repeats_done = all(t.done() for t in repeats)
+        handler.gate.set()
+        await waiting
+        await executor.close()
+        return handler, blocked, repeats_done
+
+    handler, blocked, repeats_done = run(scenario)
+    assert blocked
+    assert repeats_done
+    assert handler.log == [(1, "первое"), (2, "Каталог игр")]
+
+
+def test_cancelled_wait_releases_key():
+    async def scenario():
+        executor = UpdateExecutor(Router(), max_concurrency=1, max_queued=1)
+        handler = Recorder()
+        handler.gate.clear()
+        await executor(handler, *message(1, "первое"))
+        waiting = asyncio.create_task(executor(handler, *message(2, "О нас")))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        keys_after_cancel = dict(executor._keys)
+        handler.gate.set()
+        await executor(handler, *message(2, "О нас"))
+        await executor.close()
+        return handler, keys_after_cancel, executor._keys
+
+    handler, keys_after_cancel, keys = run(scenario)
+    assert keys_after_cancel == {}
+    assert handler.log == [(1, "первое"), (2, "О нас")]
+    assert keys == {}
+
+
+def test_handler_error_reaches_router_error_observer():
+    async def scenario():
+        router = Router()
+        seen = []
+
+        @router.error()
+        async def on_error(event):
+            seen.append(type(event.exception))
+
+        async def failing(update, data):
+            raise RuntimeError("boom")
+
+        executor = UpdateExecutor(router)
+        await executor(failing, *message(1, "привет"))
+        await executor.close()
+        return seen
+
+    assert run(scenario) == [RuntimeError]
+
+
+def test_update_waiting_for_slot_after_chat_drained():
+    async def scenario():
+        executor = UpdateExecutor(Router(), max_concurrency=1, max_queued=1)
+        handler = Recorder()
+        handler.gate.clear()
+        await executor(handler, *message(1, "первое"))
+        # ждет места, пока первый апдейт того же чата не закончится и чат не уйдет из очереди
+        waiting = asyncio.create_task(executor(handler, *message(1, "второе")))
+        await asyncio.sleep(0.01)
+        handler.gate.set()
+        await waiting
+        await executor(handler, *message(1, "третье"))
+        await asyncio.sleep(0.01)
+        # воркер пережил конец чужого ключевого набора
+        alive = all(not worker.done() for worker in executor._workers)
+        await executor.close(timeout=1)
+        return handler, executor, alive
+
+    handler, executor, alive = run(scenario)
+    assert alive
+    assert handler.log == [(1, "первое"), (1, "второе"), (1, "третье")]
+    assert executor._keys == {} and executor._chats == {}
@@ -0,0 +1,23 @@
+# tests/test_genres.py
+from app.database.genres import genre_key, parse_genres
+
+
+def test_separators_and_spaces():
+    assert parse_genres("пати,  кооператив; для   двоих") == ["Пати", "Кооператив", "Для двоих"]
+    assert parse_genres("Стратегия/Экономическая | Семейная\nДетектив") == [
+        "Стратегия", "Экономическая", "Семейная", "Детектив"]
+
+
+def test_spelling_is_kept():
+    assert parse_genres("RPG; D&D, настольная RPG, eurogame") == ["RPG", "D&D", "Настольная RPG", "Eurogame"]
+
+
+def test_duplicates_ignore_case_and_keep_first_spelling():
+    assert parse_genres("Пати, стратегия, ПАТИ, rpg, RPG") == ["Пати", "Стратегия", "Rpg"]
+    assert genre_key("ПАТИ") == genre_key("пати")
+
+
+def test_empty_input():
+    assert parse_genres(None) == []
+    assert parse_genres("") == []
+    assert parse_genres(" , ;; / ") == []
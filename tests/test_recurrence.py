@@ -0,0 +1,72 @@
+# tests/test_recurrence.py
+import datetime as dt
+from types import SimpleNamespace
+
+from app.database.recurrence import (Occurrence, expand, format_exceptions, next_occurrence, occurrences,
+                                     occurs_at, parse_exceptions)
+
+
+def event(id=1, start=dt.datetime(2026, 1, 5, 19), rule=None, until=None, exceptions=None, name=None):
+    return SimpleNamespace(id=id, eventName=name or f"event {id}", eventDateTime=start, eventDuration=60,
+                           recurRule=rule, recurUntil=until, recurExceptions=exceptions)
+
+
+def days(starts):
+    return [s.date().isoformat() for s in starts]
+
+
+def test_one_off_inside_and_outside_window():
+    e = event(start=dt.datetime(2026, 3, 1, 18))
+    assert list(occurrences(e, dt.datetime(2026, 2, 1), dt.datetime(2026, 4, 1))) == [e.eventDateTime]
+    assert list(occurrences(e, dt.datetime(2026, 3, 1, 18), dt.datetime(2026, 4, 1))) == []
+
+
+def test_weekly_until_and_exceptions():
+    e = event(rule="weekly", until=dt.datetime(2026, 2, 2), exceptions="2026-01-19")
+    assert days(occurrences(e, dt.datetime(2026, 1, 1), dt.datetime(2027, 1, 1))) == [
+        "2026-01-05", "2026-01-12", "2026-01-26", "2026-02-02"]
+
+
+def test_biweekly_old_series_jumps_to_window():
+    e = event(start=dt.datetime(2000, 1, 3, 19), rule="biweekly")
+    starts = list(occurrences(e, dt.datetime(2030, 1, 1), dt.datetime(2030, 2, 1)))
+    assert len(starts) == 2
+    assert all((s - e.eventDateTime) % dt.timedelta(weeks=2) == dt.timedelta(0) for s in starts)
+
+
+def test_monthly_clamps_to_last_day():
+    e = event(start=dt.datetime(2026, 1, 31, 19), rule="monthly")
+    assert days(occurrences(e, dt.datetime(2026, 1, 1), dt.datetime(2026, 5, 1))) == [
+        "2026-01-31", "2026-02-28", "2026-03-31", "2026-04-30"]
+
+
+def test_next_occurrence_and_occurs_at():
+    e = event(rule="weekly", exceptions="2026-01-12")
+    assert next_occurrence(e, dt.datetime(2026, 1, 6)) == dt.datetime(2026, 1, 19, 19)
+    assert occurs_at(e, dt.datetime(2026, 1, 19, 19))
+    assert not occurs_at(e, dt.datetime(2026, 1, 12, 19))
+    assert not occurs_at(e, dt.datetime(2026, 1, 19, 18))
+    assert next_occurrence(event(rule="weekly", until=dt.datetime(2026, 1, 5)), dt.datetime(2026, 1, 6)) is None
+
+
+def test_expand_keeps_each_series_fields():
+    weekly = event(id=1, name="A weekly", start=dt.datetime(2026, 10, 19, 19), rule="weekly")
+    monthly = event(id=2, name="B monthly", start=dt.datetime(2026, 10, 21, 18), rule="monthly")
+    result = expand([weekly, monthly], dt.datetime(2026, 10, 18), dt.datetime(2026, 11, 15))
+
+    assert [o.eventDateTime for o in result] == sorted(o.eventDateTime for o in result)
+    assert [(o.id, o.eventName, o.eventDateTime.date().isoformat()) for o in result] == [
+        (1, "A weekly", "2026-10-19"),
+        (2, "B monthly", "2026-10-21"),
+        (1, "A weekly", "2026-10-26"),
+        (1, "A weekly", "2026-11-02"),
+        (1, "A weekly", "2026-11-09"),
+    ]
+    assert all(isinstance(o, Occurrence) and o.event is (weekly if o.id == 1 else monthly) for o in result)
+
+
+def test_exceptions_round_trip():
+    dates = [dt.date(2026, 2, 1), dt.date(2026, 1, 1), dt.date(2026, 1, 1)]
+    assert format_exceptions(dates) == "2026-01-01,2026-02-01"
+    assert parse_exceptions("2026-01-01, 2026-02-01,") == {dt.date(2026, 1, 1), dt.date(2026, 2, 1)}
+    assert format_exceptions([]) is None
@@ -0,0 +1,119 @@
+# tests/test_reminders.py
+import asyncio
+import datetime as dt
+from types import SimpleNamespace
+
+import pytest
+
+import app.reminders as reminders_module
+from app.reminders import ReminderScheduler
+
+
+def leads(scheduler: ReminderScheduler) -> list[int]:
+    """Отступы (в минутах) сроков в куче, от ближайшего"""
+    return [lead for _, _, _, lead in sorted(scheduler._heap)]
+
+
+def scheduled(before_start: dt.timedelta) -> ReminderScheduler:
+    scheduler = ReminderScheduler()
+    scheduler.schedule(1, dt.datetime.now() + before_start)
+    return scheduler
+
+
+def test_far_event_gets_both_leads():
+    assert leads(scheduled(dt.timedelta(days=3))) == [1440, 60]
+
+
+def test_25h_before_start():
+    assert leads(scheduled(dt.timedelta(hours=25))) == [1440, 60]
+
+
+def test_2h_before_start_skips_missed_day_reminder():
+    # суточный срок прошел, но часовой еще впереди — догонять сутки не нужно
+    scheduler = scheduled(dt.timedelta(hours=2))
+    assert leads(scheduler) == [60]
+    assert scheduler._heap[0][0] > dt.datetime.now() + dt.timedelta(minutes=59)
+
+
+def test_30min_before_start_catches_up_hour_reminder_now():
+    scheduler = scheduled(dt.timedelta(minutes=30))
+    assert leads(scheduler) == [60]
+    assert scheduler._heap[0][0] <= dt.datetime.now()
+
+
+def test_started_event_is_not_scheduled():
+    scheduler = scheduled(dt.timedelta(minutes=-5))
+    assert scheduler._heap == []
+    assert scheduler._scheduled == {}
+
+
+def test_schedule_twice_is_noop():
+    scheduler = ReminderScheduler()
+    start = dt.datetime.now() + dt.timedelta(days=2)
+    scheduler.schedule(1, start)
+    scheduler.schedule(1, start)
+    assert leads(scheduler) == [1440, 60]
+    assert scheduler._scheduled == {(1, start): 2}
+
+
+def test_other_worker_forwards_instead_of_scheduling(monkeypatch):
+    async def get_subscribed_events():
+        raise AssertionError("только первый воркер читает сроки из базы")
+
+    monkeypatch.setattr(reminders_module.rq, "get_subscribed_events", get_subscribed_events)
+    scheduler = ReminderScheduler()
+    forwarded = []
+    scheduler.listeners.append(lambda event_id, start: forwarded.append((event_id, start)))
+    asyncio.run(scheduler.start(SimpleNamespace(), worker_index=1))
+    start = dt.datetime.now() + dt.timedelta(days=2)
+    scheduler.schedule(1, start)
+    assert scheduler._task is None
+    assert scheduler._heap == []
+    assert forwarded == [(1, start)]
+
+
+@pytest.fixture
+def fire(monkeypatch):
+    """_fire с подмененной базой: возвращает тексты, ушедшие пользователям"""
+    def run(start: dt.datetime, lead: int) -> list[str]:
+        event = SimpleNamespace(id=1, eventName="Игротека", eventDesc="Приходите", eventDateTime=start,
+                                eventDuration=60, eventLocation="Антикафе", eventOrganizer="Клуб", recurRule=None,
+                                recurUntil=None, recurExceptions=None)
+        sent = []
+
+        async def get_event(event_id):
+            return event
+
+        async def claim_reminders(event_id, occurrence, claimed_lead):
+            assert claimed_lead == lead
+            return [100]
+
+        async def send_message(tg_id, text, **kwargs):
+            sent.append(text)
+
+        monkeypatch.setattr(reminders_module.rq, "get_event", get_event)
+        monkeypatch.setattr(reminders_module.rq, "claim_reminders", claim_reminders)
+
+        async def main():
+            scheduler = ReminderScheduler()
+            scheduler._bot = SimpleNamespace(send_message=send_message)
+            await scheduler._fire(1, start, lead)
+            await asyncio.gather(*scheduler._sending)
+
+        asyncio.run(main())
+        return sent
+
+    return run
+
+
+def test_on_time_reminder_text(fire):
+    start = (dt.datetime.now() + dt.timedelta(hours=1)).replace(microsecond=0)
+    [text] = fire(start, 60)
+    assert text.startswith("⏰ Напоминаем: через час")
+
+
+def test_catch_up_reminder_says_time_left(fire):
+    # часовой срок пропущен: за 30 минут до начала текст не должен обещать «через час»
+    start = (dt.datetime.now() + dt.timedelta(minutes=30)).replace(microsecond=0)
+    [text] = fire(start, 60)
+    assert text.startswith("⏰ Напоминаем: через 30 мин.") or text.startswith("⏰ Напоминаем: через 29 мин.")
@@ -0,0 +1,74 @@
+# tests/test_search.py
+from types import SimpleNamespace
+
+from app.database.search import NameIndex, max_errors, normalize, substring_distance
+
+NAMES = ["Манчкин", "Кодовые имена", "Каркассон", "Мафия", "Билет на поезд", "Ужас Аркхэма", "Диксит"]
+
+
+def index(names=NAMES):
+    idx = NameIndex()
+    idx.rebuild(SimpleNamespace(id=i, gameName=name) for i, name in enumerate(names, 1))
+    return idx
+
+
+def names(idx, ids):
+    return [NAMES[i - 1] for i in ids]
+
+
+def test_normalize():
+    assert normalize("Кодовые  Имена: Ёлки") == "кодовые имена елки"
+    assert normalize(None) == ""
+
+
+def test_substring_distance():
+    assert substring_distance("кин", "манчкин", 0) == 0
+    assert substring_distance("манчкен", "манчкин", 1) == 1
+    assert substring_distance("мунчкен", "манчкин", 1) is None
+
+
+def test_search_ranks_prefix_then_word_then_substring():
+    idx = index(["Замок", "Драконий замок", "Призамковый", "Азул"])
+    assert idx.search("замок") == [1, 2]
+    assert idx.search("зам") == [1, 2, 3]
+    assert idx.search("за") == [1, 2]
+
+
+def test_fuzzy_typo():
+    idx = index()
+    assert names(idx, idx.fuzzy("Манчкен", 5)) == ["Манчкин"]
+    assert names(idx, idx.fuzzy("каркасон", 5)) == ["Каркассон"]
+
+
+def test_fuzzy_translit_and_layout():
+    idx = index()
+    assert names(idx, idx.fuzzy("munchkin", 5)) == ["Манчкин"]
+    # "мафия", набранная в английской раскладке
+    assert names(idx, idx.fuzzy("vfabz", 5)) == ["Мафия"]
+
+
+def test_fuzzy_substring_of_longer_name():
+    idx = index()
+    assert names(idx, idx.fuzzy("аркхема", 5)) == ["Ужас Аркхэма"]
+
+
+def test_fuzzy_short_query_needs_exact_match():
+    assert max_errors(3) == 0
+    idx = index()
+    assert names(idx, idx.fuzzy("кин", 5)) == ["Манчкин"]
+    assert idx.fuzzy("кын", 5) == []
+
+
+def test_fuzzy_ranks_closer_first_and_limits():
+    idx = index(["Мафия", "Мафия: Город", "Магия"])
+    assert idx.fuzzy("мафия", 10)[:2] == [1, 2]
+    assert len(idx.fuzzy("мафия", 1)) == 1
+
+
+def test_fuzzy_follows_add_and_remove():
+    idx = index()
+    idx.add(SimpleNamespace(id=100, gameName="Колонизаторы"))
+    assert idx.fuzzy("колонизатры", 5) == [100]
+    idx.remove(100)
+    assert idx.fuzzy("колонизатры", 5) == []
+    assert "колонизаторы" not in idx.names.values()
@@ -0,0 +1,157 @@
+# tests/test_storage.py
+import asyncio
+import datetime as dt
+import time
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import func, select
+
+from app.storage import SQLiteStorage, fsm_states
+
+
+def key(chat_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id)
+
+
+@pytest.fixture
+def url(tmp_path):
+    return f"sqlite+aiosqlite:///{tmp_path / 'fsm.sqlite3'}"
+
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+
+async def rows(storage: SQLiteStorage) -> int:
+    async with storage.engine.connect() as conn:
+        return await conn.scalar(select(func.count()).select_from(fsm_states))
+
+
+def test_state_and_data_survive_restart(url):
+    start = dt.datetime(2026, 1, 5, 19)
+
+    async def scenario():
+        storage = SQLiteStorage(url)
+        await storage.set_state(key(1), "AddEvent:eventName")
+        await storage.set_data(key(1), {"eventName": "Игротека", "eventDateTime": start})
+        await storage.close()
+
+        storage = SQLiteStorage(url)
+        result = await storage.get_state(key(1)), await storage.get_data(key(1))
+        await storage.close()
+        return result
+
+    assert run(scenario) == ("AddEvent:eventName", {"eventName": "Игротека", "eventDateTime": start})
+
+
+def test_writes_are_batched(url):
+    async def scenario():
+        storage = SQLiteStorage(url, flush_interval=60, flush_batch=3)
+        await storage.set_data(key(1), {"a": 1})
+        await storage.set_data(key(2), {"a": 2})
+        before = await rows(storage)
+        # третий измененный ключ — сброс пачкой, не дожидаясь интервала
+        await storage.set_data(key(3), {"a": 3})
+        after = await rows(storage)
+        await storage.close()
+        return before, after
+
+    assert run(scenario) == (0, 3)
+
+
+def test_delayed_flush(url):
+    async def scenario():
+        storage = SQLiteStorage(url, flush_interval=0.05)
+        await storage.set_state(key(1), "S:one")
+        await asyncio.sleep(0.2)
+        saved = await rows(storage)
+        await storage.close()
+        return saved
+
+    assert run(scenario) == 1
+
+
+def test_evicted_record_is_not_lost(url):
+    async def scenario():
+        storage = SQLiteStorage(url, cache_size=2, flush_interval=60)
+        for chat in range(1, 5):
+            await storage.set_data(key(chat), {"chat": chat})
+        cached = list(storage._cache)
+        # вытеснена из LRU, но еще не в базе — читается из _dirty
+        evicted = await storage.get_data(key(1))
+        await storage.close()
+        return cached, evicted
+
+    cached, evicted = run(scenario)
+    assert len(cached) == 2
+    assert evicted == {"chat": 1}
+
+
+def test_cleared_state_deletes_row(url):
+    async def scenario():
+        storage = SQLiteStorage(url)
+        await storage.set_state(key(1), "S:one")
+        await storage.set_data(key(1), {"a": 1})
+        await storage.flush()
+        saved = await rows(storage)
+        await storage.set_state(key(1), None)
+        await storage.set_data(key(1), {})
+        await storage.flush()
+        left = await rows(storage)
+        await storage.close()
+        return saved, left
+
+    assert run(scenario) == (1, 0)
+
+
+def test_expired_state_is_reset_and_purged(url, monkeypatch):
+    async def scenario():
+        storage = SQLiteStorage(url, ttl=100)
+        await storage.set_state(key(1), "S:old")
+        await storage.set_state(key(2), "S:other")
+        await storage.flush()
+        later = time.time() + 1000
+        monkeypatch.setattr("app.storage.time.time", lambda: later)
+        # прочитанное после ttl — пустое
+        expired = await storage.get_state(key(1))
+        # брошенная запись удаляется при следующем сбросе
+        storage._last_purge = 0.0
+        await storage.set_state(key(3), "S:new")
+        await storage.flush()
+        left = await rows(storage)
+        await storage.close()
+        return expired, left
+
+    assert run(scenario) == (None, 1)
+
+
+def test_unserializable_data_is_rejected(url):
+    async def scenario():
+        storage = SQLiteStorage(url)
+        with pytest.raises(TypeError):
+            await storage.set_data(key(1), {"bad": object()})
+        await storage.set_data(key(2), {"ok": True})
+        await storage.close()
+        storage = SQLiteStorage(url)
+        result = await storage.get_data(key(1)), await storage.get_data(key(2))
+        await storage.close()
+        return result
+
+    assert run(scenario) == ({}, {"ok": True})
+
+
+def test_bad_record_does_not_block_others(url):
+    async def scenario():
+        storage = SQLiteStorage(url, flush_interval=60)
+        await storage.set_data(key(1), {"items": []})
+        await storage.set_data(key(2), {"ok": True})
+        # данные поменяли в обход set_data
+        storage._dirty[storage._key(key(1))].data["items"].append(object())
+        await storage.flush()
+        saved = await rows(storage)
+        dirty = dict(storage._dirty)
+        await storage.close()
+        return saved, dirty
+
+    assert run(scenario) == (1, {})
@@ -0,0 +1,72 @@
+# tests/test_texts.py
+import datetime as dt
+from html.parser import HTMLParser
+from types import SimpleNamespace
+
+from app.texts import MESSAGE_LIMIT, _utf16_len, event_text, events_digest, split_message
+
+
+def event(**fields):
+    values = dict(id=1, eventName="Игротека", eventDesc="Приходите", eventDateTime=dt.datetime(2026, 1, 5, 19),
+                  eventDuration=180, eventLocation="Антикафе", eventOrganizer="Клуб", recurRule=None)
+    values.update(fields)
+    return SimpleNamespace(**values)
+
+
+class _Tags(HTMLParser):
+    """Проверка, что теги страницы закрыты в том же сообщении"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.open: list[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        self.open.append(tag)
+
+    def handle_endtag(self, tag):
+        assert self.open and self.open.pop() == tag
+
+
+def balanced(page: str) -> bool:
+    parser = _Tags()
+    parser.feed(page)
+    parser.close()
+    return not parser.open
+
+
+def test_user_fields_are_escaped():
+    text = event_text(event(eventName="D&D <RPG> *_вечер_*", eventLocation="a_b", eventOrganizer="`x`"))
+    assert "<b>D&amp;D &lt;RPG&gt; *_вечер_*</b>" in text
+    assert "📍 a_b" in text
+    assert balanced(text)
+
+
+def test_description_lines_are_closed_separately():
+    text = event_text(event(eventDesc="первая\n\nвторая"))
+    assert "<i>первая</i>\n<i>вторая</i>" in text
+
+
+def test_split_keeps_blocks_whole():
+    pages = split_message(["a" * 10, "b" * 10, "c" * 10], separator="\n", limit=21)
+    assert pages == ["a" * 10 + "\n" + "b" * 10, "c" * 10]
+
+
+def test_oversized_block_breaks_at_line_boundary():
+    block = "\n".join(f"<b>строка {i}</b>" for i in range(10))
+    pages = split_message([block], limit=60)
+    assert "".join(p + "\n" for p in pages).rstrip("\n") == block
+    assert all(_utf16_len(p) <= 60 and balanced(p) for p in pages)
+
+
+def test_single_long_line_is_cut_at_limit():
+    pages = split_message(["x" * 25], limit=10)
+    assert pages == ["x" * 10, "x" * 10, "x" * 5]
+
+
+def test_digest_pages_fit_and_parse():
+    events = [event(id=i, eventName=f"Игра_{i}", eventDesc="очень длинное описание\n" * 40) for i in range(30)]
+    pages = events_digest(events)
+    assert len(pages) > 1
+    assert pages[0].startswith("📅 <b>Ближайшие мероприятия</b>")
+    assert all(_utf16_len(p) <= MESSAGE_LIMIT and balanced(p) for p in pages)
+    assert sum(p.count("<b>Игра_") for p in pages) == 30
@@ -0,0 +1,67 @@
+# tests/test_transfer.py
+import asyncio
+import csv
+import json
+
+import pytest
+
+from app.database.transfer import GAME_COLUMNS, parse_import, write_csv
+
+
+def test_csv_russian_headers_semicolon_and_bom():
+    data = "\ufeffНазвание;Жанр;Фото;Описание\nАзул;пати,  СТРАТЕГИЯ;p1;  Плитки  \n".encode()
+    rows, errors = parse_import(data, "games.csv")
+    assert errors == []
+    assert rows == [{"gameName": "Азул", "gameGenre": "Пати, СТРАТЕГИЯ", "gamePhoto": "p1", "gameDesc": "Плитки"}]
+
+
+def test_csv_empty_cells_are_left_out():
+    rows, _ = parse_import("gameName,gamePhoto,gameAuthor,gameGenre\nМафия,p,,\n".encode(), "games.csv")
+    assert rows == [{"gameName": "Мафия", "gamePhoto": "p"}]
+
+
+def test_json_list_and_games_object():
+    games = [{"name": "Диксит", "photo": "p", "unknown": 1}, "не объект"]
+    for payload in (games, {"games": games}):
+        rows, errors = parse_import(json.dumps(payload).encode(), "games.json")
+        assert rows == [{"gameName": "Диксит", "gamePhoto": "p"}]
+        assert errors == [(2, "нет названия")]
+
+
+def test_row_errors_keep_line_numbers():
+    data = "name,photo\nМанчкин,p\n,p\nКаркассон,\nманчкин!,p\n{},p\n".format("x" * 101).encode()
+    rows, errors = parse_import(data, "games.csv")
+    assert [row["gameName"] for row in rows] == ["Манчкин"]
+    assert errors == [
+        (3, "нет названия"),
+        (4, "нет фото (file_id или ссылка)"),
+        (5, "повтор строки 2"),
+        (6, "gameName длиннее 100 символов"),
+    ]
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"\xff\xfe", "UTF-8"),
+    (b"[1, ", "JSON"),
+    (b'{"items": []}', "список игр"),
+])
+def test_unreadable_file(data, message):
+    with pytest.raises(ValueError, match=message):
+        parse_import(data, "games.json")
+
+
+def test_export_round_trip(tmp_path):
+    async def batches():
+        yield [("Азул", "Плитки", "Пати", "p1", "admin")]
+        yield [("Мафия", None, None, "p2", None)]
+
+    path = tmp_path / "games.csv"
+    assert asyncio.run(write_csv(str(path), GAME_COLUMNS, batches())) == 2
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        assert next(csv.reader(f)) == list(GAME_COLUMNS)
+    rows, errors = parse_import(path.read_bytes(), "games.csv")
+    assert errors == []
+    assert rows == [
+        {"gameName": "Азул", "gameDesc": "Плитки", "gameGenre": "Пати", "gamePhoto": "p1", "gameAuthor": "admin"},
+        {"gameName": "Мафия", "gamePhoto": "p2"},
+    ]